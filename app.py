@@ -1,26 +1,79 @@
 import os
-import json
+import hmac
+import random
+import threading
+import time
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-import plotly.graph_objects as go
-import plotly.utils
-import pandas as pd
-import numpy as np
+from itertools import chain, islice
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify, send_file,
+                   has_request_context, g, before_render_template, template_rendered)
 from dotenv import load_dotenv
+from batching import MicroBatcher
+from cache import TTLCache, CachedSpotify, invalidate_user
+from charts import matrix, series
+from conditional import json_response, versioned_json_response
+from config import config
+from exporters import EXPORT_FORMATS, EXPORT_KINDS, export_stream, pyarrow_available
+from fetch import FetchPlan, shared_executor, iter_pages, PAGE_LIMIT, PLAYLIST_ITEMS_PAGE_LIMIT
+from features_store import AudioFeaturesStore, SPOTIFY_BATCH_SIZE
+from history import ListeningHistoryStore, HistoryIngestor
+from jobs import JobRunner, FAILED
+import metrics
+from metrics import timed
+import profiling
+from session_store import create_session_interface
+from singleflight import SingleFlight
+from snapshots import SnapshotStore, fingerprint
+from token_refresh import TokenRefreshStore
 from utils import (
-    process_listening_data, create_heatmap_data, create_top_items_chart,
-    create_heatmap_chart, analyze_listening_patterns, format_duration,
-    get_audio_features_summary, create_mood_analysis_chart, export_data_to_csv
+    process_listening_data, create_heatmap_data, analyze_listening_patterns,
+    get_audio_features_summary, create_mood_chart_data
 )
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.config.from_object(config.get(os.getenv('FLASK_ENV', 'development'), config['default']))
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 
+# Session data, Spotify tokens included, is kept server-side; the cookie only holds its id
+app.session_interface = create_session_interface(app.config) or app.session_interface
+
+# Spotify API responses shared by all users, keyed by user id, endpoint and arguments
+spotify_cache = TTLCache(max_entries=app.config['SPOTIFY_CACHE_MAX_ENTRIES'])
+
+# Identical concurrent Spotify calls, e.g. a page and the API requests it
+# triggers, share one upstream call; keyed like spotify_cache
+spotify_calls = SingleFlight()
+
+SPOTIFY_HTTP_TIMEOUT = (app.config['SPOTIFY_HTTP_CONNECT_TIMEOUT'],
+                        app.config['SPOTIFY_HTTP_READ_TIMEOUT'])
+
+# Audio features never change, so they are stored once for all users
+audio_features_store = AudioFeaturesStore(app.config['AUDIO_FEATURES_DB'],
+                                          batch_window=app.config['SPOTIFY_BATCH_WINDOW'])
+
+# Maximum number of ids accepted by the artists endpoint
+ARTISTS_BATCH_SIZE = 50
+
+def fetch_artists(sp, artist_ids):
+    """Fetch up to ARTISTS_BATCH_SIZE artists in one call"""
+    return sp.artists(artist_ids)['artists']
+
+# Artist lookups of concurrent requests share calls, whichever user they are for
+artist_batcher = MicroBatcher(fetch_artists, ARTISTS_BATCH_SIZE, max_delay=app.config['SPOTIFY_BATCH_WINDOW'])
+
+# Every play seen for each user, beyond the 50 the API returns
+history_store = ListeningHistoryStore(app.config['HISTORY_DB'])
+
+# Per-user page analytics, rebuilt only when their inputs change
+snapshot_store = SnapshotStore(max_entries=app.config['SNAPSHOT_MAX_ENTRIES'], ttl=app.config['SNAPSHOT_TTL'])
+
+# Heavy page computations, run off the request thread
+job_runner = JobRunner(max_workers=app.config['JOB_WORKERS'], result_ttl=app.config['JOB_RESULT_TTL'],
+                       path=app.config['JOB_DB'])
+
 # Spotify API configuration
 SPOTIPY_CLIENT_ID = os.getenv('SPOTIPY_CLIENT_ID')
 SPOTIPY_CLIENT_SECRET = os.getenv('SPOTIPY_CLIENT_SECRET')
@@ -35,14 +88,299 @@ SCOPES = [
     'user-read-private'
 ]
 
+# Only the playlist item fields the insights use
+PLAYLIST_ITEM_FIELDS = 'items(track(id,name,artists(id,name))),total'
+
+# spotipy, requests and the pool are loaded on first use, not at import time
+_spotify_http = None
+_spotify_oauth = None
+_rate_limiter = None
+_spotify_lock = threading.Lock()
+
+def rate_limit_share():
+    """
+    Return this process's share of the app-wide Spotify rate and burst
+    
+    Every gunicorn worker has its own token bucket, so each gets an equal
+    part of SPOTIFY_RATE_LIMIT and SPOTIFY_RATE_BURST.
+    """
+    processes = app.config['WEB_WORKERS'] if app.config['SERVER'] == 'gunicorn' else 1
+    processes = max(processes, 1)
+    return (app.config['SPOTIFY_RATE_LIMIT'] / processes,
+            max(app.config['SPOTIFY_RATE_BURST'] // processes, 1))
+
+def spotify_http():
+    """Return the keep-alive connection pool shared by every spotipy client in this process"""
+    global _spotify_http, _rate_limiter
+    if _spotify_http is None:
+        with _spotify_lock:
+            if _spotify_http is None:
+                from http_pool import create_session
+                from ratelimit import RateLimiter
+                rate, burst = rate_limit_share()
+                _rate_limiter = rate_limiter = RateLimiter(
+                    rate=rate,
+                    burst=burst,
+                    max_concurrency=app.config['SPOTIFY_HTTP_POOL_MAXSIZE'],
+                    max_wait=app.config['SPOTIFY_MAX_RETRY_AFTER']
+                )
+                _spotify_http = create_session(
+                    pool_connections=app.config['SPOTIFY_HTTP_POOL_CONNECTIONS'],
+                    pool_maxsize=app.config['SPOTIFY_HTTP_POOL_MAXSIZE'],
+                    retries=app.config['SPOTIFY_HTTP_RETRIES'],
+                    rate_limiter=rate_limiter
+                )
+    return _spotify_http
+
 def create_spotify_oauth():
-    """Create Spotify OAuth object"""
-    return SpotifyOAuth(
-        client_id=SPOTIPY_CLIENT_ID,
-        client_secret=SPOTIPY_CLIENT_SECRET,
-        redirect_uri=SPOTIPY_REDIRECT_URI,
-        scope=' '.join(SCOPES)
-    )
+    """Return the Spotify OAuth manager shared by all requests"""
+    global _spotify_oauth
+    if _spotify_oauth is None:
+        from spotipy.oauth2 import SpotifyOAuth
+        from http_pool import NullCacheHandler
+        # Tokens are kept in each user's session, never in the manager's cache
+        _spotify_oauth = SpotifyOAuth(
+            client_id=SPOTIPY_CLIENT_ID,
+            client_secret=SPOTIPY_CLIENT_SECRET,
+            redirect_uri=SPOTIPY_REDIRECT_URI,
+            scope=' '.join(SCOPES),
+            cache_handler=NullCacheHandler(),
+            requests_session=spotify_http(),
+            requests_timeout=SPOTIFY_HTTP_TIMEOUT
+        )
+    return _spotify_oauth
+
+def build_spotify_client(token_info):
+    """Create a spotipy client on the shared connection pool"""
+    import spotipy
+    return spotipy.Spotify(auth=token_info['access_token'], requests_session=spotify_http(),
+                           requests_timeout=SPOTIFY_HTTP_TIMEOUT)
+
+def prewarm():
+    """
+    Load the heavy dependencies ahead of the first request
+    
+    Imports are deferred so that workers boot quickly and routes such as
+    the home page never pay for them; production servers call this once
+    at startup instead, so no user request pays for them either.
+    """
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import spotipy.oauth2  # noqa: F401
+    spotify_http()
+
+# One refresh in flight per access token; its result is kept for requests that
+# still hold the old token, e.g. because their session was loaded before it changed.
+# token_refresh_store extends both to every worker process
+token_refreshes = SingleFlight()
+refreshed_tokens = TTLCache(max_entries=4096, default_ttl=app.config['TOKEN_REFRESH_MARGIN'])
+token_refresh_store = TokenRefreshStore(app.config['TOKEN_REFRESH_DB'], lease=app.config['TOKEN_REFRESH_LEASE'])
+
+def refresh_token_info(token_info):
+    """
+    Return a refreshed token, refreshing it at most once however many
+    requests, threads and worker processes ask at the same time
+    """
+    key = token_info['access_token']
+    refreshed = refreshed_tokens.get(key)
+    if refreshed is not None:
+        return refreshed
+    
+    def refresh():
+        # Tokens refreshed by another worker only carry the fields that changed
+        new_token_info = dict(token_info, **token_refresh_store.refresh(
+            key, lambda: create_spotify_oauth().refresh_access_token(token_info['refresh_token']),
+            ttl=app.config['TOKEN_REFRESH_MARGIN']
+        ))
+        refreshed_tokens.set(key, new_token_info)
+        return new_token_info
+    return token_refreshes.do(key, refresh)
+
+def refresh_in_background(token_info):
+    """Start refreshing a token that is about to expire, unless that is already under way"""
+    key = token_info['access_token']
+    if token_refreshes.in_flight(key) or refreshed_tokens.get(key) is not None:
+        return
+    
+    def refresh():
+        try:
+            refresh_token_info(token_info)
+        except Exception:
+            app.logger.warning('Background token refresh failed', exc_info=True)
+    shared_executor(app.config['SPOTIFY_FETCH_WORKERS']).submit(refresh)
+
+def current_token_info(token_info):
+    """
+    Return a usable token for the request, refreshing it if needed
+    
+    Expired tokens are refreshed before the request continues. Tokens
+    within TOKEN_REFRESH_MARGIN seconds of expiry are refreshed in the
+    background while the request uses the current one, so that later
+    requests find a fresh token without waiting for a refresh.
+    """
+    refreshed = refreshed_tokens.get(token_info['access_token'])
+    if refreshed is not None:
+        return refreshed
+    if create_spotify_oauth().is_token_expired(token_info):
+        return refresh_token_info(token_info)
+    if token_info.get('expires_at', 0) - time.time() < app.config['TOKEN_REFRESH_MARGIN']:
+        refresh_in_background(token_info)
+    return token_info
+
+history_ingestor = HistoryIngestor(
+    history_store,
+    client_factory=build_spotify_client,
+    refresh_token=refresh_token_info,
+    is_expired=lambda token_info: create_spotify_oauth().is_token_expired(token_info),
+    interval=app.config['HISTORY_POLL_INTERVAL'],
+    # Users whose session expired are no longer polled
+    ttl=app.permanent_session_lifetime.total_seconds(),
+    max_users=app.config['HISTORY_MAX_USERS'],
+    max_failures=app.config['HISTORY_MAX_FAILURES']
+)
+
+def request_endpoint():
+    """Route pattern of the current request, e.g. /api/jobs/<job_id>, used as a metrics label"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_timing():
+    g.timings, g.timings_token = metrics.start_request()
+
+@app.after_request
+def record_timing(response):
+    """Record the request in the metrics and report its phases in Server-Timing"""
+    timings = g.pop('timings', None)
+    if timings is None:
+        return response
+    elapsed = timings.clock() - timings.started
+    endpoint = request_endpoint()
+    metrics.http_requests.inc(endpoint, request.method, str(response.status_code))
+    metrics.http_duration.observe(elapsed, endpoint, request.method)
+    totals = metrics.observe_phases(endpoint, timings)
+    if app.config['SERVER_TIMING_ENABLED']:
+        response.headers['Server-Timing'] = timings.server_timing(elapsed, totals)
+    return response
+
+@app.teardown_request
+def end_timing(exc):
+    token = g.pop('timings_token', None)
+    if token is not None:
+        metrics.end_request(token)
+
+def _render_started(sender, template, context, **extra):
+    timings = metrics.current_timings()
+    if timings is not None:
+        timings.enter('render')
+
+def _render_finished(sender, template, context, **extra):
+    timings = metrics.current_timings()
+    if timings is not None:
+        timings.exit()
+
+before_render_template.connect(_render_started, app)
+template_rendered.connect(_render_finished, app)
+
+def component_stats():
+    """Statistics of the caches, batchers, rate limiter and job table, read at scrape time"""
+    stats = {
+        'spotify_cache': spotify_cache.stats(),
+        'token_cache': refreshed_tokens.stats(),
+        'snapshots': snapshot_store.stats(),
+        'audio_features_batcher': audio_features_store.batcher.stats(),
+        'artist_batcher': artist_batcher.stats(),
+        'jobs': {'size': len(job_runner)},
+        'history_ingestor': {'size': len(history_ingestor)}
+    }
+    if _rate_limiter is not None:
+        stats['spotify_rate_limiter'] = _rate_limiter.stats()
+    return stats
+
+metrics.registry.stats_gauges('sonify_component', 'component', 'Cache, batcher and job statistics',
+                              component_stats)
+
+# Request profiles, captured only when profiling is configured
+profile_store = profiling.ProfileStore(app.config['PROFILE_DIR'], max_profiles=app.config['PROFILE_MAX_STORED'])
+
+def is_admin(value):
+    """Tell whether value is the configured admin token"""
+    token = app.config['ADMIN_TOKEN']
+    return bool(token and value) and hmac.compare_digest(value.encode(), token.encode())
+
+def should_profile():
+    """Profile requests asked for by an admin, and a sample of the configured routes"""
+    if is_admin(request.headers.get('X-Sonify-Profile', '')):
+        return True
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    routes = app.config['PROFILE_ROUTES']
+    return rate > 0 and (not routes or request_endpoint() in routes) and random.random() < rate
+
+def start_profile():
+    if should_profile():
+        g.profiler = profiling.start()
+
+def save_profile(response):
+    """Store the request's profile and tell the client its id"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        response.headers['X-Sonify-Profile-Id'] = profile_store.save(request_endpoint(), profiler)
+    return response
+
+# Without an admin token or a sample rate, requests never reach the profiler
+if app.config['ADMIN_TOKEN'] or app.config['PROFILE_SAMPLE_RATE'] > 0:
+    app.before_request(start_profile)
+    app.after_request(save_profile)
+
+def admin_only():
+    """Return an error response unless the request carries the admin token"""
+    if not app.config['ADMIN_TOKEN']:
+        return jsonify({'error': 'Not found'}), 404
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not is_admin(token):
+        return jsonify({'error': 'Admin token required'}), 403
+    return None
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metrics of this process in the Prometheus text exposition format, for admins only"""
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    denied = admin_only()
+    if denied:
+        return denied
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles')
+def admin_profiles():
+    """Stored request profiles, newest first"""
+    denied = admin_only()
+    if denied:
+        return denied
+    return jsonify([dict(profile, url=url_for('admin_profile', profile_id=profile['id']))
+                    for profile in profile_store.list()])
+
+@app.route('/admin/profiles/<profile_id>')
+def admin_profile(profile_id):
+    """
+    Download a stored profile as a pstats file
+    
+    ``?format=text`` returns the hottest functions instead, sorted by the
+    ``sort`` parameter (cumulative time by default).
+    """
+    denied = admin_only()
+    if denied:
+        return denied
+    path = profile_store.path(profile_id)
+    if path is None:
+        return jsonify({'error': 'Unknown profile'}), 404
+    if request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'calls', 'ncalls'):
+            return jsonify({'error': f'Unknown sort: {sort}'}), 400
+        return Response(profiling.summary(path, sort), mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{profile_id}.prof')
 
 @app.route('/')
 def index():
@@ -62,18 +400,26 @@ def callback():
     sp_oauth = create_spotify_oauth()
     session.clear()
     code = request.args.get('code')
-    token_info = sp_oauth.get_access_token(code)
+    token_info = sp_oauth.get_access_token(code, check_cache=False)
     
     if not token_info:
         flash('Failed to get access token', 'error')
         return redirect(url_for('index'))
     
+    # A new session id at login, so an id planted before it cannot be used
+    if hasattr(session, 'regenerate'):
+        session.regenerate()
     session['token_info'] = token_info
     return redirect(url_for('dashboard'))
 
 @app.route('/logout')
 def logout():
     """Logout user"""
+    user_id = session.get('user_id')
+    if user_id:
+        invalidate_user(spotify_cache, user_id)
+        snapshot_store.invalidate(user_id)
+        history_ingestor.unregister(user_id)
     session.clear()
     return redirect(url_for('index'))
 
@@ -83,12 +429,101 @@ def get_spotify_client():
     if not token_info:
         return None
     
-    sp_oauth = create_spotify_oauth()
-    if sp_oauth.is_token_expired(token_info):
-        token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
-        session['token_info'] = token_info
+    fresh_token_info = current_token_info(token_info)
+    if fresh_token_info is not token_info:
+        token_info = session['token_info'] = fresh_token_info
+    
+    sp = build_spotify_client(token_info)
     
-    return spotipy.Spotify(auth=token_info['access_token'])
+    # Responses are cached per user, so resolve the user id once per session
+    user = None
+    user_id = session.get('user_id')
+    if not user_id:
+        try:
+            # Concurrent first requests of a session resolve the user once
+            user = spotify_calls.do(('current_user', token_info['access_token']), sp.current_user)
+        except Exception:
+            # Let the route surface the error from its own calls
+            return sp
+        user_id = user['id']
+        session['user_id'] = user_id
+    
+    cached_sp = CachedSpotify(sp, user_id, spotify_cache, app.config['SPOTIFY_CACHE_TTLS'],
+                              flights=spotify_calls)
+    if user is not None:
+        cached_sp.prime('current_user', user)
+    return cached_sp
+
+def record_listening(recent_items, user_id=None, token_info=None):
+    """
+    Record the latest plays in the user's accumulated history
+    
+    The user comes from the session unless given, as it must be outside a
+    request.
+    
+    Returns:
+        The user id the history is kept under, or None when it is not known yet
+    """
+    if user_id is None and has_request_context():
+        user_id = session.get('user_id')
+        token_info = session.get('token_info')
+    if not user_id:
+        return None
+    history_store.append(user_id, recent_items)
+    if app.config['HISTORY_INGEST_ENABLED'] and token_info:
+        history_ingestor.register(user_id, token_info)
+    return user_id
+
+def history_items(user_id, recent_items):
+    """Return the user's full accumulated history, or the latest page without a user id"""
+    return history_store.items(user_id) if user_id else recent_items
+
+def item_ids(page):
+    """Ids of a page of Spotify objects, in order"""
+    return [item.get('id') for item in page['items']]
+
+def snapshot(user_id, section, build, *inputs):
+    """
+    Serve a computed page section from the user's snapshot
+    
+    The section is rebuilt only when the fingerprint of inputs differs from
+    the one it was built from; without a user id it is built every time.
+    """
+    if not user_id:
+        return build()
+    return snapshot_store.get_or_build(user_id, section, fingerprint(*inputs), build)
+
+def fetch_plan():
+    """Create a FetchPlan running on the shared Spotify thread pool"""
+    return FetchPlan(shared_executor(app.config['SPOTIFY_FETCH_WORKERS']))
+
+def run_fetch_plan(plan, name=None):
+    """Run independent Spotify calls concurrently and log their timings"""
+    results = plan.run()
+    if name is None:
+        name = request.endpoint if has_request_context() else 'job'
+    app.logger.debug('%d Spotify calls for %s took %.1fms (%s)', plan.requests, name,
+                     plan.elapsed * 1000, plan.format_timings())
+    return results
+
+def fetch_playlist_tracks(sp, playlists, name=None):
+    """
+    Read the tracks of every playlist
+    
+    Each playlist's ``tracks.total`` gives all of its page offsets up front,
+    so every page of every playlist is fetched in one concurrent round.
+    
+    Returns:
+        Dictionary of playlist id to its playlist items
+    """
+    plan = fetch_plan()
+    for playlist in playlists:
+        plan.add_paged(playlist['id'], sp.playlist_items, playlist['id'],
+                       limit=PLAYLIST_ITEMS_PAGE_LIMIT,
+                       max_items=app.config['SPOTIFY_PAGED_MAX_ITEMS'],
+                       total=(playlist.get('tracks') or {}).get('total'),
+                       fields=PLAYLIST_ITEM_FIELDS)
+    return {playlist_id: page['items'] for playlist_id, page in run_fetch_plan(plan, name).items()}
 
 @app.route('/dashboard')
 def dashboard():
@@ -98,19 +533,26 @@ def dashboard():
         return redirect(url_for('login'))
     
     try:
-        # Get user profile
-        user = sp.current_user()
+        # Get user profile, top items and recently played tracks concurrently
+        plan = fetch_plan()
+        plan.add('user', sp.current_user)
+        plan.add('top_tracks', sp.current_user_top_tracks, limit=10, time_range='short_term')
+        plan.add('top_artists', sp.current_user_top_artists, limit=10, time_range='short_term')
+        plan.add('recent_tracks', sp.current_user_recently_played, limit=50)
+        data = run_fetch_plan(plan)
+        user = data['user']
+        top_tracks = data['top_tracks']
+        top_artists = data['top_artists']
+        recent_tracks = data['recent_tracks']
         
-        # Get top tracks and artists
-        top_tracks = sp.current_user_top_tracks(limit=10, time_range='short_term')
-        top_artists = sp.current_user_top_artists(limit=10, time_range='short_term')
+        # Analyze listening patterns over the full accumulated history, when it changed
+        user_id = record_listening(recent_tracks['items'])
         
-        # Get recently played tracks
-        recent_tracks = sp.current_user_recently_played(limit=50)
-        
-        # Analyze listening patterns
-        listening_data = process_listening_data(recent_tracks['items'])
-        patterns = analyze_listening_patterns(listening_data.get('listening_times', []))
+        def build_patterns():
+            listening_data = process_listening_data(history_items(user_id, recent_tracks['items']))
+            return analyze_listening_patterns(listening_data.get('listening_times', []))
+        patterns = snapshot(user_id, 'dashboard', build_patterns,
+                            user_id and history_store.version(user_id))
         
         return render_template('dashboard.html', 
                              user=user, 
@@ -130,19 +572,167 @@ def visualizations():
         return redirect(url_for('login'))
     
     try:
-        # Get data for visualizations
-        top_tracks = sp.current_user_top_tracks(limit=50, time_range='short_term')
-        top_artists = sp.current_user_top_artists(limit=50, time_range='short_term')
-        recent_tracks = sp.current_user_recently_played(limit=100)
-        
-        # Create visualizations
-        charts = create_visualizations(top_tracks, top_artists, recent_tracks)
-        
-        return render_template('visualizations.html', charts=charts)
+        return render_template('visualizations.html', chart_data=visualization_chart_data(sp))
     except Exception as e:
         flash(f'Error loading visualizations: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
 
+def visualization_chart_data(sp):
+    """Fetch the visualizations' data and return their compact chart data"""
+    plan = fetch_plan()
+    plan.add('top_tracks', sp.current_user_top_tracks, limit=50, time_range='short_term')
+    plan.add('top_artists', sp.current_user_top_artists, limit=50, time_range='short_term')
+    plan.add('recent_tracks', sp.current_user_recently_played, limit=50)
+    data = run_fetch_plan(plan)
+    recent_items = data['recent_tracks']['items']
+    user_id = record_listening(recent_items)
+    
+    # Create the chart data, unless the snapshot was built from the same data
+    def build():
+        history = {'items': history_items(user_id, recent_items)}
+        return create_chart_data(data['top_tracks'], data['top_artists'], history)
+    return snapshot(user_id, 'visualizations', build, item_ids(data['top_tracks']),
+                    item_ids(data['top_artists']), user_id and history_store.version(user_id))
+
+def compute_mood_analysis(sp, user_id=None, token_info=None):
+    """Fetch the top tracks' audio features and analyze them for the mood analysis page"""
+    # Get top tracks for analysis
+    top_tracks = sp.current_user_top_tracks(limit=50, time_range='short_term')
+    
+    track_ids = item_ids(top_tracks)
+    
+    def build():
+        # Get audio features for tracks, fetching only those not stored yet
+        audio_features = audio_features_store.fetch(sp, track_ids)
+        
+        # Process audio features
+        features_summary = get_audio_features_summary(audio_features)
+        
+        return {
+            'features_summary': features_summary,
+            'mood_chart': create_mood_chart_data(features_summary),
+            'mood_insights': analyze_mood_characteristics(features_summary),
+            'tracks_with_features': list(zip(top_tracks['items'], audio_features))
+        }
+    
+    # Audio features never change, so the top tracks are the only input
+    return snapshot(user_id, 'mood_analysis', build, track_ids)
+
+def compute_insights(sp, user_id=None, token_info=None):
+    """Fetch everything the insights page covers, including all playlists, and analyze it"""
+    # Get comprehensive data, including all of the user's playlists
+    plan = fetch_plan()
+    plan.add('top_tracks', sp.current_user_top_tracks, limit=20, time_range='short_term')
+    plan.add('top_artists', sp.current_user_top_artists, limit=20, time_range='short_term')
+    plan.add('recent_tracks', sp.current_user_recently_played, limit=50)
+    plan.add_paged('playlists', sp.current_user_playlists, limit=PAGE_LIMIT,
+                   max_items=app.config['SPOTIFY_PAGED_MAX_ITEMS'])
+    data = run_fetch_plan(plan, 'insights')
+    top_tracks = data['top_tracks']
+    top_artists = data['top_artists']
+    recent_items = data['recent_tracks']['items']
+    user_id = record_listening(recent_items, user_id, token_info)
+    playlists = data['playlists']
+    
+    def build():
+        recent_tracks = {'items': history_items(user_id, recent_items)}
+        playlist_tracks = fetch_playlist_tracks(sp, playlists['items'], 'insights')
+        
+        # Look up the artists featured most in the playlists for their genres
+        artist_counts = {}
+        for items in playlist_tracks.values():
+            for item in items:
+                for artist in (item.get('track') or {}).get('artists') or []:
+                    if artist.get('id'):
+                        artist_counts[artist['id']] = artist_counts.get(artist['id'], 0) + 1
+        featured = sorted(artist_counts, key=artist_counts.get, reverse=True)[:ARTISTS_BATCH_SIZE]
+        playlist_artists = artist_batcher.get_many(sp, featured)
+        
+        # Analyze data
+        listening_data = process_listening_data(recent_tracks['items'])
+        patterns = analyze_listening_patterns(listening_data.get('listening_times', []))
+        
+        return {
+            'insights': generate_insights(top_tracks, top_artists, recent_tracks, playlists, patterns,
+                                          playlist_tracks, playlist_artists),
+            'patterns': patterns,
+            'playlists': playlists['items']
+        }
+    
+    # A playlist's snapshot_id changes with its contents, so its tracks are
+    # only read again when a playlist changed
+    playlist_versions = [(playlist['id'], playlist.get('snapshot_id'),
+                          (playlist.get('tracks') or {}).get('total'))
+                         for playlist in playlists['items']]
+    return snapshot(user_id, 'insights', build, item_ids(top_tracks), item_ids(top_artists),
+                    user_id and history_store.version(user_id), playlist_versions)
+
+# Job kind -> computation, called with the Spotify client, user id and token
+JOB_KINDS = {
+    'insights': compute_insights,
+    'mood_analysis': compute_mood_analysis
+}
+
+def run_job(kind, *args, profile=False):
+    """
+    Run a job's computation, recording its phases under the endpoint 'job:<kind>'
+    
+    With ``profile``, set when the submitting request was profiled, the job
+    is profiled too and stored under the same name.
+    """
+    timings, token = metrics.start_request()
+    profiler = profiling.start() if profile else None
+    status = 'failed'
+    try:
+        result = JOB_KINDS[kind](*args)
+        status = 'done'
+        return result
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profile_store.save(f'job:{kind}', profiler)
+        metrics.end_request(token)
+        metrics.observe_phases(f'job:{kind}', timings)
+        metrics.job_duration.observe(timings.clock() - timings.started, kind, status)
+
+def submit_job(kind, sp):
+    """Submit a computation for the current user, joining one already running"""
+    user_id = session.get('user_id')
+    return job_runner.submit(user_id, kind, run_job, kind, sp, user_id, session.get('token_info'),
+                             profile=g.get('profiler') is not None)
+
+def owned_job(job_id):
+    """Return the job if it exists and belongs to the current user"""
+    job = job_runner.get(job_id)
+    if job is None or 'token_info' not in session or job.user_id != session.get('user_id'):
+        return None
+    return job
+
+def page_job(kind, sp):
+    """
+    Return the job computing a heavy page, waiting briefly for it
+    
+    A ``job`` query parameter picks up a job submitted earlier, which is how
+    the pending page comes back once the job has finished. Otherwise the
+    computation is submitted and given JOB_INLINE_WAIT seconds, so pages
+    that are quick to compute still render in a single request. A job id
+    that is not known any more, e.g. because it was swept, is not polled
+    again: the page is computed in full.
+    """
+    job_id = request.args.get('job', '')
+    job = owned_job(job_id)
+    if job is not None and job.kind == kind:
+        job.wait(app.config['JOB_INLINE_WAIT'])
+        return job
+    job = submit_job(kind, sp)
+    job.wait(None if job_id else app.config['JOB_INLINE_WAIT'])
+    return job
+
+def job_status(job):
+    """Describe a job for the job API"""
+    return dict(job.to_dict(), status_url=url_for('api_job', job_id=job.id),
+                result_url=url_for('api_job_result', job_id=job.id))
+
 @app.route('/mood-analysis')
 def mood_analysis():
     """Mood analysis page with audio features"""
@@ -150,28 +740,14 @@ def mood_analysis():
     if not sp:
         return redirect(url_for('login'))
     
+    job = page_job('mood_analysis', sp)
+    if not job.done:
+        return render_template('job_pending.html', job=job, title='Mood Analysis',
+                               page_url=url_for('mood_analysis', job=job.id))
     try:
-        # Get top tracks for analysis
-        top_tracks = sp.current_user_top_tracks(limit=50, time_range='short_term')
-        
-        # Get audio features for tracks
-        track_ids = [track['id'] for track in top_tracks['items']]
-        audio_features = sp.audio_features(track_ids)
-        
-        # Process audio features
-        features_summary = get_audio_features_summary(audio_features)
-        
-        # Create mood analysis chart
-        mood_chart = create_mood_analysis_chart(features_summary)
-        
-        # Analyze mood characteristics
-        mood_insights = analyze_mood_characteristics(features_summary)
-        
-        return render_template('mood_analysis.html', 
-                             features_summary=features_summary,
-                             mood_chart=mood_chart,
-                             mood_insights=mood_insights,
-                             tracks_with_features=zip(top_tracks['items'], audio_features))
+        if job.status == FAILED:
+            raise Exception(job.error)
+        return render_template('mood_analysis.html', **job.result)
     except Exception as e:
         flash(f'Error loading mood analysis: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
@@ -183,150 +759,145 @@ def insights():
     if not sp:
         return redirect(url_for('login'))
     
+    job = page_job('insights', sp)
+    if not job.done:
+        return render_template('job_pending.html', job=job, title='Insights',
+                               page_url=url_for('insights', job=job.id))
     try:
-        # Get comprehensive data
-        top_tracks = sp.current_user_top_tracks(limit=20, time_range='short_term')
-        top_artists = sp.current_user_top_artists(limit=20, time_range='short_term')
-        recent_tracks = sp.current_user_recently_played(limit=100)
-        
-        # Get user's playlists
-        playlists = sp.current_user_playlists(limit=20)
-        
-        # Analyze data
-        listening_data = process_listening_data(recent_tracks['items'])
-        patterns = analyze_listening_patterns(listening_data.get('listening_times', []))
-        
-        # Generate insights
-        insights_data = generate_insights(top_tracks, top_artists, recent_tracks, playlists)
-        
-        return render_template('insights.html', 
-                             insights=insights_data,
-                             patterns=patterns,
-                             playlists=playlists['items'])
+        if job.status == FAILED:
+            raise Exception(job.error)
+        return render_template('insights.html', **job.result)
     except Exception as e:
         flash(f'Error loading insights: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
 
+# Export kind -> spotipy method of the paged top items it is built from
+TOP_ITEM_EXPORTS = {
+    'tracks': 'current_user_top_tracks',
+    'artists': 'current_user_top_artists'
+}
+
+def export_items(sp, kind):
+    """
+    Return an iterator over the Spotify objects an export is built from
+    
+    The first request is made before returning, so that API errors are
+    raised here rather than once the download has started.
+    """
+    if kind in TOP_ITEM_EXPORTS:
+        max_items = app.config['SPOTIFY_PAGED_MAX_ITEMS']
+        pages = iter_pages(shared_executor(app.config['SPOTIFY_FETCH_WORKERS']),
+                           getattr(sp, TOP_ITEM_EXPORTS[kind]), limit=PAGE_LIMIT,
+                           max_items=max_items, time_range='short_term')
+        first_page = next(pages)
+        items = (item for page in chain([first_page], pages) for item in page['items'])
+        return islice(items, max_items)
+    
+    recent_items = sp.current_user_recently_played(limit=50)['items']
+    user_id = session.get('user_id')
+    if user_id:
+        history_store.append(user_id, recent_items)
+    if kind == 'plays':
+        return history_store.iter_items(user_id) if user_id else iter(recent_items)
+    
+    # Audio features of every track played, skipping local files without a Spotify id
+    if user_id:
+        track_ids = history_store.track_ids(user_id)
+    else:
+        track_ids = list(dict.fromkeys((item['track'] or {}).get('id') for item in recent_items))
+    track_ids = [track_id for track_id in track_ids if track_id and len(track_id) == 22]
+    
+    def features():
+        for start in range(0, len(track_ids), SPOTIFY_BATCH_SIZE):
+            batch = audio_features_store.fetch(sp, track_ids[start:start + SPOTIFY_BATCH_SIZE])
+            yield from (entry for entry in batch if entry)
+    return features()
+
 @app.route('/export-data')
 def export_data():
-    """Export user data as CSV"""
+    """
+    Stream the user's data as a download
+    
+    Query parameters:
+        kind: 'tracks' (default) or 'artists' for top items, 'plays' for the
+            accumulated listening history, 'audio_features' for its tracks
+        format: 'csv' (default), 'ndjson', or the typed columnar 'parquet'
+            and 'arrow' (Arrow IPC stream), which need pyarrow installed
+        compress: 'gzip' for a gzip-compressed CSV or NDJSON download
+    """
     sp = get_spotify_client()
     if not sp:
         return redirect(url_for('login'))
     
+    kind = request.args.get('kind', 'tracks')
+    fmt = request.args.get('format', 'csv')
+    if kind not in EXPORT_KINDS:
+        flash(f'Unknown export: {kind}', 'error')
+        return redirect(url_for('dashboard'))
+    if fmt not in EXPORT_FORMATS:
+        flash(f'Unknown export format: {fmt}', 'error')
+        return redirect(url_for('dashboard'))
+    _, mimetype, extension, needs_pyarrow = EXPORT_FORMATS[fmt]
+    if needs_pyarrow and not pyarrow_available():
+        flash(f'Exporting to {fmt} needs pyarrow, install it with pip install "sonify[export]"', 'error')
+        return redirect(url_for('dashboard'))
+    columns, to_row = EXPORT_KINDS[kind]
+    
     try:
-        # Get user data
-        top_tracks = sp.current_user_top_tracks(limit=100, time_range='short_term')
-        top_artists = sp.current_user_top_artists(limit=100, time_range='short_term')
-        
-        # Prepare data for export
-        export_data = {
-            'tracks': [],
-            'artists': []
-        }
-        
-        for track in top_tracks['items']:
-            export_data['tracks'].append({
-                'name': track['name'],
-                'artist': track['artists'][0]['name'],
-                'album': track['album']['name'],
-                'popularity': track['popularity'],
-                'duration': format_duration(track['duration_ms'])
-            })
-        
-        for artist in top_artists['items']:
-            export_data['artists'].append({
-                'name': artist['name'],
-                'popularity': artist['popularity'],
-                'genres': ', '.join(artist['genres'][:3]),
-                'followers': artist['followers']['total']
-            })
-        
-        # Export to CSV
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'sonify_data_{timestamp}'
-        export_path = export_data_to_csv(export_data, filename)
-        
-        if export_path:
-            flash('Data exported successfully!', 'success')
-            return redirect(url_for('dashboard'))
-        else:
-            flash('Error exporting data', 'error')
-            return redirect(url_for('dashboard'))
-            
+        items = export_items(sp, kind)
     except Exception as e:
         flash(f'Error exporting data: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
+    
+    def rows():
+        try:
+            for item in items:
+                yield to_row(item)
+        except Exception:
+            # Headers are already sent, so the download can only be cut short
+            app.logger.exception('Export of %s failed mid-stream', kind)
+            raise
+    
+    compress = request.args.get('compress')
+    body = export_stream(fmt, rows(), columns, compress)
+    prefix = 'top_' if kind in TOP_ITEM_EXPORTS else ''
+    filename = f'sonify_{prefix}{kind}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    if compress == 'gzip' and not needs_pyarrow:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(body, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
-def create_visualizations(top_tracks, top_artists, recent_tracks):
-    """Create Plotly visualizations"""
-    charts = {}
+@timed('charts')
+def create_chart_data(top_tracks, top_artists, recent_tracks):
+    """
+    Create the compact data of the visualizations page's charts
+    
+    Only labels, values and the 7x24 heatmap matrix are sent; the trace
+    styles, layouts and theme live in static/js/charts.js.
+    """
+    chart_data = {}
     
     # Top tracks chart
     if top_tracks['items']:
-        track_names = [track['name'] for track in top_tracks['items']]
-        track_popularity = [track['popularity'] for track in top_tracks['items']]
-        
-        fig_tracks = go.Figure(data=[
-            go.Bar(x=track_names, y=track_popularity, 
-                   marker_color='rgb(30, 215, 96)')
-        ])
-        fig_tracks.update_layout(
-            title='Your Top Tracks',
-            xaxis_title='Track',
-            yaxis_title='Popularity',
-            template='plotly_dark'
-        )
-        charts['top_tracks'] = json.dumps(fig_tracks, cls=plotly.utils.PlotlyJSONEncoder)
+        chart_data['top_tracks'] = series([track['name'] for track in top_tracks['items']],
+                                          [track['popularity'] for track in top_tracks['items']])
     
     # Top artists chart
     if top_artists['items']:
-        artist_names = [artist['name'] for artist in top_artists['items']]
-        artist_popularity = [artist['popularity'] for artist in top_artists['items']]
-        
-        fig_artists = go.Figure(data=[
-            go.Bar(x=artist_names, y=artist_popularity,
-                   marker_color='rgb(255, 107, 107)')
-        ])
-        fig_artists.update_layout(
-            title='Your Top Artists',
-            xaxis_title='Artist',
-            yaxis_title='Popularity',
-            template='plotly_dark'
-        )
-        charts['top_artists'] = json.dumps(fig_artists, cls=plotly.utils.PlotlyJSONEncoder)
+        chart_data['top_artists'] = series([artist['name'] for artist in top_artists['items']],
+                                           [artist['popularity'] for artist in top_artists['items']])
     
     # Listening time heatmap
     if recent_tracks['items']:
-        # Create listening time data
-        listening_times = []
-        for item in recent_tracks['items']:
-            played_at = datetime.fromisoformat(item['played_at'].replace('Z', '+00:00'))
-            listening_times.append({
-                'hour': played_at.hour,
-                'day': played_at.strftime('%A'),
-                'date': played_at.date()
-            })
-        
-        # Create heatmap data
-        heatmap_data = create_heatmap_data(listening_times)
-        
-        fig_heatmap = go.Figure(data=go.Heatmap(
-            z=heatmap_data,
-            x=list(range(24)),
-            y=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
-            colorscale='Viridis'
-        ))
-        fig_heatmap.update_layout(
-            title='Listening Time Heatmap',
-            xaxis_title='Hour of Day',
-            yaxis_title='Day of Week',
-            template='plotly_dark'
-        )
-        charts['heatmap'] = json.dumps(fig_heatmap, cls=plotly.utils.PlotlyJSONEncoder)
+        # Create heatmap data from the columnar listening times
+        listening_times = process_listening_data(recent_tracks['items'])['listening_times']
+        chart_data['heatmap'] = matrix(create_heatmap_data(listening_times))
     
-    return charts
+    return chart_data
 
+@timed('analytics')
 def analyze_mood_characteristics(features_summary):
     """Analyze mood characteristics from audio features"""
     insights = {}
@@ -372,8 +943,17 @@ def analyze_mood_characteristics(features_summary):
     
     return insights
 
-def generate_insights(top_tracks, top_artists, recent_tracks, playlists):
-    """Generate comprehensive insights about user's music taste"""
+@timed('analytics')
+def generate_insights(top_tracks, top_artists, recent_tracks, playlists, patterns=None,
+                      playlist_tracks=None, playlist_artists=None):
+    """
+    Generate comprehensive insights about user's music taste
+    
+    Pass the listening patterns when the caller already computed them, so the
+    listening data is not parsed a second time. ``playlist_tracks`` maps
+    playlist ids to their items, as returned by fetch_playlist_tracks, and
+    ``playlist_artists`` maps artist ids to full artist objects with genres.
+    """
     insights = {}
     
     # Genre analysis
@@ -390,8 +970,9 @@ def generate_insights(top_tracks, top_artists, recent_tracks, playlists):
     
     # Listening time analysis
     if recent_tracks['items']:
-        listening_data = process_listening_data(recent_tracks['items'])
-        patterns = analyze_listening_patterns(listening_data.get('listening_times', []))
+        if patterns is None:
+            listening_data = process_listening_data(recent_tracks['items'])
+            patterns = analyze_listening_patterns(listening_data.get('listening_times', []))
         insights['listening_patterns'] = patterns
     
     # Artist diversity
@@ -407,6 +988,27 @@ def generate_insights(top_tracks, top_artists, recent_tracks, playlists):
         insights['playlist_count'] = len(playlists['items'])
         insights['total_playlist_tracks'] = sum(playlist['tracks']['total'] for playlist in playlists['items'])
     
+    # Playlist contents
+    if playlist_tracks:
+        tracks = [item['track'] for items in playlist_tracks.values() for item in items if item.get('track')]
+        insights['unique_playlist_tracks'] = len(set(track.get('id') or track.get('name') for track in tracks))
+        
+        playlist_artist_counts = {}
+        for track in tracks:
+            for artist in track.get('artists') or []:
+                playlist_artist_counts[artist['name']] = playlist_artist_counts.get(artist['name'], 0) + 1
+        insights['top_playlist_artists'] = sorted(playlist_artist_counts.items(), key=lambda x: x[1],
+                                                  reverse=True)[:5]
+        
+        if playlist_artists:
+            playlist_genre_counts = {}
+            for track in tracks:
+                for artist in track.get('artists') or []:
+                    for genre in (playlist_artists.get(artist.get('id')) or {}).get('genres', []):
+                        playlist_genre_counts[genre] = playlist_genre_counts.get(genre, 0) + 1
+            insights['top_playlist_genres'] = sorted(playlist_genre_counts.items(), key=lambda x: x[1],
+                                                     reverse=True)[:5]
+    
     return insights
 
 @app.route('/api/user-data')
@@ -418,7 +1020,7 @@ def api_user_data():
     
     try:
         user = sp.current_user()
-        return jsonify({
+        return json_response({
             'id': user['id'],
             'display_name': user['display_name'],
             'email': user.get('email', ''),
@@ -451,7 +1053,7 @@ def api_top_tracks():
                 'image': track['album']['images'][0]['url'] if track['album']['images'] else None
             })
         
-        return jsonify(tracks_data)
+        return json_response(tracks_data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -465,17 +1067,73 @@ def api_mood_insights():
     try:
         top_tracks = sp.current_user_top_tracks(limit=20, time_range='short_term')
         track_ids = [track['id'] for track in top_tracks['items']]
-        audio_features = sp.audio_features(track_ids)
         
-        features_summary = get_audio_features_summary(audio_features)
-        mood_insights = analyze_mood_characteristics(features_summary)
+        def build():
+            audio_features = audio_features_store.fetch(sp, track_ids)
+            
+            features_summary = get_audio_features_summary(audio_features)
+            mood_insights = analyze_mood_characteristics(features_summary)
+            
+            return {
+                'features': features_summary,
+                'insights': mood_insights
+            }
         
-        return jsonify({
-            'features': features_summary,
-            'insights': mood_insights
-        })
+        # Audio features never change, so the track ids determine the response
+        return versioned_json_response(track_ids, build)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chart-data')
+def api_chart_data():
+    """API endpoint for the compact chart data of a page (?page=visualizations|mood)"""
+    sp = get_spotify_client()
+    if not sp:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    page = request.args.get('page', 'visualizations')
+    if page not in ('visualizations', 'mood'):
+        return jsonify({'error': f'Unknown chart page: {page}'}), 400
+    
+    try:
+        if page == 'mood':
+            return json_response({'mood': compute_mood_analysis(sp, session.get('user_id'))['mood_chart']})
+        return json_response(visualization_chart_data(sp))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """Submit a background computation; the response points at its status"""
+    sp = get_spotify_client()
+    if not sp:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    kind = (request.get_json(silent=True) or {}).get('kind') or request.form.get('kind')
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Unknown job kind: {kind}'}), 400
+    job = submit_job(kind, sp)
+    return jsonify(job_status(job)), 202, {'Location': url_for('api_job', job_id=job.id)}
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """Status of a background computation"""
+    job = owned_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/api/jobs/<job_id>/result')
+def api_job_result(job_id):
+    """Result of a background computation, or 202 while it is still running"""
+    job = owned_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if not job.done:
+        return jsonify(job_status(job)), 202
+    if job.status == FAILED:
+        return jsonify({'error': job.error}), 500
+    return jsonify(job.result)
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Cross-request batching of Spotify id lookups
+
+Endpoints such as audio features (100 ids per call) and artists (50 ids per
+call) take many ids at once. ``MicroBatcher`` collects the ids requested by
+concurrent callers for a few milliseconds, drops duplicates, sends full
+batches and hands every caller the results for its own ids. Ids already
+being fetched for someone else are waited for rather than requested again.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+
+class _Batch:
+    def __init__(self, client: Any):
+        self.client = client
+        self.ids: Dict[Hashable, None] = {}
+        self.closed = False
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results: Dict[Hashable, Any] = {}
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """
+    Merge concurrent id lookups into shared batch calls
+
+    The caller that opens a batch sends it once it is full or max_delay has
+    passed, whichever comes first; callers joining meanwhile add their ids to
+    it. A batch is sent with the client of the caller that opened it, so use
+    this only for data that is the same whichever user asks.
+
+    Args:
+        fetch: Called as fetch(client, ids) and returning results aligned with ids
+        batch_size: Most ids sent in one call
+        max_delay: Seconds an open batch waits for more ids
+    """
+
+    def __init__(self, fetch: Callable[[Any, List[Hashable]], List[Any]], batch_size: int,
+                 max_delay: float = 0.005):
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._open: Optional[_Batch] = None
+        self._pending: Dict[Hashable, _Batch] = {}
+        self._requested = 0
+        self._sent = 0
+        self._calls = 0
+
+    def get_many(self, client: Any, ids: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Look up ids, sharing calls with concurrent callers
+
+        Args:
+            client: Spotify client used if this caller has to send a batch
+            ids: Ids to look up; falsy ids are skipped
+
+        Returns:
+            Dictionary of id to result for every id requested; an exception
+            raised by a batch call is raised to every caller waiting on it
+        """
+        wanted = [item for item in dict.fromkeys(ids) if item]
+        batches: Dict[_Batch, None] = {}
+        ready: List[_Batch] = []
+        opened: Optional[_Batch] = None
+        with self._lock:
+            self._requested += len(wanted)
+            for item in wanted:
+                batch = self._pending.get(item)
+                if batch is None:
+                    batch = self._open
+                    if batch is None:
+                        batch = opened = self._open = _Batch(client)
+                    batch.ids[item] = None
+                    self._pending[item] = batch
+                    if len(batch.ids) >= self.batch_size:
+                        ready.append(self._close(batch))
+                batches[batch] = None
+
+        for batch in ready:
+            self._send(batch)
+        if opened is not None and not opened.closed:
+            opened.full.wait(self.max_delay)
+            with self._lock:
+                send = not opened.closed
+                if send:
+                    self._close(opened)
+            if send:
+                self._send(opened)
+
+        results = {}
+        for batch in batches:
+            batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+            results.update((item, batch.results.get(item)) for item in wanted if item in batch.ids)
+        return results
+
+    def _close(self, batch: _Batch) -> _Batch:
+        # Called with the lock held; no more ids are added once closed
+        batch.closed = True
+        if self._open is batch:
+            self._open = None
+        batch.full.set()
+        return batch
+
+    def _send(self, batch: _Batch) -> None:
+        ids = list(batch.ids)
+        try:
+            batch.results = dict(zip(ids, self.fetch(batch.client, ids)))
+        except BaseException as e:
+            batch.error = e
+        finally:
+            with self._lock:
+                for item in ids:
+                    if self._pending.get(item) is batch:
+                        del self._pending[item]
+                self._sent += len(ids)
+                self._calls += 1
+            batch.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return ids requested by callers, ids sent and batch calls made"""
+        with self._lock:
+            return {
+                'requested': self._requested,
+                'sent': self._sent,
+                'calls': self._calls,
+                'pending': len(self._pending)
+            }
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark cross-user batching of audio-features and artist lookups
+
+Simulates many users loading a page at the same moment, each needing the
+audio features of its top tracks and the artists behind them, drawn from a
+popularity-skewed catalog so users overlap like real listeners do. Compares
+every request fetching its own ids against MicroBatcher sharing calls, and
+reports API calls, ids sent and wall time.
+
+Usage:
+    python benchmarks/bench_batching.py [--users 50] [--latency-ms 40]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np  # noqa: E402
+
+from batching import MicroBatcher  # noqa: E402
+from benchmarks.payloads import FakeSpotify, PayloadGenerator  # noqa: E402
+
+AUDIO_FEATURES_BATCH = 100
+ARTISTS_BATCH = 50
+
+
+class CountingSpotify(FakeSpotify):
+    """FakeSpotify counting calls and ids per endpoint"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.calls = {'audio_features': 0, 'artists': 0}
+        self.ids = {'audio_features': 0, 'artists': 0}
+
+    def _count(self, endpoint, ids):
+        with self.lock:
+            self.calls[endpoint] += 1
+            self.ids[endpoint] += len(ids)
+
+    def audio_features(self, tracks=None):
+        self._count('audio_features', tracks)
+        return super().audio_features(tracks)
+
+    def artists(self, artists):
+        self._count('artists', artists)
+        return super().artists(artists)
+
+
+def user_requests(generator, users, tracks_per_user, seed=0):
+    """Track and artist ids each user needs, skewed towards popular tracks"""
+    catalog = generator.track_catalog
+    rng = np.random.default_rng(seed)
+    requests = []
+    for _ in range(users):
+        picks = np.minimum(rng.zipf(1.3, tracks_per_user) - 1, len(catalog) - 1)
+        tracks = [catalog[pick] for pick in picks.tolist()]
+        artists = list(dict.fromkeys(artist['id'] for track in tracks for artist in track['artists']))
+        requests.append(([track['id'] for track in tracks], artists[:ARTISTS_BATCH]))
+    return requests
+
+
+def isolated(sp):
+    def lookup(ids):
+        track_ids, artist_ids = ids
+        for start in range(0, len(track_ids), AUDIO_FEATURES_BATCH):
+            sp.audio_features(track_ids[start:start + AUDIO_FEATURES_BATCH])
+        for start in range(0, len(artist_ids), ARTISTS_BATCH):
+            sp.artists(artist_ids[start:start + ARTISTS_BATCH])
+    return lookup
+
+
+def batched(sp, window):
+    features = MicroBatcher(lambda client, ids: client.audio_features(ids), AUDIO_FEATURES_BATCH, window)
+    artists = MicroBatcher(lambda client, ids: client.artists(ids)['artists'], ARTISTS_BATCH, window)
+
+    def lookup(ids):
+        track_ids, artist_ids = ids
+        features.get_many(sp, track_ids)
+        artists.get_many(sp, artist_ids)
+    return lookup
+
+
+def run(sp, lookup, requests):
+    barrier = threading.Barrier(len(requests))
+
+    def page(ids):
+        barrier.wait()
+        lookup(ids)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        list(executor.map(page, requests))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--tracks', type=int, default=50, help='Tracks each user needs features for')
+    parser.add_argument('--latency-ms', type=float, default=40.0)
+    parser.add_argument('--window-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    generator = PayloadGenerator()
+    requests = user_requests(generator, args.users, args.tracks)
+    modes = {
+        'per request': isolated,
+        'micro-batched': lambda sp: batched(sp, args.window_ms / 1000)
+    }
+
+    print(f"{'mode':<16}{'feature calls':>15}{'artist calls':>14}{'ids sent':>10}{'wall ms':>10}")
+    for mode, make_lookup in modes.items():
+        sp = CountingSpotify(generator, latency=args.latency_ms / 1000)
+        elapsed = run(sp, make_lookup(sp), requests)
+        print(f"{mode:<16}{sp.calls['audio_features']:>15}{sp.calls['artists']:>14}"
+              f"{sum(sp.ids.values()):>10}{elapsed * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
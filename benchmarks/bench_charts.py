@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark chart serialization in charts.py against plotly.graph_objects
+
+Builds the dashboard's bar and heatmap figures both ways, checks that the
+JSON is identical and reports the time per figure.
+
+Usage:
+    python benchmarks/bench_charts.py [--repeat 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.utils
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import charts
+from utils import DAYS
+
+
+def legacy_figures(names, values, heatmap):
+    """Reference implementation: graph_objects plus PlotlyJSONEncoder"""
+    bar = go.Figure(data=[go.Bar(x=names, y=values, marker_color='rgb(30, 215, 96)')])
+    bar.update_layout(title='Your Top Tracks', xaxis_title='Track', yaxis_title='Popularity',
+                      template='plotly_dark')
+    heat = go.Figure(data=go.Heatmap(z=heatmap, x=list(range(24)), y=DAYS, colorscale='Viridis'))
+    heat.update_layout(title='Listening Time Heatmap', xaxis_title='Hour of Day',
+                       yaxis_title='Day of Week', template='plotly_dark')
+    return [json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder) for fig in (bar, heat)]
+
+
+def fast_figures(names, values, heatmap):
+    return [
+        charts.bar_chart(names, values, 'rgb(30, 215, 96)', 'Your Top Tracks', 'Track',
+                         'Popularity'),
+        charts.heatmap_chart(heatmap, list(range(24)), DAYS, 'Listening Time Heatmap',
+                             'Hour of Day', 'Day of Week')
+    ]
+
+
+def timed(func, repeat, *args):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - started) / repeat / 2 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = [f'Track {i}' for i in range(50)]
+    values = rng.integers(0, 100, 50).tolist()
+    heatmap = rng.integers(0, 30, (7, 24)).tolist()
+
+    for legacy, fast in zip(legacy_figures(names, values, heatmap),
+                            fast_figures(names, values, heatmap)):
+        assert json.loads(legacy) == json.loads(fast), 'figure JSON differs'
+
+    legacy_ms = timed(legacy_figures, args.repeat, names, values, heatmap)
+    fast_ms = timed(fast_figures, args.repeat, names, values, heatmap)
+
+    print(f'graph_objects:        {legacy_ms:8.3f} ms/figure')
+    print(f'charts:               {fast_ms:8.3f} ms/figure  ({legacy_ms / fast_ms:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare the export formats on a synthetic listening history
+
+Streams the same plays through every format in exporters.py and reports
+the size of the download, the time to write it and the time to read it
+back into a table (pandas for the text formats, pyarrow for the columnar
+ones). Parquet and Arrow are skipped when pyarrow is not installed.
+
+Usage:
+    python benchmarks/bench_exports.py [--plays 200000]
+"""
+
+import argparse
+import gzip
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd  # noqa: E402
+
+import exporters  # noqa: E402
+from benchmarks.payloads import PayloadGenerator  # noqa: E402
+
+
+def read_csv(data):
+    return len(pd.read_csv(io.BytesIO(data), parse_dates=['played_at'], date_format='ISO8601'))
+
+
+def read_csv_gzip(data):
+    return read_csv(gzip.decompress(data))
+
+
+def read_ndjson(data):
+    return len(pd.read_json(io.BytesIO(data), lines=True))
+
+
+def read_parquet(data):
+    import pyarrow.parquet as pq
+    return pq.read_table(io.BytesIO(data)).num_rows
+
+
+def read_arrow(data):
+    import pyarrow as pa
+    return pa.ipc.open_stream(data).read_all().num_rows
+
+
+# Label -> (format, compress, reader)
+CASES = {
+    'CSV': ('csv', None, read_csv),
+    'CSV + gzip': ('csv', 'gzip', read_csv_gzip),
+    'NDJSON': ('ndjson', None, read_ndjson),
+    'Parquet (zstd)': ('parquet', None, read_parquet),
+    'Arrow IPC': ('arrow', None, read_arrow)
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--plays', type=int, default=200000)
+    args = parser.parse_args()
+
+    columns, play_row = exporters.EXPORT_KINDS['plays']
+    plays = PayloadGenerator().plays(args.plays)
+
+    print(f'{"format":<16}{"size":>12}{"write":>12}{"read":>12}')
+    baseline = None
+    for label, (fmt, compress, reader) in CASES.items():
+        if exporters.EXPORT_FORMATS[fmt][3] and not exporters.pyarrow_available():
+            print(f'{label:<16}  skipped, pyarrow is not installed')
+            continue
+        started = time.perf_counter()
+        data = b''.join(exporters.export_stream(fmt, map(play_row, plays), columns, compress))
+        write_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        assert reader(data) == len(plays), f'{label} read back the wrong number of rows'
+        read_s = time.perf_counter() - started
+
+        baseline = baseline or len(data)
+        print(f'{label:<16}{len(data) / 1e6:9.2f} MB{write_s * 1000:9.0f} ms{read_s * 1000:9.0f} ms'
+              f'  ({len(data) / baseline:.2f}x size)')
+
+
+if __name__ == '__main__':
+    main()
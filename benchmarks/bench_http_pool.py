@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request Spotify latency with and without the shared HTTP pool
+
+Compares the old behaviour of get_spotify_client (a new SpotifyOAuth and a
+new spotipy.Spotify with its own session for every page) against clients
+sharing one pooled keep-alive session, using a local mock server.
+
+Usage:
+    python benchmarks/bench_http_pool.py [--requests 300] [--handshake-ms 20]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import spotipy
+from spotipy.oauth2 import SpotifyOAuth
+
+from http_pool import create_session, NullCacheHandler
+from mock_spotify import MockSpotifyServer
+
+
+def legacy_client(url):
+    SpotifyOAuth(client_id='bench', client_secret='bench', redirect_uri='http://localhost/callback',
+                 cache_handler=NullCacheHandler())
+    sp = spotipy.Spotify(auth='token')
+    sp.prefix = url
+    return sp
+
+
+def pooled_factory(url):
+    session = create_session()
+
+    def pooled_client(_url):
+        sp = spotipy.Spotify(auth='token', requests_session=session)
+        sp.prefix = url
+        return sp
+
+    return pooled_client
+
+
+def run(server, make_client, n):
+    """Time n page loads, each with a fresh client making one API call"""
+    latencies = []
+    connections_before = server.connections
+    for _ in range(n):
+        started = time.perf_counter()
+        make_client(server.url).current_user()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'connections': server.connections - connections_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--handshake-ms', type=float, default=20.0,
+                        help='Delay per new connection emulating TCP+TLS setup')
+    args = parser.parse_args()
+
+    with MockSpotifyServer(handshake_delay=args.handshake_ms / 1000) as server:
+        results = {
+            'new client per request': run(server, legacy_client, args.requests),
+            'shared pooled session': run(server, pooled_factory(server.url), args.requests)
+        }
+
+    print(f"{'mode':<24}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'conns':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<24}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['connections']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark the listening-data analytics in utils.py on synthetic plays
+
+Compares the columnar implementations in utils.py with the previous
+per-play Python loops (kept below as the reference) and checks that both
+produce the same results.
+
+Usage:
+    python benchmarks/bench_listening.py [--plays 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.payloads import PayloadGenerator
+from utils import process_listening_data, create_heatmap_data, analyze_listening_patterns
+
+
+def legacy_process_listening_data(recent_tracks):
+    """Reference implementation: one dict per play"""
+    listening_times = []
+    total_duration = 0
+    track_counts = {}
+    artist_counts = {}
+    for item in recent_tracks:
+        track = item['track']
+        played_at = datetime.fromisoformat(item['played_at'].replace('Z', '+00:00'))
+        listening_times.append({
+            'hour': played_at.hour,
+            'day': played_at.strftime('%A'),
+            'date': played_at.date(),
+            'track_name': track['name'],
+            'artist_name': track['artists'][0]['name']
+        })
+        track_counts[track['name']] = track_counts.get(track['name'], 0) + 1
+        for artist in track['artists']:
+            artist_counts[artist['name']] = artist_counts.get(artist['name'], 0) + 1
+        if 'duration_ms' in track:
+            total_duration += track['duration_ms']
+    return {
+        'listening_times': listening_times,
+        'total_duration': total_duration,
+        'total_tracks': len(recent_tracks),
+        'track_counts': track_counts,
+        'artist_counts': artist_counts,
+        'genre_counts': {}
+    }
+
+
+def legacy_create_heatmap_data(listening_times):
+    """Reference implementation: days.index() per play"""
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    heatmap_data = np.zeros((7, 24))
+    for time_data in listening_times:
+        heatmap_data[days.index(time_data['day'])][time_data['hour']] += 1
+    return heatmap_data
+
+
+def legacy_analyze_listening_patterns(listening_times):
+    """Reference implementation: one pass per field"""
+    hour_counts = {}
+    for time_data in listening_times:
+        hour_counts[time_data['hour']] = hour_counts.get(time_data['hour'], 0) + 1
+    day_counts = {}
+    for time_data in listening_times:
+        day_counts[time_data['day']] = day_counts.get(time_data['day'], 0) + 1
+    dates = [time_data['date'] for time_data in listening_times]
+    time_range_days = (max(dates) - min(dates)).days + 1
+    return {
+        'most_active_hour': max(hour_counts.items(), key=lambda x: x[1])[0],
+        'most_active_day': max(day_counts.items(), key=lambda x: x[1])[0],
+        'total_sessions': len(listening_times),
+        'avg_sessions_per_day': round(len(listening_times) / max(time_range_days, 1), 1),
+        'time_range_days': time_range_days,
+        'unique_days': len(set(dates)),
+        'hour_distribution': hour_counts,
+        'day_distribution': day_counts
+    }
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--plays', type=int, default=1000000)
+    args = parser.parse_args()
+
+    plays = PayloadGenerator().plays(args.plays)
+    # utils imports NumPy and pandas on first use; keep that out of the timings
+    process_listening_data(plays[:10])
+
+    legacy, legacy_process = timed(legacy_process_listening_data, plays)
+    legacy_heatmap, legacy_heat = timed(legacy_create_heatmap_data, legacy['listening_times'])
+    legacy_patterns, legacy_analyze = timed(legacy_analyze_listening_patterns, legacy['listening_times'])
+    columnar, columnar_process = timed(process_listening_data, plays)
+    heatmap, columnar_heat = timed(create_heatmap_data, columnar['listening_times'])
+    patterns, columnar_analyze = timed(analyze_listening_patterns, columnar['listening_times'])
+
+    for key in ('total_duration', 'total_tracks', 'track_counts', 'artist_counts'):
+        assert legacy[key] == columnar[key], key
+    assert np.array_equal(legacy_heatmap, heatmap)
+    assert legacy_patterns == patterns
+    sample = range(0, args.plays, max(args.plays // 1000, 1))
+    assert all(legacy['listening_times'][i] == columnar['listening_times'][i] for i in sample)
+
+    print(f'{args.plays:,} plays')
+    print(f"{'step':<30}{'legacy s':>10}{'columnar s':>12}{'speedup':>10}")
+    for step, old, new in (('process_listening_data', legacy_process, columnar_process),
+                           ('create_heatmap_data', legacy_heat, columnar_heat),
+                           ('analyze_listening_patterns', legacy_analyze, columnar_analyze),
+                           ('total', legacy_process + legacy_heat + legacy_analyze,
+                            columnar_process + columnar_heat + columnar_analyze)):
+        print(f'{step:<30}{old:>10.3f}{new:>12.3f}{old / new:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
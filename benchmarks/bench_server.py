@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Load-test the development server against the production gunicorn server
+
+Starts the app in a subprocess, once under Flask's development server as
+``python run.py`` used to serve it and once under gunicorn with the options
+run.py uses in production, with get_spotify_client patched to an in-process
+FakeSpotify whose calls sleep for --latency-ms. Then keeps --concurrency
+keep-alive connections busy for --duration seconds, cycling through a mix
+of pages and API calls, and reports throughput and latency percentiles.
+The gunicorn run is skipped when gunicorn is not installed.
+
+Usage:
+    python benchmarks/bench_server.py [--concurrency 32] [--duration 10]
+                                      [--workers 4] [--threads 8] [--latency-ms 40]
+"""
+
+import argparse
+import http.client
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+# Pages and API calls each connection cycles through
+PATHS = ('/dashboard', '/visualizations', '/api/top-tracks', '/api/chart-data', '/')
+
+
+def serve(server, port, workers, threads, latency):
+    """Run the app with a fake Spotify client; called in the server subprocess"""
+    os.environ.setdefault('FLASK_ENV', 'testing')
+    import app as sonify
+    from benchmarks.payloads import FakeSpotify
+    import run
+
+    sp = FakeSpotify.at_scale('small', latency=latency)
+    sonify.get_spotify_client = lambda: sp
+    sonify.prewarm()
+    if server == 'gunicorn':
+        options = run.gunicorn_options(dict(sonify.app.config, HOST='127.0.0.1', PORT=port,
+                                            WEB_WORKERS=workers, WEB_THREADS=threads))
+        options.update(accesslog=None, loglevel='warning')
+        run.serve_production(sonify.app, options)
+    else:
+        sonify.app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(port, process, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'Server exited with status {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit('Server did not start')
+
+
+def load(port, concurrency, duration):
+    """Issue requests on concurrency connections for duration seconds; return latencies and errors"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def connection(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        mine = []
+        n = index
+        while time.perf_counter() < deadline:
+            path = PATHS[n % len(PATHS)]
+            n += 1
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                ok = False
+            if ok:
+                mine.append(time.perf_counter() - started)
+            else:
+                with lock:
+                    errors[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=connection, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0]
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else float('nan')
+
+
+def run_server(server, args):
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__), '--serve', server, '--port', str(port),
+               '--workers', str(args.workers), '--threads', str(args.threads),
+               '--latency-ms', str(args.latency_ms)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port, process)
+        load(port, args.concurrency, 1.0)  # warm-up
+        return load(port, args.concurrency, args.duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per server')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=40.0, help='Latency of each Spotify call')
+    parser.add_argument('--serve', choices=('werkzeug', 'gunicorn'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.workers, args.threads, args.latency_ms / 1000)
+        return
+
+    servers = {'werkzeug': 'dev server', 'gunicorn': f'gunicorn {args.workers}x{args.threads}'}
+    if importlib.util.find_spec('gunicorn') is None:
+        print('gunicorn is not installed: pip install gunicorn to compare against it')
+        del servers['gunicorn']
+
+    print(f"{'server':<18}{'requests':>10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for server, label in servers.items():
+        latencies, errors = run_server(server, args)
+        print(f'{label:<18}{len(latencies):>10}{len(latencies) / args.duration:>9.1f}'
+              f'{percentile(latencies, 0.5):>9.1f}{percentile(latencies, 0.95):>9.1f}'
+              f'{percentile(latencies, 0.99):>9.1f}{errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cold start of the Flask app
+
+Each measurement runs in a fresh interpreter. Reports the slowest imports
+from ``python -X importtime -c "import app"``, the time to import the app,
+and the time until the first request to a few routes has been answered,
+with and without ``prewarm()``. Analytics routes are served by an
+in-process fake Spotify client, so only local work is measured.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+FIRST_REQUEST = '''
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+if {prewarm}:
+    app.prewarm()
+warmed = time.perf_counter()
+
+from unittest import mock
+from benchmarks.mock_spotify import default_responses
+
+
+class FakeSpotify:
+    """In-process client serving the mock server's canned responses"""
+    responses = default_responses()
+
+    def current_user(self):
+        return self.responses['/v1/me']
+
+    def current_user_top_tracks(self, **kwargs):
+        return self.responses['/v1/me/top/tracks']
+
+    def current_user_top_artists(self, **kwargs):
+        return self.responses['/v1/me/top/artists']
+
+    def current_user_recently_played(self, **kwargs):
+        return self.responses['/v1/me/player/recently-played']
+
+
+with mock.patch('app.get_spotify_client', return_value=FakeSpotify()):
+    with app.app.test_client() as client:
+        status = client.get({path!r}).status_code
+done = time.perf_counter()
+assert status < 400, status
+print(imported - started, warmed - imported, done - warmed)
+'''
+
+
+def run_python(args, code):
+    env = dict(os.environ, FLASK_ENV='testing', SPOTIPY_CLIENT_ID='bench',
+               SPOTIPY_CLIENT_SECRET='bench')
+    return subprocess.run([sys.executable, *args, '-c', code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_profile(top):
+    """Return the slowest modules imported directly by app as (cumulative us, module)"""
+    stderr = run_python(['-X', 'importtime'], 'import app').stderr
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Children are reported before their parent, indented two more spaces
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == 'app':
+                return sorted(children, reverse=True)[:top]
+            children = []
+    return []
+
+
+def first_request(path, prewarm, runs):
+    """Median (import, prewarm, first request) seconds over fresh processes"""
+    samples = []
+    for _ in range(runs):
+        stdout = run_python([], FIRST_REQUEST.format(path=path, prewarm=prewarm)).stdout
+        samples.append([float(value) for value in stdout.split()])
+    return [statistics.median(column) for column in zip(*samples)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    print('Slowest imports under app (cumulative):')
+    for cumulative, name in import_profile(args.top):
+        print(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+    print('\nCold start, median of fresh processes:')
+    print(f'  {"route":<16}{"prewarm":<9}{"import":>10}{"prewarm":>10}{"1st req":>10}{"total":>10}')
+    for path in ('/', '/login', '/visualizations'):
+        for prewarm in (False, True):
+            imported, warmed, request = first_request(path, prewarm, args.runs)
+            total = imported + warmed + request
+            print(f'  {path:<16}{str(prewarm):<9}{imported * 1000:8.1f}ms{warmed * 1000:8.1f}ms'
+                  f'{request * 1000:8.1f}ms{total * 1000:8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Time every utils.py function and every app.py route on synthetic payloads
+
+All payloads come from benchmarks/payloads.py, so a given --scale and
+--seed always measure the same work. Routes are served through Flask's test
+client with get_spotify_client patched to an in-process FakeSpotify, and
+the user's listening history pre-loaded with the generated plays. Response
+and figure caches are cleared before every repetition, so each timing is a
+cold request; routes that end in an error redirect are flagged, since
+their timings cover the error path. Results can be written to JSON and
+compared with an earlier run.
+
+Usage:
+    python benchmarks/bench_suite.py [--scale small] [--repeat 5] [--only REGEX]
+                                     [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('SPOTIPY_CLIENT_ID', 'bench')
+os.environ.setdefault('SPOTIPY_CLIENT_SECRET', 'bench')
+
+import app as sonify  # noqa: E402
+import exporters  # noqa: E402
+import utils  # noqa: E402
+from benchmarks.payloads import SCALES, FakeSpotify  # noqa: E402
+
+# Token handed out by FakeOAuth and stored in the benchmark session
+TOKEN_INFO = {'access_token': 'bench', 'refresh_token': 'bench', 'expires_at': 2 ** 31,
+              'token_type': 'Bearer', 'scope': ' '.join(sonify.SCOPES)}
+
+
+class FakeOAuth:
+    """Stand-in for the shared SpotifyOAuth manager"""
+
+    def get_authorize_url(self, state=None):
+        return 'https://accounts.spotify.com/authorize?client_id=bench'
+
+    def get_access_token(self, code=None, as_dict=True, check_cache=True):
+        return dict(TOKEN_INFO)
+
+    def is_token_expired(self, token_info):
+        return False
+
+    def refresh_access_token(self, refresh_token):
+        return dict(TOKEN_INFO)
+
+
+def utils_cases(sp):
+    """Return a zero-argument callable per public function in utils.py"""
+    plays = sp.history
+    listening = utils.process_listening_data(plays)
+    listening_times = listening['listening_times']
+    as_dicts = list(listening_times)
+    patterns = utils.analyze_listening_patterns(listening_times)
+    heatmap = utils.create_heatmap_data(listening_times)
+    features = sp.audio_features([track['id'] for track in sp.top_tracks])
+    summary = utils.get_audio_features_summary(features)
+    return {
+        'process_listening_data': lambda: utils.process_listening_data(plays),
+        'create_heatmap_data': lambda: utils.create_heatmap_data(listening_times),
+        'create_top_items_chart': lambda: utils.create_top_items_chart(sp.top_tracks, 'tracks'),
+        'create_heatmap_chart': lambda: utils.create_heatmap_chart(heatmap),
+        'as_listening_times': lambda: utils.as_listening_times(as_dicts),
+        'analyze_listening_patterns': lambda: utils.analyze_listening_patterns(listening_times),
+        'format_duration': lambda: [utils.format_duration(t['duration_ms']) for t in sp.top_tracks],
+        'get_audio_features_summary': lambda: utils.get_audio_features_summary(features),
+        'create_mood_analysis_chart': lambda: utils.create_mood_analysis_chart(summary),
+        'create_mood_chart_data': lambda: utils.create_mood_chart_data(summary),
+        'validate_spotify_credentials': lambda: utils.validate_spotify_credentials('bench', 'bench'),
+        'create_genre_analysis_chart': lambda: utils.create_genre_analysis_chart(sp.top_artists),
+        'analyze_music_taste_complexity': lambda: utils.analyze_music_taste_complexity(features),
+        'create_listening_timeline_chart': lambda: utils.create_listening_timeline_chart(listening_times),
+        'generate_music_personality_insights':
+            lambda: utils.generate_music_personality_insights(features, patterns),
+        'create_playlist_analysis_chart': lambda: utils.create_playlist_analysis_chart(sp.user_playlists)
+    }
+
+
+def exporter_cases(sp):
+    """Return a zero-argument callable per export format, one row per play"""
+    columns, play_row = exporters.EXPORT_KINDS['plays']
+
+    def export(fmt, compress=None):
+        rows = (play_row(play) for play in sp.history)
+        return lambda: sum(map(len, exporters.export_stream(fmt, rows, columns, compress)))
+    cases = {'csv_stream': export('csv'), 'csv_stream+gzip': export('csv', 'gzip'),
+             'ndjson_stream': export('ndjson')}
+    if exporters.pyarrow_available():
+        cases.update({'parquet_stream': export('parquet'), 'arrow_stream': export('arrow')})
+    return cases
+
+
+def route_cases(sp, client):
+    """Return a zero-argument callable per GET route in app.py"""
+    cases = {}
+    for rule in sonify.app.url_map.iter_rules():
+        if rule.endpoint == 'static' or 'GET' not in rule.methods or rule.arguments:
+            continue
+        path = rule.rule + ('?code=bench' if rule.endpoint == 'callback' else '')
+
+        def request(path=path):
+            response = client.get(path)
+            response.get_data()  # drain streamed bodies
+            assert response.status_code < 500, (path, response.status_code)
+            return response
+        cases[f'GET {rule.rule}'] = request
+    return cases
+
+
+def route_outcome(client, user_id, func):
+    """Call a route once and describe how it ended: status, redirect and flashed error"""
+    log_in(client, user_id)
+    response = func()
+    with client.session_transaction() as sess:
+        errors = [message for category, message in sess.get('_flashes', []) if category == 'error']
+    outcome = {'status': response.status_code}
+    if response.location:
+        outcome['location'] = response.location
+    if errors:
+        outcome['error'] = errors[-1]
+    return outcome
+
+
+def log_in(client, user_id):
+    with client.session_transaction() as sess:
+        sess['token_info'] = dict(TOKEN_INFO)
+        sess['user_id'] = user_id
+        sess.pop('_flashes', None)
+
+
+def clear_caches():
+    sonify.spotify_cache.clear()
+
+
+def measure(func, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return {
+        'min_ms': min(samples) * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'repeat': repeat
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scale, seed, repeat, only=None, latency=0.0):
+    """Run every case and return the results document"""
+    sp = FakeSpotify.at_scale(scale, seed, latency)
+    user_id = sp.current_user()['id']
+    sonify.history_store.append(user_id, sp.history)
+
+    cases = {f'utils.{name}': func for name, func in utils_cases(sp).items()}
+    cases.update({f'exporters.{name}': func for name, func in exporter_cases(sp).items()})
+    public = {name for name, func in inspect.getmembers(utils, inspect.isfunction)
+              if func.__module__ == 'utils' and not name.startswith('_')}
+    missing = public - {name.split('.', 1)[1] for name in cases if name.startswith('utils.')}
+    if missing:
+        raise SystemExit(f'No benchmark case for utils functions: {", ".join(sorted(missing))}')
+
+    results = {}
+    with mock.patch('app.get_spotify_client', return_value=sp), \
+            mock.patch('app.create_spotify_oauth', return_value=FakeOAuth()):
+        client = sonify.app.test_client()
+        routes = route_cases(sp, client)
+        cases.update(routes)
+        for name, func in cases.items():
+            if only and not re.search(only, name):
+                continue
+
+            def before():
+                clear_caches()
+                log_in(client, user_id)
+            # Routes also serve as their own warm-up call, so errors show up in the results
+            outcome = route_outcome(client, user_id, func) if name in routes else {}
+            results[name] = dict(measure(func, repeat, before), **outcome)
+            note = f'  [{outcome["error"]}]' if 'error' in outcome else ''
+            print(f'{name:<48}{results[name]["median_ms"]:10.2f} ms{note}')
+
+    return {
+        'meta': {
+            'scale': scale,
+            'sizes': SCALES[scale],
+            'seed': seed,
+            'latency': latency,
+            'repeat': repeat,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        },
+        'results': results
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print the median change of every case present in both runs"""
+    print(f'\nCompared with {baseline["meta"].get("commit")} ({baseline["meta"]["scale"]} scale):')
+    regressions = 0
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print(f'{name:<48}{before["median_ms"]:10.2f} ->{result["median_ms"]:10.2f} ms'
+              f'  ({ratio:5.2f}x){flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds each fake Spotify call takes, to measure round trips')
+    parser.add_argument('--only', help='Only run cases whose name matches this regex')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Compare with the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative median change reported as a regression')
+    args = parser.parse_args()
+
+    current = run_suite(args.scale, args.seed, args.repeat, args.only, args.latency)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f'\nResults written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(current, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Local mock of the Spotify Web API for benchmarks
+
+Serves canned JSON for the endpoints Sonify uses over keep-alive HTTP/1.1.
+``handshake_delay`` is paid once per new TCP connection to emulate the
+TCP+TLS setup cost of talking to api.spotify.com, and ``latency`` is added
+to every response. With ``quota`` set, requests beyond that many per
+``window`` seconds are answered 429 with a ``Retry-After`` header giving the
+time left in the window, like Spotify's rate limit.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+USER = {'id': 'bench_user', 'display_name': 'Bench User', 'followers': {'total': 0}}
+
+
+def _track(i):
+    return {
+        'id': f'track{i}',
+        'name': f'Track {i}',
+        'popularity': i % 100,
+        'duration_ms': 180000 + i,
+        'artists': [{'id': f'artist{i % 50}', 'name': f'Artist {i % 50}'}],
+        'album': {'name': f'Album {i % 20}', 'images': []}
+    }
+
+
+def default_responses():
+    """Canned responses keyed by request path"""
+    tracks = [_track(i) for i in range(50)]
+    return {
+        '/v1/me': USER,
+        '/v1/me/top/tracks': {'items': tracks, 'total': 50, 'limit': 50, 'offset': 0},
+        '/v1/me/top/artists': {'items': [], 'total': 0, 'limit': 50, 'offset': 0},
+        '/v1/me/player/recently-played': {
+            'items': [{'track': t, 'played_at': '2024-01-01T12:00:00.000Z'} for t in tracks],
+            'cursors': None
+        },
+        '/v1/me/playlists': {'items': [], 'total': 0, 'limit': 50, 'offset': 0}
+    }
+
+
+class MockSpotifyServer:
+    """
+    Threaded mock Spotify server running in a background thread
+
+    Args:
+        latency: Seconds added to every response
+        handshake_delay: Seconds added once per new connection
+        responses: Mapping of path to JSON-serializable body
+        quota: Requests accepted per window, None for no limit
+        window: Length of a quota window in seconds
+    """
+
+    def __init__(self, latency=0.0, handshake_delay=0.0, responses=None, quota=None, window=1.0):
+        self.latency = latency
+        self.handshake_delay = handshake_delay
+        self.responses = responses or default_responses()
+        self.quota = quota
+        self.window = window
+        self.requests = 0
+        self.connections = 0
+        self.throttled = 0
+        self._current = (0, 0)  # (window number, requests accepted in it)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/v1/'
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Send headers and body in one segment to avoid delayed-ACK stalls
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                if server.handshake_delay:
+                    time.sleep(server.handshake_delay)
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                status, body, headers = server.respond(urlparse(self.path).path)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def respond(self, path):
+        """Return (status, body, headers) for a request path"""
+        retry_after = self._admit() if self.quota is not None else None
+        if retry_after is not None:
+            return 429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}}, \
+                {'Retry-After': f'{retry_after:.3f}'}
+        body = self.responses.get(path.rstrip('/'))
+        if body is None:
+            return 404, {'error': {'status': 404, 'message': 'Not found'}}, {}
+        return 200, body, {}
+
+    def _admit(self):
+        """Count a request against the quota; return None, or the seconds until it resets"""
+        with self._lock:
+            now = time.monotonic()
+            number = int(now // self.window)
+            current, accepted = self._current
+            if current != number:
+                current, accepted = number, 0
+            if accepted >= self.quota:
+                self.throttled += 1
+                return (number + 1) * self.window - now
+            self._current = (current, accepted + 1)
+            return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,318 @@
+"""
+Deterministic generator of realistic Spotify Web API payloads
+
+``PayloadGenerator`` builds tracks, artists, plays, audio features and
+playlists shaped like the spotipy responses the app consumes, at any scale
+from a handful of items to millions of plays. The same seed always yields
+the same payloads, so benchmark runs on different commits are comparable.
+
+``FakeSpotify`` serves those payloads through the spotipy client methods
+used by app.py, including paging, so routes can be timed without a network.
+"""
+
+import string
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+GENRES = [
+    'pop', 'dance pop', 'rock', 'indie rock', 'alternative rock', 'hip hop', 'rap', 'trap',
+    'r&b', 'soul', 'jazz', 'classical', 'electronic', 'house', 'techno', 'ambient', 'folk',
+    'indie folk', 'country', 'metal', 'punk', 'reggaeton', 'latin', 'k-pop', 'lo-fi'
+]
+
+_ID_ALPHABET = np.array(list(string.ascii_letters + string.digits))
+
+# Named scales used by the benchmark scripts
+SCALES = {
+    'tiny': {'plays': 50, 'top_items': 50, 'playlists': 20},
+    'small': {'plays': 1000, 'top_items': 50, 'playlists': 50},
+    'medium': {'plays': 50000, 'top_items': 50, 'playlists': 200},
+    'large': {'plays': 1000000, 'top_items': 50, 'playlists': 1000}
+}
+
+
+def spotify_ids(kind: str, n: int, seed: int = 0) -> List[str]:
+    """Return stable 22-character base62 ids for the first n items of a kind"""
+    rng = np.random.default_rng([seed, *kind.encode()])
+    chars = _ID_ALPHABET[rng.integers(0, len(_ID_ALPHABET), (n, 22))]
+    return [''.join(row) for row in chars.tolist()]
+
+
+def page(items: List[Any], limit: int, offset: int, total: Optional[int] = None) -> Dict[str, Any]:
+    """Wrap items in a Spotify paging object"""
+    total = len(items) if total is None else total
+    return {
+        'href': None,
+        'items': items,
+        'limit': limit,
+        'offset': offset,
+        'total': total,
+        'next': 'next' if offset + limit < total else None,
+        'previous': 'previous' if offset > 0 else None
+    }
+
+
+class PayloadGenerator:
+    """
+    Generator of synthetic Spotify payloads
+
+    Tracks and artists come from a fixed catalog; plays pick catalog tracks
+    with a Zipf-like skew, so a few favourites dominate the way they do in
+    real listening histories.
+
+    Args:
+        seed: Seed for every random choice
+        catalog_size: Number of distinct tracks
+        artist_count: Number of distinct artists
+    """
+
+    def __init__(self, seed: int = 0, catalog_size: int = 20000, artist_count: int = 2000):
+        self.seed = seed
+        self.catalog_size = catalog_size
+        self.artist_count = artist_count
+        self._artists: Optional[List[Dict[str, Any]]] = None
+        self._tracks: Optional[List[Dict[str, Any]]] = None
+
+    def _rng(self, *stream: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, *stream])
+
+    def user(self) -> Dict[str, Any]:
+        """Return a current_user() payload"""
+        return {
+            'id': f'bench-user-{self.seed}',
+            'display_name': 'Bench User',
+            'email': 'bench@example.com',
+            'country': 'US',
+            'product': 'premium',
+            'followers': {'total': 42},
+            'images': []
+        }
+
+    @property
+    def artist_catalog(self) -> List[Dict[str, Any]]:
+        """Every artist in the catalog, built once"""
+        if self._artists is None:
+            rng = self._rng(1)
+            genre_counts = rng.integers(0, 4, self.artist_count)
+            popularity = rng.integers(0, 101, self.artist_count)
+            followers = (rng.pareto(1.2, self.artist_count) * 1000).astype(int)
+            artist_ids = spotify_ids('artist', self.artist_count, self.seed)
+            artists = []
+            for i, artist_id in enumerate(artist_ids):
+                genres = rng.choice(len(GENRES), genre_counts[i], replace=False)
+                artists.append({
+                    'id': artist_id,
+                    'name': f'Artist {i}',
+                    'uri': f'spotify:artist:{artist_id}',
+                    'genres': [GENRES[g] for g in genres],
+                    'popularity': int(popularity[i]),
+                    'followers': {'href': None, 'total': int(followers[i])},
+                    'images': []
+                })
+            self._artists = artists
+        return self._artists
+
+    @property
+    def track_catalog(self) -> List[Dict[str, Any]]:
+        """Every track in the catalog, built once"""
+        if self._tracks is None:
+            artists = self.artist_catalog
+            rng = self._rng(2)
+            main_artist = rng.integers(0, self.artist_count, self.catalog_size)
+            featured = rng.integers(0, self.artist_count, self.catalog_size)
+            has_featured = rng.random(self.catalog_size) < 0.25
+            popularity = rng.integers(0, 101, self.catalog_size)
+            duration = rng.normal(210000, 45000, self.catalog_size).clip(30000, 900000).astype(int)
+            explicit = rng.random(self.catalog_size) < 0.2
+            track_ids = spotify_ids('track', self.catalog_size, self.seed)
+            album_ids = spotify_ids('album', self.catalog_size // 10 + 1, self.seed)
+            tracks = []
+            for i, track_id in enumerate(track_ids):
+                track_artists = [artists[main_artist[i]]]
+                if has_featured[i] and featured[i] != main_artist[i]:
+                    track_artists.append(artists[featured[i]])
+                album = i // 10
+                tracks.append({
+                    'id': track_id,
+                    'name': f'Track {i}',
+                    'uri': f'spotify:track:{track_id}',
+                    'popularity': int(popularity[i]),
+                    'duration_ms': int(duration[i]),
+                    'explicit': bool(explicit[i]),
+                    'artists': [{'id': a['id'], 'name': a['name'], 'uri': a['uri']}
+                                for a in track_artists],
+                    'album': {
+                        'id': album_ids[album],
+                        'name': f'Album {album}',
+                        'release_date': f'{2000 + album % 25}-01-01',
+                        'images': []
+                    }
+                })
+            self._tracks = tracks
+        return self._tracks
+
+    def tracks(self, n: int) -> List[Dict[str, Any]]:
+        """Return the first n catalog tracks, e.g. for top tracks"""
+        catalog = self.track_catalog
+        return [catalog[i % len(catalog)] for i in range(n)]
+
+    def artists(self, n: int) -> List[Dict[str, Any]]:
+        """Return the first n catalog artists, e.g. for top artists"""
+        catalog = self.artist_catalog
+        return [catalog[i % len(catalog)] for i in range(n)]
+
+    def plays(self, n: int, start: datetime = datetime(2022, 1, 1, tzinfo=timezone.utc),
+              days: int = 3 * 365) -> List[Dict[str, Any]]:
+        """
+        Return n recently-played items, newest first
+
+        Args:
+            n: Number of plays
+            start: Time of the earliest possible play
+            days: Length of the period the plays are spread over
+
+        Returns:
+            Items shaped like ``current_user_recently_played()['items']``
+        """
+        catalog = self.track_catalog
+        rng = self._rng(3, n)
+        picks = (rng.zipf(1.1, n) - 1) % len(catalog)
+        offsets_ms = np.sort(rng.integers(0, days * 86400 * 1000, n))[::-1]
+        start_ms = np.datetime64(start.replace(tzinfo=None), 'ms')
+        timestamps = np.datetime_as_string(start_ms + offsets_ms.astype('timedelta64[ms]'), unit='ms')
+        return [
+            {'track': catalog[pick], 'played_at': f'{timestamp}Z', 'context': None}
+            for pick, timestamp in zip(picks.tolist(), timestamps.tolist())
+        ]
+
+    def audio_features(self, track_ids: List[str], missing_ratio: float = 0.02) -> List[Optional[Dict[str, Any]]]:
+        """
+        Return audio features aligned with track_ids
+
+        Features depend only on the seed and the id, and about missing_ratio
+        of the tracks have none, like local files and podcasts on Spotify.
+        """
+        features = []
+        for track_id in track_ids:
+            rng = np.random.default_rng([self.seed, 4, *track_id.encode()])
+            values = rng.random(8)
+            if values[7] < missing_ratio:
+                features.append(None)
+                continue
+            features.append({
+                'id': track_id,
+                'danceability': round(float(values[0]), 3),
+                'energy': round(float(values[1]), 3),
+                'valence': round(float(values[2]), 3),
+                'acousticness': round(float(values[3]), 4),
+                'instrumentalness': round(float(values[4]) ** 4, 4),
+                'liveness': round(float(values[5]) * 0.5, 4),
+                'speechiness': round(float(values[6]) * 0.3, 4),
+                'tempo': round(60 + float(values[0]) * 120, 3),
+                'loudness': round(-30 + float(values[1]) * 28, 3),
+                'key': int(values[2] * 12),
+                'mode': int(values[3] > 0.4),
+                'time_signature': 4,
+                'duration_ms': 210000
+            })
+        return features
+
+    def playlists(self, n: int) -> List[Dict[str, Any]]:
+        """Return n simplified playlist objects"""
+        rng = self._rng(5, n)
+        sizes = (rng.pareto(1.5, n) * 40).astype(int) + 1
+        playlist_ids = spotify_ids('playlist', n, self.seed)
+        return [
+            {
+                'id': playlist_ids[i],
+                'name': f'Playlist {i}',
+                'public': bool(i % 3),
+                'collaborative': False,
+                'owner': {'id': f'bench-user-{self.seed}', 'display_name': 'Bench User'},
+                'tracks': {'href': None, 'total': int(sizes[i])},
+                'images': []
+            }
+            for i in range(n)
+        ]
+
+
+class FakeSpotify:
+    """
+    In-process stand-in for spotipy.Spotify serving generated payloads
+
+    Args:
+        generator: Source of the payloads
+        plays: Number of plays in the user's history
+        top_items: Number of top tracks and top artists available
+        playlists: Number of playlists the user has
+        latency: Seconds each API call sleeps, emulating a network round trip
+    """
+
+    def __init__(self, generator: PayloadGenerator, plays: int = 50, top_items: int = 50,
+                 playlists: int = 20, latency: float = 0.0):
+        self.generator = generator
+        self.latency = latency
+        self.history = generator.plays(plays)
+        self.top_tracks = generator.tracks(top_items)
+        self.top_artists = generator.artists(top_items)
+        self.user_playlists = generator.playlists(playlists)
+        self._playlist_sizes = {p['id']: p['tracks']['total'] for p in self.user_playlists}
+
+    @classmethod
+    def at_scale(cls, scale: str, seed: int = 0, latency: float = 0.0) -> 'FakeSpotify':
+        """Create a client for one of the named SCALES"""
+        return cls(PayloadGenerator(seed), latency=latency, **SCALES[scale])
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def current_user(self):
+        self._round_trip()
+        return self.generator.user()
+
+    def current_user_top_tracks(self, limit=20, offset=0, time_range='medium_term'):
+        self._round_trip()
+        return page(self.top_tracks[offset:offset + limit], limit, offset, len(self.top_tracks))
+
+    def current_user_top_artists(self, limit=20, offset=0, time_range='medium_term'):
+        self._round_trip()
+        return page(self.top_artists[offset:offset + limit], limit, offset, len(self.top_artists))
+
+    def current_user_recently_played(self, limit=50, after=None, before=None):
+        self._round_trip()
+        items = self.history[:limit]
+        cursors = None
+        if items:
+            cursors = {'after': str(self._played_ms(items[0])), 'before': str(self._played_ms(items[-1]))}
+        return {'items': items, 'limit': limit, 'cursors': cursors, 'next': None, 'href': None}
+
+    def current_user_playlists(self, limit=50, offset=0):
+        self._round_trip()
+        return page(self.user_playlists[offset:offset + limit], limit, offset, len(self.user_playlists))
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, market=None,
+                       additional_types=('track', 'episode')):
+        self._round_trip()
+        size = self._playlist_sizes[playlist_id]
+        catalog = self.generator.track_catalog
+        rng = np.random.default_rng([self.generator.seed, 6, *playlist_id.encode()])
+        picks = rng.integers(0, len(catalog), size)[offset:offset + limit]
+        return page([{'track': catalog[pick]} for pick in picks.tolist()], limit, offset, size)
+
+    def audio_features(self, tracks=None):
+        self._round_trip()
+        return self.generator.audio_features(list(tracks or []))
+
+    def artists(self, artists):
+        self._round_trip()
+        by_id = {artist['id']: artist for artist in self.generator.artist_catalog}
+        return {'artists': [by_id.get(artist_id) for artist_id in artists]}
+
+    @staticmethod
+    def _played_ms(item):
+        played_at = np.datetime64(item['played_at'].rstrip('Z'), 'ms')
+        return int(played_at.astype(np.int64))
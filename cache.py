@@ -0,0 +1,173 @@
+"""
+In-process caching for Spotify Web API responses
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from singleflight import SingleFlight
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a time-to-live
+
+    Args:
+        max_entries: Maximum number of entries kept before the least recently
+            used one is evicted
+        default_ttl: TTL in seconds used when ``set`` is called without one
+        clock: Monotonic time source, injectable for tests
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self._misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value under key, evicting least recently used entries if full"""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, self._clock() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate; returns the count"""
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self) -> None:
+        """Drop all entries and reset statistics"""
+        with self._lock:
+            self._data.clear()
+            self._hits = self._misses = self._evictions = self._expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss statistics for the cache"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _freeze(value: Any) -> Hashable:
+    """Turn call arguments into a hashable cache key component"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class CachedSpotify:
+    """
+    Proxy around a spotipy client that caches read-only endpoints per user
+
+    Calls to methods listed in ``ttls`` are served from ``cache`` when a fresh
+    entry exists for the same user, method and arguments; every other
+    attribute is passed straight through to the wrapped client. With
+    ``flights``, concurrent misses for the same key share one upstream call.
+
+    Args:
+        client: Authenticated ``spotipy.Spotify`` instance
+        user_id: Spotify user id the client is authenticated as
+        cache: Shared TTLCache holding responses for all users
+        ttls: Mapping of client method name to TTL in seconds
+        flights: SingleFlight shared by all proxies, keyed like the cache
+    """
+
+    def __init__(self, client: Any, user_id: str, cache: TTLCache,
+                 ttls: Dict[str, float], flights: Optional[SingleFlight] = None):
+        self._client = client
+        self.user_id = user_id
+        self._cache = cache
+        self._ttls = ttls
+        self._flights = flights
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        ttl = self._ttls.get(name)
+        if ttl is None or not callable(attr):
+            return attr
+
+        def fetch(key, *args, **kwargs):
+            result = attr(*args, **kwargs)
+            self._cache.set(key, result, ttl)
+            return result
+
+        def cached_call(*args, **kwargs):
+            key = self.cache_key(name, *args, **kwargs)
+            result = self._cache.get(key, _MISSING)
+            if result is _MISSING:
+                if self._flights is None:
+                    result = fetch(key, *args, **kwargs)
+                else:
+                    result = self._flights.do(key, fetch, key, *args, **kwargs)
+            return result
+
+        cached_call.__name__ = name
+        return cached_call
+
+    def cache_key(self, method: str, *args, **kwargs) -> Hashable:
+        """Build the cache key for a call made by this user"""
+        return (self.user_id, method, _freeze(args), _freeze(kwargs))
+
+    def prime(self, method: str, result: Any, *args, **kwargs) -> None:
+        """Seed the cache with a response obtained outside the proxy"""
+        ttl = self._ttls.get(method)
+        if ttl is not None:
+            self._cache.set(self.cache_key(method, *args, **kwargs), result, ttl)
+
+    @property
+    def client(self) -> Any:
+        """The wrapped, uncached spotipy client"""
+        return self._client
+
+
+def invalidate_user(cache: TTLCache, user_id: str) -> int:
+    """Drop every cached response belonging to user_id"""
+    return cache.invalidate(lambda key: isinstance(key, tuple) and key[:1] == (user_id,))
@@ -0,0 +1,150 @@
+"""
+Lightweight Plotly figure builder
+
+Builds the same figure JSON as ``plotly.graph_objects`` followed by
+``json.dumps(fig, cls=PlotlyJSONEncoder)``, but straight from plain dicts,
+lists and NumPy arrays, skipping graph_objects validation. The expanded
+``plotly_dark`` template is serialized once per process and spliced into
+every figure.
+
+Pages use compact chart data instead: ``series`` and ``matrix`` keep only
+the values of a chart, and ``static/js/charts.js`` adds the traces, layout
+and theme in the browser. No route builds Plotly figures any more; the
+figure path only backs the chart helpers in ``utils.py`` and their
+benchmarks, so Plotly is never imported by a running server, and figures
+are not cached.
+"""
+
+import json
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from metrics import timed
+
+TEMPLATE = 'plotly_dark'
+
+# Viridis exactly as graph_objects expands the named colorscale
+VIRIDIS = [
+    [0.0, '#440154'], [0.1111111111111111, '#482878'], [0.2222222222222222, '#3e4989'],
+    [0.3333333333333333, '#31688e'], [0.4444444444444444, '#26828e'],
+    [0.5555555555555556, '#1f9e89'], [0.6666666666666666, '#35b779'],
+    [0.7777777777777778, '#6ece58'], [0.8888888888888888, '#b5de2b'], [1.0, '#fde725']
+]
+
+_template_json: Dict[str, str] = {}
+_template_lock = threading.Lock()
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize the non-JSON types Plotly's encoder accepts"""
+    if hasattr(value, 'tolist'):  # NumPy arrays and scalars
+        return value.tolist()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def template_json(name: str = TEMPLATE) -> str:
+    """Return the serialized Plotly template, building it once per process"""
+    if name not in _template_json:
+        with _template_lock:
+            if name not in _template_json:
+                import plotly.io as pio
+                from plotly.utils import PlotlyJSONEncoder
+                _template_json[name] = json.dumps(pio.templates[name].to_plotly_json(),
+                                                  cls=PlotlyJSONEncoder)
+    return _template_json[name]
+
+
+@timed('charts')
+def figure_json(data: List[Dict[str, Any]], layout: Dict[str, Any],
+                template: Optional[str] = TEMPLATE) -> str:
+    """
+    Serialize a figure
+
+    Args:
+        data: Trace dictionaries, including their 'type'
+        layout: Layout dictionary without the template
+        template: Name of the Plotly template to embed
+
+    Returns:
+        JSON string of the Plotly figure
+    """
+    body = json.dumps({'data': data, 'layout': layout}, default=_json_default)
+    if template:
+        # Splice the pre-serialized template into the layout object
+        layout_end = body.rindex('}', 0, -1)
+        separator = ', ' if layout else ''
+        body = f'{body[:layout_end]}{separator}"template": {template_json(template)}}}}}'
+    return body
+
+
+def _title(text: Optional[str]) -> Dict[str, str]:
+    return {'text': text}
+
+
+def _axis_layout(title: Optional[str], xaxis_title: Optional[str],
+                 yaxis_title: Optional[str], **extra) -> Dict[str, Any]:
+    layout: Dict[str, Any] = {}
+    if title is not None:
+        layout['title'] = _title(title)
+    if xaxis_title is not None:
+        layout['xaxis'] = {'title': _title(xaxis_title)}
+    if yaxis_title is not None:
+        layout['yaxis'] = {'title': _title(yaxis_title)}
+    layout.update(extra)
+    return layout
+
+
+def bar_chart(x, y, color: str, title: str, xaxis_title: str, yaxis_title: str,
+              **layout) -> str:
+    """Bar chart equivalent to go.Bar(x, y, marker_color=color)"""
+    trace = {'marker': {'color': color}, 'x': x, 'y': y, 'type': 'bar'}
+    return figure_json([trace], _axis_layout(title, xaxis_title, yaxis_title, **layout))
+
+
+def heatmap_chart(z, x, y, title: str, xaxis_title: str, yaxis_title: str,
+                  hoverongaps: Optional[bool] = None) -> str:
+    """Heatmap equivalent to go.Heatmap(z, x, y, colorscale='Viridis')"""
+    trace: Dict[str, Any] = {'colorscale': VIRIDIS}
+    if hoverongaps is not None:
+        trace['hoverongaps'] = hoverongaps
+    trace.update({'x': x, 'y': y, 'z': z, 'type': 'heatmap'})
+    return figure_json([trace], _axis_layout(title, xaxis_title, yaxis_title))
+
+
+def polar_chart(r, theta, name: str, color: str, title: str) -> str:
+    """Filled radar chart on a 0-1 radial axis"""
+    trace = {'fill': 'toself', 'line': {'color': color}, 'name': name,
+             'r': r, 'theta': theta, 'type': 'scatterpolar'}
+    layout = {
+        'polar': {'radialaxis': {'visible': True, 'range': [0, 1]}},
+        'showlegend': False,
+        'title': _title(title)
+    }
+    return figure_json([trace], layout)
+
+
+def line_chart(x, y, color: str, title: str, xaxis_title: str, yaxis_title: str) -> str:
+    """Line chart with markers"""
+    trace = {'line': {'color': color, 'width': 3}, 'marker': {'color': color, 'size': 8},
+             'mode': 'lines+markers', 'x': x, 'y': y, 'type': 'scatter'}
+    return figure_json([trace], _axis_layout(title, xaxis_title, yaxis_title))
+
+
+def series(labels, values) -> Dict[str, list]:
+    """Compact data of a bar or radar chart: its labels and values, without styling"""
+    return {'labels': list(labels), 'values': _plain(values)}
+
+
+def matrix(z) -> Dict[str, list]:
+    """Compact data of a heatmap; whole-number cells are sent as integers"""
+    z = _plain(z)
+    if all(float(cell).is_integer() for row in z for cell in row):
+        z = [[int(cell) for cell in row] for row in z]
+    return {'z': z}
+
+
+def _plain(values) -> list:
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
@@ -0,0 +1,130 @@
+"""
+Conditional, compressed JSON responses for the /api endpoints
+
+``json_response`` serializes a payload once, tags it with a strong ETag of
+its bytes and answers a matching ``If-None-Match`` with 304 Not Modified.
+``versioned_json_response`` derives the ETag from a version of the inputs
+instead, so a 304 is answered without building the payload at all. Bodies
+of at least ``API_COMPRESS_MIN_SIZE`` bytes are compressed with brotli,
+when the optional ``brotli`` package is installed, or gzip, whichever the
+client accepts; the encoding is part of the ETag, as RFC 9110 requires.
+"""
+
+import gzip
+import hashlib
+import importlib.util
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app, request
+
+from metrics import timed
+from snapshots import fingerprint
+
+# Smaller bodies are not worth the compression overhead
+MIN_COMPRESS_SIZE = 1024
+
+# Dynamic content favours speed over ratio
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def brotli_available() -> bool:
+    """Tell whether the optional brotli package is installed"""
+    return importlib.util.find_spec('brotli') is not None
+
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _brotli(data: bytes) -> bytes:
+    import brotli
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+# Content codings by preference; brotli only when it can be imported
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {'br': _brotli, 'gzip': _gzip}
+if not brotli_available():
+    del ENCODERS['br']
+
+
+def negotiate_encoding() -> Optional[str]:
+    """Return the preferred content coding the client accepts, or None for identity"""
+    return request.accept_encodings.best_match(list(ENCODERS))
+
+
+def _cached_tag(base: str) -> Optional[str]:
+    """Return the tag from If-None-Match of a representation we would send, if any"""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    tags = [base]
+    encoding = negotiate_encoding()
+    if encoding:
+        tags.insert(0, f'{base}-{encoding}')
+    for tag in tags:
+        if if_none_match.contains(tag):
+            return tag
+    return base if if_none_match.star_tag else None
+
+
+def _not_modified(etag: str):
+    response = current_app.response_class(status=304)
+    return _finish(response, etag)
+
+
+def _finish(response, etag: str):
+    response.set_etag(etag)
+    # Per-user data: browsers may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _build_response(base: str, body: bytes):
+    encoding = negotiate_encoding()
+    min_size = current_app.config.get('API_COMPRESS_MIN_SIZE', MIN_COMPRESS_SIZE)
+    etag = base
+    if encoding and len(body) >= min_size:
+        body = ENCODERS[encoding](body)
+        etag = f'{base}-{encoding}'
+    response = current_app.response_class(body, mimetype='application/json')
+    if etag != base:
+        response.headers['Content-Encoding'] = encoding
+    return _finish(response, etag)
+
+
+@timed('serialize')
+def _dumps(payload: Any) -> bytes:
+    return f'{current_app.json.dumps(payload)}\n'.encode()
+
+
+def json_response(payload: Any):
+    """
+    Serialize payload as JSON, tagged with a strong ETag of its content
+
+    Returns:
+        A 304 response when the client already holds this content, else
+        the JSON body, compressed when large and accepted
+    """
+    body = _dumps(payload)
+    base = hashlib.blake2b(body, digest_size=16).hexdigest()
+    cached = _cached_tag(base)
+    if cached:
+        return _not_modified(cached)
+    return _build_response(base, body)
+
+
+def versioned_json_response(version: Any, build: Callable[[], Any]):
+    """
+    JSON response whose ETag is a fingerprint of the inputs it is built from
+
+    Args:
+        version: JSON-serializable inputs that fully determine the payload
+        build: Returns the payload; not called when the client is up to date
+    """
+    base = fingerprint(request.path, version)
+    cached = _cached_tag(base)
+    if cached:
+        return _not_modified(cached)
+    return _build_response(base, _dumps(build()))
@@ -17,8 +17,13 @@ class Config:
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     TESTING = False
     
-    # Session Configuration
-    SESSION_TYPE = 'filesystem'
+    # Session Configuration: data is stored server-side and the cookie only holds
+    # an opaque id. SESSION_TYPE is 'filesystem', 'sqlite', 'memory' (single
+    # process only) or 'cookie' for Flask's signed cookie sessions
+    SESSION_TYPE = os.getenv('SESSION_TYPE', 'filesystem')
+    SESSION_FILE_DIR = os.getenv('SESSION_FILE_DIR', 'flask_session')
+    SESSION_DB = os.getenv('SESSION_DB', 'data/sessions.sqlite3')
+    SESSION_SWEEP_INTERVAL = int(os.getenv('SESSION_SWEEP_INTERVAL', '300'))  # seconds
     PERMANENT_SESSION_LIFETIME = 3600  # 1 hour
     
     # Security Configuration
@@ -28,6 +33,111 @@ class Config:
     # Logging Configuration
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     
+    # Access tokens this close to expiry (seconds) are refreshed in the background
+    TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', '300'))
+    # Worker processes coordinate refreshes through this database, so a token is
+    # refreshed once; a worker that dies mid-refresh is taken over after the lease.
+    # It holds new access tokens for TOKEN_REFRESH_MARGIN, never refresh tokens
+    TOKEN_REFRESH_DB = os.getenv('TOKEN_REFRESH_DB', 'data/token_refresh.sqlite3')
+    TOKEN_REFRESH_LEASE = float(os.getenv('TOKEN_REFRESH_LEASE', '30'))  # seconds
+    
+    # Spotify API Response Cache
+    SPOTIFY_CACHE_MAX_ENTRIES = int(os.getenv('SPOTIFY_CACHE_MAX_ENTRIES', '4096'))
+    SPOTIFY_CACHE_TTLS = {  # seconds, per spotipy client method
+        'current_user': 3600,
+        'current_user_top_tracks': 6 * 3600,
+        'current_user_top_artists': 6 * 3600,
+        'current_user_recently_played': 60,
+        'current_user_playlists': 600,
+        'playlist_items': 600
+    }
+    
+    # Concurrent Spotify calls per worker process
+    SPOTIFY_FETCH_WORKERS = int(os.getenv('SPOTIFY_FETCH_WORKERS', '8'))
+    
+    # Upper bound on items read from one paged collection (a user's playlists,
+    # one playlist's tracks, ...)
+    SPOTIFY_PAGED_MAX_ITEMS = int(os.getenv('SPOTIFY_PAGED_MAX_ITEMS', '2000'))
+    
+    # Shared HTTP connection pool for Spotify API and accounts requests
+    SPOTIFY_HTTP_POOL_CONNECTIONS = int(os.getenv('SPOTIFY_HTTP_POOL_CONNECTIONS', '4'))
+    SPOTIFY_HTTP_POOL_MAXSIZE = int(os.getenv('SPOTIFY_HTTP_POOL_MAXSIZE', '32'))
+    SPOTIFY_HTTP_CONNECT_TIMEOUT = float(os.getenv('SPOTIFY_HTTP_CONNECT_TIMEOUT', '3.05'))
+    SPOTIFY_HTTP_READ_TIMEOUT = float(os.getenv('SPOTIFY_HTTP_READ_TIMEOUT', '10'))
+    SPOTIFY_HTTP_RETRIES = int(os.getenv('SPOTIFY_HTTP_RETRIES', '3'))
+    
+    # Spotify request scheduling: a token bucket of SPOTIFY_RATE_LIMIT requests/s
+    # (bursts of SPOTIFY_RATE_BURST) for the whole app, split evenly between the
+    # WEB_WORKERS processes under gunicorn, concurrency adapting to 429s up to the
+    # pool size, and Retry-After pauses of at most SPOTIFY_MAX_RETRY_AFTER
+    # seconds before a throttled request is given up
+    SPOTIFY_RATE_LIMIT = float(os.getenv('SPOTIFY_RATE_LIMIT', '20'))
+    SPOTIFY_RATE_BURST = int(os.getenv('SPOTIFY_RATE_BURST', '40'))
+    SPOTIFY_MAX_RETRY_AFTER = float(os.getenv('SPOTIFY_MAX_RETRY_AFTER', '10'))
+    
+    # Seconds audio-features and artist lookups wait for concurrent requests
+    # to join their batch call
+    SPOTIFY_BATCH_WINDOW = float(os.getenv('SPOTIFY_BATCH_WINDOW', '0.005'))
+    
+    # /api JSON bodies of at least this many bytes are sent gzip or brotli compressed
+    API_COMPRESS_MIN_SIZE = int(os.getenv('API_COMPRESS_MIN_SIZE', '1024'))
+    
+    # Prometheus text metrics at /metrics, scraped with "Authorization: Bearer
+    # <ADMIN_TOKEN>" (404 without an ADMIN_TOKEN), and phase timings in a
+    # Server-Timing header, which every client sees; off by default in production
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'True').lower() == 'true'
+    
+    # Opt-in cProfile capture: a PROFILE_SAMPLE_RATE share of requests to
+    # PROFILE_ROUTES (comma-separated route patterns, empty for all), plus any
+    # request sending ADMIN_TOKEN in X-Sonify-Profile. Profiles are listed and
+    # downloaded at /admin/profiles with "Authorization: Bearer <ADMIN_TOKEN>"
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') or None
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_ROUTES = [route for route in os.getenv('PROFILE_ROUTES', '').split(',') if route]
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'data/profiles')
+    PROFILE_MAX_STORED = int(os.getenv('PROFILE_MAX_STORED', '100'))
+    
+    # Per-user page analytics, rebuilt when their input fingerprint changes
+    SNAPSHOT_MAX_ENTRIES = int(os.getenv('SNAPSHOT_MAX_ENTRIES', '4096'))
+    SNAPSHOT_TTL = int(os.getenv('SNAPSHOT_TTL', str(24 * 3600)))  # seconds
+    
+    # Persistent audio features shared by all users and workers
+    AUDIO_FEATURES_DB = os.getenv('AUDIO_FEATURES_DB', 'data/audio_features.sqlite3')
+    
+    # Accumulated listening history, polled in the background with the 'after' cursor
+    HISTORY_DB = os.getenv('HISTORY_DB', 'data/listening_history.sqlite3')
+    HISTORY_INGEST_ENABLED = os.getenv('HISTORY_INGEST_ENABLED', 'True').lower() == 'true'
+    HISTORY_POLL_INTERVAL = int(os.getenv('HISTORY_POLL_INTERVAL', '1800'))  # seconds
+    HISTORY_MAX_USERS = int(os.getenv('HISTORY_MAX_USERS', '10000'))  # users polled per worker process
+    HISTORY_MAX_FAILURES = int(os.getenv('HISTORY_MAX_FAILURES', '3'))  # failed polls in a row before a user is dropped
+    
+    # Background jobs computing the insights and mood analysis pages. Their status
+    # and results are shared with every worker process through JOB_DB; a page
+    # polling a job id that is not known any more is computed in full instead
+    JOB_DB = os.getenv('JOB_DB', 'data/jobs.sqlite3')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_INLINE_WAIT = float(os.getenv('JOB_INLINE_WAIT', '1.5'))  # seconds a page waits before polling
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '300'))  # seconds
+    
+    # Import NumPy, pandas, Plotly and spotipy at startup rather than on first use
+    PREWARM_IMPORTS = os.getenv('PREWARM_IMPORTS', 'False').lower() == 'true'
+    
+    # Server started by run.py: 'werkzeug' is Flask's single-process development
+    # server, 'gunicorn' a prefork server (the 'production' extra) loading the app
+    # once, then forking WEB_WORKERS processes of WEB_THREADS threads each.
+    # Sessions must then be 'filesystem' or 'sqlite' so every worker sees them
+    SERVER = os.getenv('SERVER', 'werkzeug')
+    HOST = os.getenv('HOST', '0.0.0.0')
+    PORT = int(os.getenv('PORT', '5000'))
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', str(os.cpu_count() or 2)))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '8'))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '60'))  # seconds a silent worker lives before it is replaced
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))  # seconds to finish requests on reload
+    WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', '5'))  # seconds
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', '0'))  # recycle workers after this many, 0 never
+    WEB_PIDFILE = os.getenv('WEB_PIDFILE') or None  # for graceful reloads with kill -HUP
+    
     @staticmethod
     def init_app(app):
         """Initialize application with configuration"""
@@ -42,6 +152,9 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     LOG_LEVEL = 'WARNING'
+    PREWARM_IMPORTS = os.getenv('PREWARM_IMPORTS', 'True').lower() == 'true'
+    SERVER = os.getenv('SERVER', 'gunicorn')
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'False').lower() == 'true'
     
     @classmethod
     def init_app(cls, app):
@@ -58,6 +171,14 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     WTF_CSRF_ENABLED = False
+    AUDIO_FEATURES_DB = ':memory:'
+    HISTORY_DB = ':memory:'
+    TOKEN_REFRESH_DB = ':memory:'
+    JOB_DB = ':memory:'
+    HISTORY_INGEST_ENABLED = False
+    SESSION_TYPE = 'memory'
+    JOB_INLINE_WAIT = 10.0
+    ADMIN_TOKEN = 'test-admin-token'
 
 # Configuration dictionary
 config = {
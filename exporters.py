@@ -0,0 +1,291 @@
+"""
+Streaming exports of Spotify data
+
+Exports are produced as a stream of encoded chunks, row by row, so memory
+use does not grow with the size of the export and nothing is written to the
+server's disk. CSV and NDJSON are always available; the typed columnar
+formats, Parquet and Arrow IPC, need the optional ``pyarrow`` package and
+are written one row group (record batch) at a time.
+"""
+
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils import format_duration
+
+# Bytes of CSV or NDJSON buffered before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+# Rows per Parquet row group / Arrow record batch
+ROW_GROUP_SIZE = 50000
+
+# zlib window bits producing a gzip container rather than a raw zlib stream
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def track_row(track: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a track object into an export row"""
+    return {
+        'name': track['name'],
+        'artist': track['artists'][0]['name'],
+        'album': track['album']['name'],
+        'popularity': track['popularity'],
+        'duration': format_duration(track['duration_ms'])
+    }
+
+
+def artist_row(artist: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten an artist object into an export row"""
+    return {
+        'name': artist['name'],
+        'popularity': artist['popularity'],
+        'genres': ', '.join(artist['genres'][:3]),
+        'followers': artist['followers']['total']
+    }
+
+
+def play_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a recently-played item into an export row"""
+    track = item.get('track') or {}
+    artists = track.get('artists') or [{}]
+    return {
+        'played_at': item['played_at'],
+        'track_id': track.get('id'),
+        'track_name': track.get('name'),
+        'artist_name': artists[0].get('name'),
+        'album_name': (track.get('album') or {}).get('name'),
+        'duration_ms': track.get('duration_ms')
+    }
+
+
+AUDIO_FEATURE_COLUMNS = [
+    ('track_id', 'string'), ('danceability', 'float64'), ('energy', 'float64'), ('valence', 'float64'),
+    ('acousticness', 'float64'), ('instrumentalness', 'float64'), ('liveness', 'float64'),
+    ('speechiness', 'float64'), ('tempo', 'float64'), ('loudness', 'float64'), ('key', 'int32'),
+    ('mode', 'int32'), ('time_signature', 'int32'), ('duration_ms', 'int64')
+]
+
+
+def audio_features_row(features: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten an audio features object into an export row"""
+    row = {name: features.get(name) for name, _ in AUDIO_FEATURE_COLUMNS}
+    row['track_id'] = features.get('id')
+    return row
+
+
+# Export kind -> (typed columns, row builder); column types name Arrow types
+EXPORT_KINDS: Dict[str, Tuple[List[Tuple[str, str]], Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+    'tracks': ([('name', 'string'), ('artist', 'string'), ('album', 'string'), ('popularity', 'int32'),
+                ('duration', 'string')], track_row),
+    'artists': ([('name', 'string'), ('popularity', 'int32'), ('genres', 'string'), ('followers', 'int64')],
+                artist_row),
+    'plays': ([('played_at', 'timestamp'), ('track_id', 'string'), ('track_name', 'string'),
+               ('artist_name', 'string'), ('album_name', 'string'), ('duration_ms', 'int64')], play_row),
+    'audio_features': (AUDIO_FEATURE_COLUMNS, audio_features_row)
+}
+
+
+def csv_stream(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]],
+               chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Encode rows as CSV, yielding UTF-8 chunks of about chunk_size bytes
+
+    Args:
+        rows: Dictionaries keyed by column name; consumed lazily
+        columns: (name, type) pairs; the names are written as the header row
+        chunk_size: Number of characters buffered before a chunk is yielded
+
+    Returns:
+        Iterator of encoded CSV chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=[name for name, _ in columns], extrasaction='ignore',
+                            lineterminator='\n')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compress a stream of chunks into a single gzip member
+
+    Args:
+        chunks: Uncompressed byte chunks; consumed lazily
+        level: zlib compression level
+
+    Returns:
+        Iterator of gzip-compressed chunks
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def ndjson_stream(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]],
+                  chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Encode rows as newline-delimited JSON, one object per row
+
+    Args:
+        rows: Dictionaries keyed by column name; consumed lazily
+        columns: (name, type) pairs giving the keys and their order
+        chunk_size: Number of characters buffered before a chunk is yielded
+
+    Returns:
+        Iterator of encoded NDJSON chunks
+    """
+    names = [name for name, _ in columns]
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps({name: row.get(name) for name in names}, ensure_ascii=False)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+            size = 0
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def pyarrow_available() -> bool:
+    """Tell whether the optional pyarrow package is installed"""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what pyarrow writes until it is drained"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema(columns: List[Tuple[str, str]]):
+    import pyarrow as pa
+    types = {
+        'string': pa.string(),
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'timestamp': pa.timestamp('ms', tz='UTC')
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def record_batches(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]],
+                   batch_size: int = ROW_GROUP_SIZE) -> Iterator[Any]:
+    """
+    Group rows into typed Arrow record batches of at most batch_size rows
+
+    Timestamp columns are given as ISO 8601 strings, as Spotify returns them.
+    """
+    import pyarrow as pa
+    schema = _arrow_schema(columns)
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        arrays = []
+        for field in schema:
+            values = [row.get(field.name) for row in batch]
+            if pa.types.is_timestamp(field.type):
+                arrays.append(pa.array(values, pa.string()).cast(field.type))
+            else:
+                arrays.append(pa.array(values, field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def parquet_stream(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]],
+                   batch_size: int = ROW_GROUP_SIZE) -> Iterator[bytes]:
+    """Encode rows as a Parquet file, yielding each row group as it is written"""
+    import pyarrow.parquet as pq
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, _arrow_schema(columns), compression='zstd')
+    try:
+        for batch in record_batches(rows, columns, batch_size):
+            writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def arrow_stream(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]],
+                 batch_size: int = ROW_GROUP_SIZE) -> Iterator[bytes]:
+    """Encode rows in the Arrow IPC streaming format, one record batch at a time"""
+    import pyarrow as pa
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, _arrow_schema(columns))
+    try:
+        for batch in record_batches(rows, columns, batch_size):
+            writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# Format -> (writer, mimetype, file extension, needs pyarrow)
+EXPORT_FORMATS: Dict[str, Tuple[Callable[..., Iterator[bytes]], str, str, bool]] = {
+    'csv': (csv_stream, 'text/csv', 'csv', False),
+    'ndjson': (ndjson_stream, 'application/x-ndjson', 'ndjson', False),
+    'parquet': (parquet_stream, 'application/vnd.apache.parquet', 'parquet', True),
+    'arrow': (arrow_stream, 'application/vnd.apache.arrow.stream', 'arrows', True)
+}
+
+
+def export_stream(fmt: str, rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]],
+                  compress: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Encode rows in the given export format
+
+    Args:
+        fmt: One of EXPORT_FORMATS
+        rows: Dictionaries keyed by column name; consumed lazily
+        columns: (name, type) pairs of the export kind
+        compress: 'gzip' to gzip the text formats; Parquet and Arrow are
+            left as they are, Parquet being compressed internally
+
+    Returns:
+        Iterator of encoded chunks
+    """
+    writer, _, _, needs_pyarrow = EXPORT_FORMATS[fmt]
+    body = writer(rows, columns)
+    if compress == 'gzip' and not needs_pyarrow:
+        body = gzip_stream(body)
+    return body
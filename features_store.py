@@ -0,0 +1,131 @@
+"""
+Persistent audio-features store keyed by Spotify track id
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from batching import MicroBatcher
+
+# Maximum number of ids accepted by the audio-features endpoint
+SPOTIFY_BATCH_SIZE = 100
+
+# Stay well below SQLite's limit on bound parameters per statement
+_SQL_CHUNK_SIZE = 500
+
+
+def _fetch_audio_features(sp, track_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    return sp.audio_features(track_ids) or []
+
+
+class AudioFeaturesStore:
+    """
+    SQLite-backed store of audio features shared by all users and workers
+
+    A track's audio features never change, so once fetched they are kept
+    forever. Tracks for which Spotify has no features are stored as well,
+    so they are not requested again.
+
+    Missing features are fetched through a MicroBatcher, so concurrent
+    requests for different users share audio-features calls.
+
+    Args:
+        path: SQLite database file, or ':memory:' for a private store
+        batch_window: Seconds a batch of missing ids waits for other requests
+    """
+
+    def __init__(self, path: str, batch_window: float = 0.005):
+        self.path = path
+        self.batcher = MicroBatcher(_fetch_audio_features, SPOTIFY_BATCH_SIZE, max_delay=batch_window)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so open one per process
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS audio_features ('
+                'track_id TEXT PRIMARY KEY, features TEXT, fetched_at REAL NOT NULL)'
+            )
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get_many(self, track_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Look up stored audio features
+
+        Args:
+            track_ids: Spotify track ids
+
+        Returns:
+            Dictionary of track id to features for every id present in the
+            store; the value is None when Spotify has no features for it
+        """
+        ids = list(dict.fromkeys(track_ids))
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(ids), _SQL_CHUNK_SIZE):
+                chunk = ids[start:start + _SQL_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT track_id, features FROM audio_features WHERE track_id IN ({placeholders})',
+                    chunk
+                )
+                for track_id, features in rows:
+                    found[track_id] = json.loads(features) if features is not None else None
+        return found
+
+    def put_many(self, features: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        """Store audio features for the given track ids"""
+        now = time.time()
+        rows = [
+            (track_id, json.dumps(value) if value is not None else None, now)
+            for track_id, value in features.items()
+        ]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                'INSERT OR REPLACE INTO audio_features (track_id, features, fetched_at) VALUES (?, ?, ?)',
+                rows
+            )
+            conn.commit()
+
+    def fetch(self, sp, track_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Get audio features, fetching only ids missing from the store
+
+        Args:
+            sp: Spotify client used for ids not yet in the store
+            track_ids: Spotify track ids
+
+        Returns:
+            List of audio features aligned with track_ids, in the same shape
+            as ``spotipy.Spotify.audio_features``
+        """
+        wanted = [track_id for track_id in track_ids if track_id]
+        known = self.get_many(wanted)
+        missing = [track_id for track_id in dict.fromkeys(wanted) if track_id not in known]
+
+        if missing:
+            fetched = self.batcher.get_many(sp, missing)
+            self.put_many(fetched)
+            known.update(fetched)
+
+        return [known.get(track_id) for track_id in track_ids]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM audio_features').fetchone()[0]
@@ -0,0 +1,250 @@
+"""
+Concurrent fetching of independent Spotify API calls and paged endpoints
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Largest page sizes accepted by the Web API's paged endpoints
+PAGE_LIMIT = 50
+PLAYLIST_ITEMS_PAGE_LIMIT = 100
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def shared_executor(max_workers: int = 8) -> ThreadPoolExecutor:
+    """
+    Return the process-wide thread pool used for Spotify calls
+
+    The pool is created on first use so that pre-forking servers never
+    inherit a pool from the master process.
+
+    Args:
+        max_workers: Upper bound on concurrent Spotify calls in this process
+
+    Returns:
+        Shared ThreadPoolExecutor
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max_workers,
+                                               thread_name_prefix='spotify-fetch')
+    return _executor
+
+
+def submit(executor: ThreadPoolExecutor, func: Callable, *args, **kwargs):
+    """
+    Submit func to executor in a copy of the caller's context
+
+    Context variables, such as the request timings kept by ``metrics``,
+    are then visible to the call running on the pool's thread.
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def iter_pages(executor: ThreadPoolExecutor, func: Callable, *args, limit: int = PAGE_LIMIT,
+               max_items: Optional[int] = None, window: int = 4, **kwargs) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every page of a paged endpoint in order, prefetching a few ahead
+
+    The first page is requested when the first value is taken; the offsets
+    of the others follow from its ``total``. At most ``window`` pages are
+    in flight or waiting to be consumed, so memory stays bounded however
+    large the collection is. Like FetchPlan, this must not be consumed from
+    a task running on the same executor.
+
+    Args:
+        executor: Pool the remaining pages are fetched on
+        func: spotipy method accepting ``limit`` and ``offset``
+        limit: Page size
+        max_items: Stop requesting pages past this many items
+        window: Number of pages fetched ahead of the consumer
+
+    Returns:
+        Iterator of page objects
+    """
+    first_page = func(*args, limit=limit, offset=0, **kwargs)
+    yield first_page
+
+    total = first_page.get('total')
+    if not isinstance(total, int):
+        return
+    if max_items is not None:
+        total = min(total, max_items)
+    offsets = iter(range(limit, total, limit))
+    pending = deque()
+    try:
+        for offset in offsets:
+            pending.append(submit(executor, func, *args, limit=limit, offset=offset, **kwargs))
+            if len(pending) >= window:
+                break
+        while pending:
+            page = pending.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                pending.append(submit(executor, func, *args, limit=limit, offset=offset, **kwargs))
+            yield page
+    finally:
+        # The consumer went away, e.g. a client aborted a download
+        for future in pending:
+            future.cancel()
+
+
+class FetchPlan:
+    """
+    Named set of independent calls executed concurrently on a thread pool
+
+    Calls are registered with ``add`` and executed together by ``run``, so the
+    wall time of a plan is close to its slowest call rather than the sum of
+    all of them. Paged endpoints registered with ``add_paged`` are fetched in
+    full: the first page comes back with the other calls, then the offsets
+    of the remaining pages are worked out from its ``total`` and fetched
+    concurrently in a second round. Per-call wall times, summed over pages,
+    are recorded in ``timings``.
+
+    A plan must be run from the request thread, never from a task on its
+    own executor, which could otherwise deadlock waiting for itself.
+
+    Args:
+        executor: Pool the calls are submitted to
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        self._executor = executor
+        self._calls: Dict[str, Tuple[Callable, tuple, dict]] = {}
+        self._paging: Dict[str, Tuple[int, Optional[int], Optional[int]]] = {}
+        self._timings_lock = threading.Lock()
+        self.timings: Dict[str, float] = {}
+        self.requests = 0
+        self.elapsed = 0.0
+
+    def add(self, name: str, func: Callable, *args, **kwargs) -> 'FetchPlan':
+        """Register func(*args, **kwargs) to run under name"""
+        self._calls[name] = (func, args, kwargs)
+        return self
+
+    def add_paged(self, name: str, func: Callable, *args, limit: int = 50,
+                  max_items: Optional[int] = None, total: Optional[int] = None,
+                  **kwargs) -> 'FetchPlan':
+        """
+        Register every page of a paged endpoint to run under name
+
+        Args:
+            name: Name of the merged result
+            func: spotipy method accepting ``limit`` and ``offset``
+            limit: Page size; the largest the endpoint accepts
+            max_items: Stop after this many items
+            total: Number of items when already known, e.g. a playlist's
+                ``tracks.total``; all pages are then fetched in one round
+        """
+        self._calls[name] = (func, args, kwargs)
+        self._paging[name] = (limit, max_items, total)
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Execute all registered calls and wait for them to finish
+
+        Returns:
+            Dictionary mapping each call name to its result; paged calls map
+            to a single page object holding every item
+
+        Raises:
+            The first exception raised by any call, after all calls finished
+        """
+        started = time.perf_counter()
+        try:
+            first_round = []
+            for name in self._calls:
+                if name not in self._paging:
+                    first_round.append((name, None))
+                elif self._paging[name][2] is not None:
+                    first_round.extend((name, offset) for offset in self._offsets(name, self._paging[name][2]))
+                else:
+                    first_round.append((name, 0))
+            pages = self._execute(first_round)
+
+            # Offsets of the remaining pages come from the first page's total
+            second_round = []
+            for name, (limit, max_items, total) in self._paging.items():
+                if total is None:
+                    first_page = pages[(name, 0)]
+                    second_round.extend((name, offset) for offset in self._offsets(name, first_page.get('total'))
+                                        if offset > 0)
+            pages.update(self._execute(second_round))
+        finally:
+            self.elapsed = time.perf_counter() - started
+
+        results = {}
+        for name in self._calls:
+            if name in self._paging:
+                results[name] = self._merge(name, pages)
+            else:
+                results[name] = pages[(name, None)]
+        return results
+
+    def format_timings(self) -> str:
+        """Render per-call timings as 'name=12.3ms' pairs, slowest first"""
+        ordered = sorted(self.timings.items(), key=lambda x: x[1], reverse=True)
+        return ', '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in ordered)
+
+    def _offsets(self, name: str, total: Any) -> List[int]:
+        limit, max_items, _ = self._paging[name]
+        if not isinstance(total, int):
+            # Not a paging object we understand: keep the first page only
+            return [0]
+        if max_items is not None:
+            total = min(total, max_items)
+        return list(range(0, total, limit))
+
+    def _merge(self, name: str, pages: Dict[Tuple[str, Optional[int]], Any]) -> Dict[str, Any]:
+        limit, max_items, total = self._paging[name]
+        offsets = sorted(offset for page_name, offset in pages if page_name == name)
+        if not offsets:
+            return {'items': [], 'total': total or 0, 'limit': limit, 'offset': 0, 'next': None}
+        merged = dict(pages[(name, offsets[0])])
+        items = []
+        for offset in offsets:
+            items.extend(pages[(name, offset)].get('items') or [])
+        if max_items is not None:
+            items = items[:max_items]
+        merged.update({'items': items, 'offset': 0, 'next': None})
+        return merged
+
+    def _execute(self, tasks: List[Tuple[str, Optional[int]]]) -> Dict[Tuple[str, Optional[int]], Any]:
+        if not tasks:
+            return {}
+        if len(tasks) == 1:
+            return {tasks[0]: self._call(*tasks[0])}
+
+        futures = {task: submit(self._executor, self._call, *task) for task in tasks}
+        results = {}
+        error = None
+        for task, future in futures.items():
+            try:
+                results[task] = future.result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _call(self, name: str, offset: Optional[int]) -> Any:
+        func, args, kwargs = self._calls[name]
+        if offset is not None:
+            kwargs = dict(kwargs, limit=self._paging[name][0], offset=offset)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._timings_lock:
+                self.timings[name] = self.timings.get(name, 0.0) + elapsed
+                self.requests += 1
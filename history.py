@@ -0,0 +1,344 @@
+"""
+Incremental listening-history ingestion
+
+Spotify only exposes a user's last 50 plays, so analytics over longer
+periods need the plays accumulated locally. ``ListeningHistoryStore`` is an
+append-only SQLite table deduplicated on (user, played_at, track), and
+``HistoryIngestor`` polls recently-played for registered users in the
+background using the ``after`` cursor, so only new plays are requested.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Maximum page size of the recently-played endpoint
+RECENTLY_PLAYED_LIMIT = 50
+
+
+def played_at_ms(played_at: str) -> int:
+    """Convert a Spotify ``played_at`` timestamp to Unix milliseconds"""
+    return int(datetime.fromisoformat(played_at.replace('Z', '+00:00')).timestamp() * 1000)
+
+
+def _compact_track(track: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the track fields the analytics use"""
+    album = track.get('album') or {}
+    return {
+        'id': track.get('id'),
+        'name': track.get('name'),
+        'duration_ms': track.get('duration_ms'),
+        'popularity': track.get('popularity'),
+        'artists': [{'id': artist.get('id'), 'name': artist.get('name')}
+                    for artist in track.get('artists', [])],
+        'album': {'id': album.get('id'), 'name': album.get('name')}
+    }
+
+
+class ListeningHistoryStore:
+    """
+    Append-only store of every play seen for each user
+
+    Args:
+        path: SQLite database file, or ':memory:' for a private store
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so open one per process
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS plays ('
+                'user_id TEXT NOT NULL, played_at TEXT NOT NULL, played_at_ms INTEGER NOT NULL, '
+                'track_id TEXT NOT NULL, item TEXT NOT NULL, '
+                'PRIMARY KEY (user_id, played_at, track_id))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS plays_by_time ON plays (user_id, played_at_ms)')
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def append(self, user_id: str, items: List[Dict[str, Any]]) -> int:
+        """
+        Append recently-played items, ignoring plays already stored
+
+        Args:
+            user_id: Spotify user id the plays belong to
+            items: Items from ``current_user_recently_played``
+
+        Returns:
+            Number of new plays stored
+        """
+        rows = []
+        for item in items:
+            track = item.get('track') or {}
+            played_at = item.get('played_at')
+            if not played_at:
+                continue
+            compact = {'track': _compact_track(track), 'played_at': played_at}
+            rows.append((user_id, played_at, played_at_ms(played_at),
+                         track.get('id') or track.get('name') or '', json.dumps(compact)))
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO plays (user_id, played_at, played_at_ms, track_id, item) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.commit()
+            return conn.total_changes - before
+
+    def cursor(self, user_id: str) -> Optional[int]:
+        """Return the Unix-ms timestamp of the user's newest stored play"""
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT MAX(played_at_ms) FROM plays WHERE user_id = ?', (user_id,)
+            ).fetchone()
+        return row[0]
+
+    def items(self, user_id: str, since_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return the user's stored plays, newest first
+
+        Args:
+            user_id: Spotify user id
+            since_ms: Only return plays at or after this Unix-ms timestamp
+
+        Returns:
+            Items shaped like ``current_user_recently_played()['items']``
+        """
+        query = 'SELECT item FROM plays WHERE user_id = ?'
+        params: List[Any] = [user_id]
+        if since_ms is not None:
+            query += ' AND played_at_ms >= ?'
+            params.append(since_ms)
+        query += ' ORDER BY played_at_ms DESC'
+        with self._lock:
+            rows = self._connection().execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_items(self, user_id: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the user's stored plays, newest first, batch_size rows at a time
+
+        Unlike ``items`` this keeps only one batch in memory, and the lock is
+        released between batches, so long exports do not block ingestion.
+        """
+        query = 'SELECT played_at_ms, rowid, item FROM plays WHERE user_id = ?'
+        last = None
+        while True:
+            if last is None:
+                params: List[Any] = [user_id]
+                page_query = query
+            else:
+                params = [user_id, last[0], last[0], last[1]]
+                page_query = query + ' AND (played_at_ms < ? OR (played_at_ms = ? AND rowid < ?))'
+            page_query += ' ORDER BY played_at_ms DESC, rowid DESC LIMIT ?'
+            params.append(batch_size)
+            with self._lock:
+                rows = self._connection().execute(page_query, params).fetchall()
+            for row in rows:
+                yield json.loads(row[2])
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][:2]
+
+    def track_ids(self, user_id: str) -> List[str]:
+        """Return the distinct ids of the tracks the user has played"""
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT DISTINCT track_id FROM plays WHERE user_id = ? ORDER BY track_id', (user_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, user_id: str) -> int:
+        """Return the number of plays stored for the user"""
+        with self._lock:
+            return self._connection().execute(
+                'SELECT COUNT(*) FROM plays WHERE user_id = ?', (user_id,)
+            ).fetchone()[0]
+
+    def version(self, user_id: str) -> Tuple[int, Optional[int]]:
+        """
+        Return the number of stored plays and the newest play's Unix-ms timestamp
+
+        Plays are only ever added, so this changes exactly when the history does.
+        """
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT COUNT(*), MAX(played_at_ms) FROM plays WHERE user_id = ?', (user_id,)
+            ).fetchone()
+        return row[0], row[1]
+
+    def ingest(self, sp, user_id: str, max_pages: int = 20) -> int:
+        """
+        Fetch plays newer than the stored cursor and append them
+
+        Args:
+            sp: Spotify client authenticated as user_id
+            user_id: Spotify user id
+            max_pages: Upper bound on pages requested in one call
+
+        Returns:
+            Number of new plays stored
+        """
+        after = self.cursor(user_id)
+        added = 0
+        for _ in range(max_pages):
+            page = sp.current_user_recently_played(limit=RECENTLY_PLAYED_LIMIT, after=after)
+            items = page.get('items') or []
+            if not items:
+                break
+            added += self.append(user_id, items)
+            cursors = page.get('cursors') or {}
+            next_after = cursors.get('after')
+            if after is None or not next_after or len(items) < RECENTLY_PLAYED_LIMIT:
+                break
+            after = int(next_after)
+        return added
+
+
+class HistoryIngestor:
+    """
+    Background poller that keeps each registered user's history current
+
+    Users are registered with their token whenever they load a page. A
+    daemon thread, started lazily in each worker process, polls every
+    registered user every ``interval`` seconds. A user is dropped once they
+    have not loaded a page for ``ttl`` seconds, i.e. their session expired,
+    after ``max_failures`` failed polls in a row, and, least recently seen
+    first, when more than ``max_users`` are registered.
+
+    Args:
+        store: Store the plays are appended to
+        client_factory: Builds a Spotify client from a token_info dict
+        refresh_token: Returns a fresh token_info for an expired one
+        is_expired: Tells whether a token_info needs refreshing
+        interval: Seconds between polls of the same user
+        ttl: Seconds a user is polled after their last registration
+        max_users: Users polled at most by this process
+        max_failures: Consecutive failed polls before a user is dropped
+    """
+
+    def __init__(self, store: ListeningHistoryStore,
+                 client_factory: Callable[[Dict[str, Any]], Any],
+                 refresh_token: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 is_expired: Callable[[Dict[str, Any]], bool],
+                 interval: float = 1800.0, ttl: float = 3600.0, max_users: int = 10000,
+                 max_failures: int = 3, clock: Callable[[], float] = time.monotonic):
+        self.store = store
+        self.client_factory = client_factory
+        self.refresh_token = refresh_token
+        self.is_expired = is_expired
+        self.interval = interval
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_failures = max_failures
+        self._clock = clock
+        # Least recently registered first
+        self._tokens: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._seen: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def register(self, user_id: str, token_info: Dict[str, Any]) -> None:
+        """Remember the user's latest token and make sure polling runs"""
+        with self._lock:
+            self._tokens[user_id] = token_info
+            self._tokens.move_to_end(user_id)
+            self._seen[user_id] = self._clock()
+            self._failures.pop(user_id, None)
+            while len(self._tokens) > self.max_users:
+                self._drop(next(iter(self._tokens)))
+        self.ensure_started()
+
+    def unregister(self, user_id: str) -> None:
+        """Stop polling for the user"""
+        with self._lock:
+            self._drop(user_id)
+
+    def _drop(self, user_id: str) -> None:
+        self._tokens.pop(user_id, None)
+        self._seen.pop(user_id, None)
+        self._failures.pop(user_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tokens)
+
+    def ensure_started(self) -> None:
+        """Start the polling thread in this process if it isn't running"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='history-ingestor', daemon=True)
+            self._thread.start()
+
+    def poll_once(self) -> Dict[str, int]:
+        """Ingest new plays for every registered user; returns counts per user"""
+        with self._lock:
+            deadline = self._clock() - self.ttl
+            for user_id in [user_id for user_id, seen in self._seen.items() if seen < deadline]:
+                self._drop(user_id)
+            users = [(user_id, token_info, self._seen.get(user_id)) for user_id, token_info in self._tokens.items()]
+        added = {}
+        for user_id, token_info, seen in users:
+            try:
+                if self.is_expired(token_info):
+                    token_info = self.refresh_token(token_info)
+                    with self._lock:
+                        if user_id in self._tokens:
+                            self._tokens[user_id] = token_info
+                added[user_id] = self.store.ingest(self.client_factory(token_info), user_id)
+                with self._lock:
+                    self._failures.pop(user_id, None)
+            except Exception as e:
+                logger.warning('History ingestion failed for %s: %s', user_id, e)
+                self._record_failure(user_id, seen)
+        return added
+
+    def _record_failure(self, user_id: str, seen: Optional[float]) -> None:
+        with self._lock:
+            # The user registered again meanwhile, with a token that may work
+            if user_id not in self._tokens or self._seen.get(user_id) != seen:
+                return
+            failures = self._failures.get(user_id, 0) + 1
+            if failures >= self.max_failures:
+                logger.info('Stopped polling history for %s after %d failures', user_id, failures)
+                self._drop(user_id)
+            else:
+                self._failures[user_id] = failures
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.poll_once()
@@ -0,0 +1,107 @@
+"""
+Shared HTTP connection pool and token cache handling for spotipy clients
+"""
+
+import time
+from typing import Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import CacheHandler
+
+from metrics import record_spotify_call
+from ratelimit import RateLimiter, RateLimitedAdapter
+
+# Status codes worth retrying against the Spotify Web API
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class SharedSession(requests.Session):
+    """
+    requests.Session shared by many short-lived spotipy objects
+
+    ``spotipy.Spotify`` and the OAuth managers close their session when they
+    are garbage collected, which would drop every pooled keep-alive
+    connection after each request. ``close`` is therefore a no-op here;
+    call ``shutdown`` to really release the pool.
+
+    Every call is timed, retries and rate limit waits included, for the
+    per-endpoint Spotify metrics and the current request's Server-Timing.
+    """
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = super().send(request, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            record_spotify_call(request.url, status, started, time.perf_counter())
+
+    def close(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        """Close all pooled connections"""
+        super().close()
+
+
+def create_session(pool_connections: int = 4, pool_maxsize: int = 32,
+                   retries: int = 3, backoff_factor: float = 0.3,
+                   rate_limiter: Optional[RateLimiter] = None) -> SharedSession:
+    """
+    Create a pooled session for Spotify API and accounts requests
+
+    Args:
+        pool_connections: Number of per-host pools to keep
+        pool_maxsize: Keep-alive connections kept per host; should be at least
+            the number of concurrent Spotify calls per process
+        retries: Retries for connection errors and retryable status codes
+        backoff_factor: urllib3 backoff factor between retries
+        rate_limiter: Schedules every request and handles 429 responses
+            itself, instead of urllib3 retrying each one independently
+
+    Returns:
+        SharedSession with a sized HTTPAdapter mounted for http and https
+    """
+    status_codes = RETRY_STATUS_CODES
+    if rate_limiter is not None:
+        status_codes = tuple(code for code in RETRY_STATUS_CODES if code != 429)
+    retry = urllib3.Retry(
+        total=retries,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_codes,
+        respect_retry_after_header=rate_limiter is None
+    )
+    if rate_limiter is not None:
+        adapter = RateLimitedAdapter(rate_limiter, max_throttle_retries=retries,
+                                     pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                     max_retries=retry)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              max_retries=retry)
+    session = SharedSession()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class NullCacheHandler(CacheHandler):
+    """
+    Token cache that stores nothing
+
+    Tokens live in each user's session, so a module-level OAuth manager must
+    never hand one user's cached token to another.
+    """
+
+    def get_cached_token(self):
+        return None
+
+    def save_token_to_cache(self, token_info):
+        pass
@@ -0,0 +1,285 @@
+"""
+Background jobs for the heavy analytics pages
+
+``JobRunner`` runs computations on a small worker pool and keeps a table of
+their status and results, so a page can return right away and pick up the
+result later. A job submitted while the same user already has one of the
+same kind queued or running is coalesced into the existing job.
+
+A job runs in the worker process it was submitted to. Given a SQLite
+database, the runner also records every job's status and JSON result
+there, so the other worker processes can report and wait for it as a
+``StoredJob``; coalescing stays within each process.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """
+    One computation submitted to a JobRunner
+
+    Args:
+        user_id: User the job belongs to, or None when unknown
+        kind: Name of the computation, e.g. 'insights'
+    """
+
+    def __init__(self, user_id: Optional[str], kind: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.status = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        """Whether the job has finished, successfully or not"""
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finishes or timeout seconds pass; return whether it finished"""
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the job's status, without its result"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class StoredJob(Job):
+    """
+    Job run by another worker process, as recorded in the shared table
+
+    Waiting polls the table until the job finishes there.
+
+    Args:
+        row: The job's row in the table
+        load: Reads the job's row again, returning None once it is gone
+        poll_interval: Seconds between reads while waiting
+    """
+
+    def __init__(self, row: sqlite3.Row, load: Callable[[], Optional[sqlite3.Row]], poll_interval: float):
+        super().__init__(row['user_id'], row['kind'])
+        self.id = row['id']
+        self._load = load
+        self._poll_interval = poll_interval
+        self._update(row)
+
+    def _update(self, row: sqlite3.Row) -> None:
+        self.status = row['status']
+        self.error = row['error']
+        self.created_at = row['created_at']
+        self.started_at = row['started_at']
+        self.finished_at = row['finished_at']
+        if row['finished_at'] is not None:
+            self.result = json.loads(row['result']) if row['result'] is not None else None
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.done:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            time.sleep(self._poll_interval if remaining is None else min(self._poll_interval, remaining))
+            row = self._load()
+            if row is None:
+                return False
+            self._update(row)
+        return True
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, 'tolist'):  # NumPy arrays and scalars
+        return value.tolist()
+    return str(value)
+
+
+class JobRunner:
+    """
+    Worker pool plus a table of submitted jobs
+
+    Finished jobs are kept for result_ttl seconds so their results can be
+    collected, then dropped on a later submit. Rows of jobs that never
+    finish, e.g. because their worker died, are dropped result_ttl seconds
+    after they were submitted.
+
+    Args:
+        max_workers: Number of jobs run at the same time in this process
+        result_ttl: Seconds a finished job stays in the table
+        path: SQLite database shared with the other worker processes, or
+            None to keep jobs in this process only
+        poll_interval: Seconds between reads while waiting for another process's job
+    """
+
+    def __init__(self, max_workers: int = 4, result_ttl: float = 300, path: Optional[str] = None,
+                 poll_interval: float = 0.2):
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[Tuple[str, str], Job] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Worker threads do not survive a fork, nor do the jobs they ran
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='sonify-job')
+            self._pid = os.getpid()
+            self._jobs.clear()
+            self._active.clear()
+        return self._executor
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so open one per process
+        if self._conn is None or self._conn_pid != os.getpid():
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, user_id TEXT, kind TEXT NOT NULL, status TEXT NOT NULL, '
+                'result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_by_created_at ON jobs (created_at)')
+            conn.commit()
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _store(self, job: Job) -> None:
+        if self.path is None:
+            return
+        result = None
+        if job.status == DONE:
+            try:
+                result = json.dumps(job.result, default=_json_default)
+            except (TypeError, ValueError):
+                logger.exception('%s job %s result is not JSON serializable', job.kind, job.id)
+        with self._db_lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO jobs (id, user_id, kind, status, result, error, created_at, '
+                'started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.id, job.user_id, job.kind, job.status, result, job.error, job.created_at,
+                 job.started_at, job.finished_at)
+            )
+            conn.commit()
+
+    def _load(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self._db_lock:
+            return self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+    def submit(self, user_id: Optional[str], kind: str, func: Callable[..., Any],
+               *args, **kwargs) -> Job:
+        """
+        Run func(*args, **kwargs) in the background
+
+        Args:
+            user_id: User the job belongs to; jobs without one are never coalesced
+            kind: Name of the computation
+            func: Callable whose return value becomes the job's result
+
+        Returns:
+            The new job, or the user's queued or running job of the same kind
+        """
+        key = (user_id, kind) if user_id is not None else None
+        with self._lock:
+            executor = self._pool()
+            self._sweep(time.time())
+            if key in self._active:
+                return self._active[key]
+            job = Job(user_id, kind)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active[key] = job
+        self._store(job)
+        executor.submit(self._run, job, key, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, key: Optional[Tuple[str, str]], func: Callable[..., Any],
+             args: tuple, kwargs: Dict[str, Any]) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._store(job)
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            logger.exception('%s job %s failed', job.kind, job.id)
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            try:
+                self._store(job)
+            except sqlite3.Error:
+                logger.exception('Could not record %s job %s', job.kind, job.id)
+            with self._lock:
+                if key is not None and self._active.get(key) is job:
+                    del self._active[key]
+            job._done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return the job with this id, if it is still in the table of this or another process"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self.path is None:
+            return job
+        row = self._load(job_id)
+        if row is None:
+            return None
+        return StoredJob(row, lambda: self._load(job_id), self.poll_interval)
+
+    def _sweep(self, now: float) -> None:
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.path is not None:
+            with self._db_lock:
+                conn = self._connection()
+                conn.execute('DELETE FROM jobs WHERE COALESCE(finished_at, created_at) < ?',
+                             (now - self.result_ttl,))
+                conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._jobs)
@@ -0,0 +1,360 @@
+"""
+Request instrumentation and Prometheus-style metrics
+
+Counters and histograms live in a process-wide ``registry`` and are
+rendered in the Prometheus text exposition format by ``render``. Each
+request gets a ``RequestTimings`` in a context variable; code wrapped in
+``timed(phase)`` adds its exclusive time to it (nested phases pause the
+outer one), and Spotify calls add the wall time during which at least one
+call was in flight, so concurrent calls are not counted twice. The totals
+feed the phase histograms and the ``Server-Timing`` header. Metrics are per
+process; a multi-worker server exposes one set per worker.
+"""
+
+import contextvars
+import functools
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# Latency buckets in seconds, from cache hits to slow Spotify pages
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phases shown in Server-Timing, in order
+PHASES = ('spotify', 'analytics', 'charts', 'serialize', 'render')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    """Cumulative histogram with labels, like Prometheus client histograms"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # One count per bucket, then the sum and the total count
+                state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            state = self._values.get(labels)
+            return int(state[-1]) if state else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted((labels, list(state)) for labels, state in self._values.items())
+        for labels, state in values:
+            for bound, count in zip(self.buckets, state):
+                le = f'le="{_format_value(bound)}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(count)}'
+            label_text = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text} {state[-2]!r}'
+            yield f'{self.name}_count{label_text} {_format_value(state[-1])}'
+
+
+class Registry:
+    """Metrics of the process, plus gauges read from components at scrape time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+        self._stats: Dict[str, Tuple[str, str, Callable[[], Dict[str, Dict[str, Any]]]]] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def stats_gauges(self, prefix: str, label: str, documentation: str,
+                     func: Callable[[], Dict[str, Dict[str, Any]]]) -> None:
+        """
+        Register gauges read from components' ``stats()`` when metrics are rendered
+
+        Every numeric statistic becomes a gauge named ``<prefix>_<statistic>``,
+        labelled with the component, e.g. ``sonify_cache_hits{cache="spotify"}``.
+
+        Args:
+            prefix: Metric name prefix
+            label: Name of the label holding the component
+            func: Returns a dictionary of component names to their stats
+        """
+        with self._lock:
+            self._stats[prefix] = (label, documentation, func)
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            stats = list(self._stats.items())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        for prefix, (label, documentation, func) in stats:
+            samples: Dict[str, List[str]] = {}
+            for component, values in sorted(func().items()):
+                for stat, value in values.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        samples.setdefault(stat, []).append(
+                            f'{prefix}_{stat}{_format_labels((label,), (component,))} {_format_value(value)}')
+            for stat, stat_lines in samples.items():
+                lines.append(f'# HELP {prefix}_{stat} {documentation}: {stat.replace("_", " ")}')
+                lines.append(f'# TYPE {prefix}_{stat} gauge')
+                lines.extend(stat_lines)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'sonify_http_requests_total', 'HTTP requests handled', ('endpoint', 'method', 'status'))
+http_duration = registry.histogram(
+    'sonify_http_request_duration_seconds', 'Time to handle an HTTP request', ('endpoint', 'method'))
+phase_duration = registry.histogram(
+    'sonify_request_phase_duration_seconds',
+    'Time a request spent in Spotify calls, analytics, chart serialization and rendering',
+    ('endpoint', 'phase'))
+spotify_duration = registry.histogram(
+    'sonify_spotify_request_duration_seconds',
+    'Time a Spotify API call took, including retries and rate limit waits', ('endpoint', 'status'))
+job_duration = registry.histogram(
+    'sonify_job_duration_seconds', 'Time a background job took', ('kind', 'status'))
+
+
+class RequestTimings:
+    """Exclusive time per phase of one request, accumulated across its threads"""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.phases: Dict[str, float] = {}
+        self.spotify_calls = 0
+        self._lock = threading.Lock()
+        self._stacks: Dict[int, List[List[Any]]] = {}
+        self._spotify_intervals: List[Tuple[float, float]] = []
+
+    def enter(self, phase: str) -> None:
+        now = self.clock()
+        with self._lock:
+            stack = self._stacks.setdefault(threading.get_ident(), [])
+            if stack:
+                outer = stack[-1]
+                self._add(outer[0], now - outer[1])
+            stack.append([phase, now])
+
+    def exit(self) -> None:
+        now = self.clock()
+        with self._lock:
+            stack = self._stacks.get(threading.get_ident())
+            if not stack:
+                return
+            phase, started = stack.pop()
+            self._add(phase, now - started)
+            if stack:
+                stack[-1][1] = now
+
+    def add_spotify_call(self, started: float, finished: float) -> None:
+        with self._lock:
+            self._spotify_intervals.append((started, finished))
+            self.spotify_calls += 1
+
+    def _add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds per phase; Spotify time is the union of the calls' intervals"""
+        with self._lock:
+            totals = dict(self.phases)
+            intervals = sorted(self._spotify_intervals)
+        busy = 0.0
+        end = None
+        for started, finished in intervals:
+            if end is None or started > end:
+                busy += finished - started
+                end = finished
+            elif finished > end:
+                busy += finished - end
+                end = finished
+        if intervals:
+            totals['spotify'] = totals.get('spotify', 0.0) + busy
+        return totals
+
+    def server_timing(self, total: Optional[float] = None,
+                      totals: Optional[Dict[str, float]] = None) -> str:
+        """
+        Format the phase totals as a Server-Timing header value, in milliseconds
+
+        Args:
+            total: Seconds the whole request took, if known
+            totals: Phase totals already computed by ``totals()``
+        """
+        totals = self.totals() if totals is None else totals
+        parts = []
+        for phase in PHASES + tuple(sorted(set(totals) - set(PHASES))):
+            if phase in totals:
+                entry = f'{phase};dur={totals[phase] * 1000:.1f}'
+                if phase == 'spotify':
+                    entry += f';desc="{self.spotify_calls} calls"'
+                parts.append(entry)
+        if total is not None:
+            parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    'sonify_request_timings', default=None)
+
+
+def start_request() -> Tuple[RequestTimings, contextvars.Token]:
+    """Begin collecting timings for the current request"""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+class timed:
+    """
+    Attribute the time spent in a block or function to a request phase
+
+    Usable as a context manager or a decorator; a no-op outside requests.
+    """
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+    def __enter__(self):
+        self._timings = _current.get()
+        if self._timings is not None:
+            self._timings.enter(self.phase)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._timings is not None:
+            self._timings.exit()
+        return False
+
+    def __call__(self, func: Callable) -> Callable:
+        phase = self.phase
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(phase):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+# Spotify ids, and user ids which may be any string, become placeholders
+_SPOTIFY_ID = re.compile(r'^[0-9A-Za-z]{22}$')
+
+
+def spotify_endpoint(path: str) -> str:
+    """Return an API path with its ids replaced, e.g. /v1/playlists/{id}/tracks"""
+    segments = path.split('/')
+    for i, segment in enumerate(segments):
+        if _SPOTIFY_ID.match(segment) or (i > 0 and segments[i - 1] == 'users' and segment):
+            segments[i] = '{id}'
+    return '/'.join(segments)
+
+
+def record_spotify_call(url: str, status: str, started: float, finished: float) -> None:
+    """
+    Record one Spotify API call, in its endpoint's histogram and the current request
+
+    Args:
+        url: Requested URL
+        status: HTTP status code, or 'error' when no response was received
+        started: time.perf_counter() when the call was sent
+        finished: time.perf_counter() when its body was read
+    """
+    spotify_duration.observe(finished - started, spotify_endpoint(urlsplit(url).path), status)
+    timings = _current.get()
+    if timings is not None:
+        timings.add_spotify_call(started, finished)
+
+
+def observe_phases(endpoint: str, timings: RequestTimings) -> Dict[str, float]:
+    """Add a finished request's phase totals to the phase histogram"""
+    totals = timings.totals()
+    for phase, seconds in totals.items():
+        phase_duration.observe(seconds, endpoint, phase)
+    return totals
@@ -0,0 +1,132 @@
+"""
+Opt-in cProfile capture of individual requests
+
+``profiled()`` runs cProfile over a block on the current thread, and
+``ProfileStore`` keeps the results as ``.prof`` files named after their
+route and time, readable with ``pstats``, snakeviz or ``summary``. Only the
+most recent profiles are kept. The app installs its profiling hooks only
+when profiling is configured, so requests pay nothing otherwise.
+"""
+
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Profile ids are file names, so nothing else can be requested through them
+_PROFILE_ID = re.compile(r'^[0-9]+-[0-9A-Za-z_-]+$')
+
+
+def start() -> Optional[cProfile.Profile]:
+    """
+    Start profiling the current thread
+
+    Returns None instead of a profiler when another profiler is already
+    active, e.g. for a concurrent request on Python 3.12+, which allows one
+    profiling tool per process.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+@contextmanager
+def profiled() -> Iterator[Optional[cProfile.Profile]]:
+    """Profile the block on the current thread, yielding the profiler or None"""
+    profiler = start()
+    try:
+        yield profiler
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+
+def _slug(route: str) -> str:
+    return re.sub(r'[^0-9A-Za-z]+', '_', route).strip('_') or 'root'
+
+
+class ProfileStore:
+    """
+    Directory of request profiles, keyed by route and time
+
+    Args:
+        directory: Where the ``.prof`` files are written; created on first save
+        max_profiles: Profiles kept before the oldest are deleted
+    """
+
+    def __init__(self, directory: str, max_profiles: int = 100):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    def save(self, route: str, profiler: cProfile.Profile) -> str:
+        """
+        Write a finished profile
+
+        Args:
+            route: Route pattern or job the profile belongs to
+            profiler: Disabled profiler
+
+        Returns:
+            Id of the stored profile
+        """
+        profile_id = f'{int(time.time() * 1000)}-{_slug(route)}-{os.getpid()}-{next(self._counter)}'
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+        self._prune()
+        return profile_id
+
+    def _ids(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = [name[:-5] for name in names if name.endswith('.prof') and _PROFILE_ID.match(name[:-5])]
+        return sorted(ids, key=lambda profile_id: int(profile_id.split('-', 1)[0]), reverse=True)
+
+    def _prune(self) -> None:
+        with self._lock:
+            for profile_id in self._ids()[self.max_profiles:]:
+                try:
+                    os.remove(os.path.join(self.directory, f'{profile_id}.prof'))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Describe the stored profiles, newest first"""
+        profiles = []
+        for profile_id in self._ids():
+            path = os.path.join(self.directory, f'{profile_id}.prof')
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+            created, rest = profile_id.split('-', 1)
+            route = rest.rsplit('-', 2)[0]
+            profiles.append({'id': profile_id, 'route': route, 'created_at': int(created) / 1000, 'size': size})
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[str]:
+        """Return the file of a stored profile, or None for unknown or invalid ids"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f'{profile_id}.prof')
+        return path if os.path.isfile(path) else None
+
+
+def summary(path: str, sort: str = 'cumulative', limit: int = 40) -> str:
+    """Render the hottest functions of a stored profile as pstats text"""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
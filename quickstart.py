@@ -87,7 +87,7 @@ def setup_environment():
 
 def create_directories():
     """Create necessary directories"""
-    directories = ["static/exports", "flask_session"]
+    directories = ["flask_session"]
     
     for directory in directories:
         path = Path(directory)
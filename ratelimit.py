@@ -0,0 +1,170 @@
+"""
+Rate-limit-aware scheduling of Spotify API requests
+
+``RateLimiter`` combines a token bucket with an adaptive concurrency limit:
+the limit grows additively while requests succeed and is halved when
+Spotify answers 429 (AIMD), and a ``Retry-After`` pauses every request in
+the process until it has passed. ``RateLimitedAdapter`` applies it to every
+request sent through the shared HTTP pool, retrying throttled requests so
+pages wait briefly instead of failing.
+"""
+
+import email.utils
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Return the seconds a Retry-After header asks to wait, given as seconds or an HTTP date"""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimiter:
+    """
+    Token bucket plus AIMD concurrency limit, shared by every thread
+
+    Args:
+        rate: Requests per second the bucket refills with
+        burst: Bucket capacity, i.e. requests that may start back to back
+        max_concurrency: Upper bound of the adaptive concurrency limit
+        min_concurrency: Lower bound of the adaptive concurrency limit
+        decrease: Factor the limit is multiplied by on a 429
+        max_wait: Longest pause a Retry-After may impose on requests
+        clock: Monotonic time source, injectable for tests
+    """
+
+    def __init__(self, rate: float = 20.0, burst: int = 40, max_concurrency: int = 32,
+                 min_concurrency: int = 1, decrease: float = 0.5, max_wait: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease = decrease
+        self.max_wait = max_wait
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._refilled_at = clock()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._next_decrease = 0.0
+        self._requests = 0
+        self._throttled = 0
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit"""
+        return max(int(self._limit), self.min_concurrency)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self) -> None:
+        """Block until a request may be sent: no Retry-After pause, a free slot and a token"""
+        with self._cond:
+            while True:
+                now = self._clock()
+                wait: Optional[float] = self._blocked_until - now
+                if wait <= 0:
+                    if self._in_flight >= self.limit:
+                        wait = None  # until a request finishes
+                    else:
+                        self._refill(now)
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            self._in_flight += 1
+                            self._requests += 1
+                            return
+                        wait = (1 - self._tokens) / self.rate
+                self._cond.wait(wait)
+
+    def release(self, retry_after: Optional[float] = None) -> None:
+        """
+        Record that a request finished
+
+        Args:
+            retry_after: None for a request that was not throttled, otherwise
+                the seconds Spotify asked to wait
+        """
+        with self._cond:
+            self._in_flight -= 1
+            now = self._clock()
+            if retry_after is None:
+                # Additive increase: about one more slot per limit's worth of successes
+                self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            else:
+                self._throttled += 1
+                self._tokens = 0.0
+                self._refilled_at = now
+                self._blocked_until = max(self._blocked_until, now + min(retry_after, self.max_wait))
+                # Multiplicative decrease, once per pause so a burst of 429s counts once
+                if now >= self._next_decrease:
+                    self._limit = max(self.min_concurrency, self._limit * self.decrease)
+                    self._next_decrease = self._blocked_until
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the limiter's state and counters"""
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'requests': self._requests,
+                'throttled': self._throttled,
+                'paused_for': max(self._blocked_until - self._clock(), 0.0)
+            }
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter sending every request through a RateLimiter
+
+    Throttled requests are retried after their Retry-After, up to
+    max_throttle_retries times; a 429 asking for longer than the limiter's
+    max_wait is returned to the caller instead.
+
+    Args:
+        rate_limiter: Limiter shared by all requests of the process
+        max_throttle_retries: Retries of a request answered with 429
+    """
+
+    def __init__(self, rate_limiter: RateLimiter, max_throttle_retries: int = 3, **kwargs):
+        self.rate_limiter = rate_limiter
+        self.max_throttle_retries = max_throttle_retries
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        for attempt in range(self.max_throttle_retries + 1):
+            self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                response = super().send(request, **kwargs)
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            finally:
+                self.rate_limiter.release(retry_after)
+            if retry_after is None:
+                return response
+            if attempt == self.max_throttle_retries or retry_after > self.rate_limiter.max_wait:
+                return response
+            logger.info('Spotify returned 429 for %s, retrying after %.1fs', request.url, retry_after)
+            response.close()
+        return response
@@ -4,11 +4,57 @@ Sonify - Spotify Data Visualizer
 Run script for the Flask application
 """
 
+import importlib.util
 import os
 import sys
-from app import app
+from app import app, prewarm
 from config import config
 
+def gunicorn_options(app_config):
+    """
+    Gunicorn settings for the production server, from the app configuration
+    
+    Workers use the threaded worker class, since requests mostly wait on
+    Spotify, and the app is loaded in the master before forking, so imports
+    and prewarming happen once. ``kill -HUP`` on the master (see WEB_PIDFILE)
+    starts fresh workers and lets the old ones finish their requests within
+    WEB_GRACEFUL_TIMEOUT; deploying new code needs a restart or USR2.
+    """
+    options = {
+        'bind': f"{app_config['HOST']}:{app_config['PORT']}",
+        'workers': app_config['WEB_WORKERS'],
+        'threads': app_config['WEB_THREADS'],
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': app_config['WEB_TIMEOUT'],
+        'graceful_timeout': app_config['WEB_GRACEFUL_TIMEOUT'],
+        'keepalive': app_config['WEB_KEEPALIVE'],
+        'max_requests': app_config['WEB_MAX_REQUESTS'],
+        'max_requests_jitter': app_config['WEB_MAX_REQUESTS'] // 10,
+        'pidfile': app_config['WEB_PIDFILE'],
+        'accesslog': '-',
+        'errorlog': '-'
+    }
+    # Worker heartbeats on disk can stall in containers; tmpfs avoids that
+    if os.path.isdir('/dev/shm'):
+        options['worker_tmp_dir'] = '/dev/shm'
+    return options
+
+def serve_production(app, options):
+    """Serve the already imported app with gunicorn"""
+    from gunicorn.app.base import BaseApplication
+    
+    class SonifyServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+        
+        def load(self):
+            return app
+    
+    SonifyServer().run()
+
 def main():
     """Main function to run the Flask application"""
     
@@ -26,22 +72,38 @@ def main():
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
     
+    # Pay for the heavy imports now instead of on the first request
+    if app.config.get('PREWARM_IMPORTS'):
+        prewarm()
+    
     # Create necessary directories
-    os.makedirs('static/exports', exist_ok=True)
-    os.makedirs('flask_session', exist_ok=True)
+    if app.config['SESSION_TYPE'] == 'filesystem':
+        os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
+    
+    server = app.config['SERVER']
+    if server == 'gunicorn' and importlib.util.find_spec('gunicorn') is None:
+        print("❌ Error: SERVER=gunicorn but gunicorn is not installed!")
+        print("Install it with: pip install gunicorn (or pip install sonify[production]),")
+        print("or set SERVER=werkzeug to use the development server")
+        sys.exit(1)
     
     print("🎶 Starting Sonify - Spotify Data Visualizer")
     print(f"📊 Environment: {config_name}")
-    print("🌐 Server will be available at: http://localhost:5000")
+    if server == 'gunicorn':
+        print(f"⚙️  Server: gunicorn, {app.config['WEB_WORKERS']} workers x {app.config['WEB_THREADS']} threads")
+    print(f"🌐 Server will be available at: http://localhost:{app.config['PORT']}")
     print("📝 Press Ctrl+C to stop the server")
     print("-" * 50)
     
     try:
-        app.run(
-            host='0.0.0.0',
-            port=5000,
-            debug=app.config.get('DEBUG', False)
-        )
+        if server == 'gunicorn':
+            serve_production(app, gunicorn_options(app.config))
+        else:
+            app.run(
+                host=app.config['HOST'],
+                port=app.config['PORT'],
+                debug=app.config.get('DEBUG', False)
+            )
     except KeyboardInterrupt:
         print("\n👋 Goodbye! Thanks for using Sonify!")
     except Exception as e:
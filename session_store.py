@@ -0,0 +1,326 @@
+"""
+Server-side Flask sessions
+
+The session cookie only carries an opaque random id; the session data, the
+Spotify ``token_info`` included, lives in a backend shared by every worker
+process. ``ServerSideSessionInterface`` plugs into ``app.session_interface``
+and works with any backend implementing ``load``, ``save``, ``delete`` and
+``sweep``: ``MemorySessionBackend`` for tests and single-process use,
+``SQLiteSessionBackend`` and ``FileSessionBackend`` for production.
+"""
+
+import os
+import re
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# Session ids are 32 random bytes, URL-safe base64 encoded
+_SID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+
+def new_session_id() -> str:
+    """Return a new unguessable session id"""
+    return secrets.token_urlsafe(32)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Session whose data is stored server-side under ``sid``
+
+    Args:
+        initial: Stored session data
+        sid: Session id sent in the cookie
+        new: Whether the session was just created
+        expires_at: When the stored copy expires, for sessions loaded from the backend
+    """
+
+    def __init__(self, initial: Optional[dict] = None, sid: Optional[str] = None, new: bool = False,
+                 expires_at: Optional[float] = None):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid or new_session_id()
+        self.new = new
+        self.expires_at = expires_at
+        self.previous_sid: Optional[str] = None
+        self.modified = False
+
+    def regenerate(self) -> None:
+        """Move the session to a new id, e.g. at login, so an id set before it is useless"""
+        self.previous_sid = self.previous_sid or self.sid
+        self.sid = new_session_id()
+        self.modified = True
+
+
+class MemorySessionBackend:
+    """Sessions in a dictionary, private to the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Tuple[str, float]] = {}
+
+    def load(self, sid: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry
+
+    def save(self, sid: str, data: str, expires_at: float) -> None:
+        with self._lock:
+            self._sessions[sid] = (data, expires_at)
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionBackend:
+    """
+    Sessions in a SQLite table shared by every worker process
+
+    Args:
+        path: SQLite database file, or ':memory:' for a private store
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so open one per process
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_by_expiry ON sessions (expires_at)')
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def load(self, sid: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?', (sid, now)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, sid: str, data: str, expires_at: float) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute('INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)',
+                         (sid, data, expires_at))
+            conn.commit()
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+            conn.commit()
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+            conn.commit()
+        return deleted
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+class FileSessionBackend:
+    """
+    One file per session in a directory shared by every worker process
+
+    Files are replaced atomically, so readers never see a partial write, and
+    each file's modification time is set to its expiry so sweeping only
+    needs to stat the files.
+
+    Args:
+        directory: Directory holding the session files
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, sid: str) -> str:
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid: str, now: float) -> Optional[Tuple[str, float]]:
+        try:
+            with open(self._path(sid), encoding='utf-8') as f:
+                expires_at = os.fstat(f.fileno()).st_mtime
+                if expires_at <= now:
+                    return None
+                return f.read(), expires_at
+        except FileNotFoundError:
+            return None
+
+    def save(self, sid: str, data: str, expires_at: float) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.utime(temp_path, (expires_at, expires_at))
+            os.replace(temp_path, self._path(sid))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def delete(self, sid: str) -> None:
+        try:
+            os.unlink(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, now: float) -> int:
+        deleted = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if _SID_PATTERN.match(entry.name) and entry.stat().st_mtime <= now:
+                    os.unlink(entry.path)
+                    deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def __len__(self) -> int:
+        try:
+            return sum(1 for name in os.listdir(self.directory) if _SID_PATTERN.match(name))
+        except FileNotFoundError:
+            return 0
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface keeping session data in a backend
+
+    Sessions expire after ``PERMANENT_SESSION_LIFETIME`` without activity.
+    Unchanged sessions are only written back once half of that has passed,
+    and expired sessions are swept at most once per sweep_interval.
+
+    Args:
+        backend: Storage for the session data
+        sweep_interval: Seconds between sweeps of expired sessions
+        clock: Time source, replaceable in tests
+    """
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSession
+
+    def __init__(self, backend, sweep_interval: float = 300, clock: Callable[[], float] = time.time):
+        self.backend = backend
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._next_sweep = 0.0
+
+    def _lifetime(self, app) -> float:
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request) -> ServerSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID_PATTERN.match(sid):
+            stored = self.backend.load(sid, self.clock())
+            if stored is not None:
+                data, expires_at = stored
+                try:
+                    return self.session_class(self.serializer.loads(data), sid=sid, expires_at=expires_at)
+                except ValueError:
+                    pass
+        # Unknown or expired ids are never reused, so clients cannot choose their id
+        return self.session_class(new=True)
+
+    def save_session(self, app, session: ServerSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = self.clock()
+        self._maybe_sweep(now)
+
+        if session.previous_sid:
+            self.backend.delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if not session.new:
+                self.backend.delete(session.sid)
+            if session.modified or not session.new:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        lifetime = self._lifetime(app)
+        stale = session.expires_at is None or session.expires_at - now < lifetime / 2
+        if not (session.modified or stale):
+            return
+
+        session.expires_at = now + lifetime
+        self.backend.save(session.sid, self.serializer.dumps(dict(session)), session.expires_at)
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+    def _maybe_sweep(self, now: float) -> None:
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.backend.sweep(now)
+
+
+def create_session_interface(config) -> Optional[ServerSideSessionInterface]:
+    """
+    Build the session interface for SESSION_TYPE
+
+    Returns:
+        The interface, or None for 'cookie', which keeps Flask's signed cookie sessions
+    """
+    session_type = config['SESSION_TYPE']
+    if session_type == 'cookie':
+        return None
+    if session_type == 'memory':
+        backend = MemorySessionBackend()
+    elif session_type == 'sqlite':
+        backend = SQLiteSessionBackend(config['SESSION_DB'])
+    elif session_type == 'filesystem':
+        backend = FileSessionBackend(config['SESSION_FILE_DIR'])
+    else:
+        raise ValueError(f'Unknown SESSION_TYPE: {session_type}')
+    return ServerSideSessionInterface(backend, sweep_interval=config['SESSION_SWEEP_INTERVAL'])
@@ -0,0 +1,64 @@
+"""
+Duplicate call suppression
+
+``SingleFlight`` makes sure only one call per key is in flight at a time:
+callers arriving while it runs wait for it and share its result, or its
+exception, instead of making the same call again.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time, sharing its outcome with concurrent callers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call func(*args, **kwargs), unless a call for key is already running
+
+        Args:
+            key: Identifies calls that are interchangeable
+            func: Callable run by the first caller only
+
+        Returns:
+            The result of the call, whichever caller made it; an exception
+            raised by the call is raised to every caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = func(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Tell whether a call for key is running"""
+        with self._lock:
+            return key in self._calls
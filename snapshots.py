@@ -0,0 +1,79 @@
+"""
+Materialized per-user analytics snapshots
+
+Pages derive their analytics and chart JSON from Spotify data that rarely
+changes between visits. ``SnapshotStore`` keeps each user's computed
+sections together with a fingerprint of the inputs they were built from,
+and rebuilds a section only when its fingerprint changes, e.g. after new
+plays were recorded or the top items moved.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from cache import TTLCache
+from singleflight import SingleFlight
+
+_MISSING = object()
+
+
+def fingerprint(*inputs: Any) -> str:
+    """Return a stable digest of JSON-serializable inputs"""
+    data = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+class SnapshotStore:
+    """
+    Per-user computed sections, valid while their input fingerprint matches
+
+    Concurrent builds of the same section and fingerprint are coalesced, so
+    a page and its background job never compute a snapshot twice.
+
+    Args:
+        max_entries: Sections kept before the least recently used is evicted
+        ttl: Seconds a section is kept even if its fingerprint still matches
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 24 * 3600):
+        self._cache = TTLCache(max_entries=max_entries, default_ttl=ttl)
+        self._builds = SingleFlight()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._builds_done = 0
+
+    def get_or_build(self, user_id: str, section: str, version: str, build: Callable[[], Any]) -> Any:
+        """
+        Return the user's section, building it if missing or built from other inputs
+
+        Args:
+            user_id: Spotify user id
+            section: Name of the computed section, e.g. 'insights'
+            version: Fingerprint of the inputs the section depends on
+            build: Computes the section; only called when the snapshot is stale
+        """
+        key = (user_id, section)
+        entry = self._cache.get(key, _MISSING)
+        if entry is not _MISSING and entry[0] == version:
+            with self._lock:
+                self._hits += 1
+            return entry[1]
+        return self._builds.do((user_id, section, version), self._build, key, version, build)
+
+    def _build(self, key: Hashable, version: str, build: Callable[[], Any]) -> Any:
+        value = build()
+        self._cache.set(key, (version, value))
+        with self._lock:
+            self._builds_done += 1
+        return value
+
+    def invalidate(self, user_id: str) -> int:
+        """Drop every section of user_id"""
+        return self._cache.invalidate(lambda key: key[0] == user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return snapshot hits, builds and size"""
+        with self._lock:
+            return {'hits': self._hits, 'builds': self._builds_done, 'size': len(self._cache)}
@@ -0,0 +1,91 @@
+// Sonify - chart rendering from compact chart data
+//
+// The server sends only the series of each chart (labels and values, or the
+// 7x24 heatmap matrix); every trace style, axis title and theme colour is
+// defined here once instead of being serialized into every page.
+
+const SonifyCharts = (function() {
+    const DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'];
+    const HOURS = Array.from({length: 24}, (_, hour) => hour);
+    const SPOTIFY_GREEN = 'rgb(30, 215, 96)';
+
+    // Chart name -> element id, trace builder and layout
+    const CHARTS = {
+        top_tracks: {
+            element: 'top-tracks-chart',
+            trace: data => ({type: 'bar', x: data.labels, y: data.values, marker: {color: SPOTIFY_GREEN}}),
+            layout: {title: {text: 'Your Top Tracks'}, xaxis: {title: {text: 'Track'}},
+                     yaxis: {title: {text: 'Popularity'}}}
+        },
+        top_artists: {
+            element: 'top-artists-chart',
+            trace: data => ({type: 'bar', x: data.labels, y: data.values, marker: {color: 'rgb(255, 107, 107)'}}),
+            layout: {title: {text: 'Your Top Artists'}, xaxis: {title: {text: 'Artist'}},
+                     yaxis: {title: {text: 'Popularity'}}}
+        },
+        heatmap: {
+            element: 'heatmap-chart',
+            trace: data => ({type: 'heatmap', z: data.z, x: HOURS, y: DAYS, colorscale: 'Viridis',
+                             hoverongaps: false}),
+            layout: {title: {text: 'Listening Time Heatmap'}, xaxis: {title: {text: 'Hour of Day'}},
+                     yaxis: {title: {text: 'Day of Week'}}}
+        },
+        mood: {
+            element: 'mood-radar-chart',
+            trace: data => ({type: 'scatterpolar', r: data.values, theta: data.labels, fill: 'toself',
+                             name: 'Your Music Profile', line: {color: SPOTIFY_GREEN}}),
+            layout: {title: {text: 'Your Music Mood Profile'}, showlegend: false,
+                     polar: {radialaxis: {visible: true, range: [0, 1]}}}
+        }
+    };
+
+    // Dark theme shared by every chart
+    const THEME = {
+        paper_bgcolor: 'rgb(17, 17, 17)',
+        plot_bgcolor: 'rgb(17, 17, 17)',
+        font: {color: '#f2f5fa'},
+        xaxis: {gridcolor: '#283442', zerolinecolor: '#283442'},
+        yaxis: {gridcolor: '#283442', zerolinecolor: '#283442'},
+        polar: {bgcolor: 'rgb(17, 17, 17)',
+                radialaxis: {gridcolor: '#506784'}, angularaxis: {gridcolor: '#506784'}}
+    };
+
+    function merge(base, extra) {
+        const result = Object.assign({}, base);
+        Object.keys(extra).forEach(key => {
+            const value = extra[key];
+            result[key] = value && typeof value === 'object' && !Array.isArray(value) && base[key]
+                ? merge(base[key], value) : value;
+        });
+        return result;
+    }
+
+    function render(name, data) {
+        const chart = CHARTS[name];
+        if (!chart || !data || !document.getElementById(chart.element)) {
+            return;
+        }
+        Plotly.newPlot(chart.element, [chart.trace(data)], merge(THEME, chart.layout), {responsive: true});
+    }
+
+    function renderAll(chartData) {
+        Object.keys(chartData).forEach(name => render(name, chartData[name]));
+    }
+
+    // Render the chart data embedded in the page as <script type="application/json">
+    function renderEmbedded(elementId) {
+        const element = document.getElementById(elementId);
+        if (element) {
+            renderAll(JSON.parse(element.textContent));
+        }
+    }
+
+    // Fetch chart data from /api/chart-data and render it
+    function load(url) {
+        return fetch(url, {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(renderAll);
+    }
+
+    return {render, renderAll, renderEmbedded, load, CHARTS};
+})();
@@ -1 +1,5 @@
-# Tests package for Sonify 
\ No newline at end of file
+# Tests package for Sonify
+import os
+
+# Load TestingConfig when app.py is imported by the test modules
+os.environ.setdefault('FLASK_ENV', 'testing')
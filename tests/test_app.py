@@ -1,13 +1,21 @@
 import unittest
+import gzip
+import io
 import json
 import os
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 
 # Add the parent directory to the path so we can import the app
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import app
+from app import app, job_runner, current_token_info, rate_limit_share
+from exporters import pyarrow_available
+from profiling import ProfileStore
 
 class SonifyTestCase(unittest.TestCase):
     """Test cases for the Sonify Flask application"""
@@ -144,6 +152,37 @@ class SonifyTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Visualizations', response.data)
     
+    @patch('app.get_spotify_client')
+    def test_visualizations_embed_compact_chart_data(self, mock_get_client):
+        """Test that pages carry compact series instead of Plotly figures, also served by the API"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        mock_sp.current_user_top_tracks.return_value = {'items': [
+            {'id': f't{n}', 'name': f'Track {n}', 'popularity': n} for n in range(50)
+        ]}
+        mock_sp.current_user_top_artists.return_value = {'items': [
+            {'id': f'a{n}', 'name': f'Artist {n}', 'popularity': n} for n in range(50)
+        ]}
+        mock_sp.current_user_recently_played.return_value = {'items': [
+            {'played_at': '2024-01-01T10:00:00.000Z', 'track': {'id': 't1', 'name': 'Track 1',
+                                                              'artists': [{'name': 'Artist 1'}]}}
+        ]}
+        
+        response = self.client.get('/visualizations')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'js/charts.js', response.data)
+        self.assertNotIn(b'"template"', response.data)
+        self.assertLess(len(response.data), 60000)
+        
+        response = self.client.get('/api/chart-data')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['top_tracks']['labels'][:2], ['Track 0', 'Track 1'])
+        self.assertEqual(data['top_artists']['values'][-1], 49)
+        self.assertEqual(data['heatmap']['z'][0][10], 1)
+        
+        self.assertEqual(self.client.get('/api/chart-data?page=nope').status_code, 400)
+    
     @patch('app.get_spotify_client')
     def test_mood_analysis_page(self, mock_get_client):
         """Test mood analysis page with mocked data"""
@@ -194,6 +233,134 @@ class SonifyTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Music Insights', response.data)
     
+    @patch('app.get_spotify_client')
+    def test_insights_reads_every_playlist(self, mock_get_client):
+        """Test insights page pages through all playlists and their tracks"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        
+        playlists = [{'id': f'p{i}', 'name': f'Playlist {i}', 'tracks': {'total': 150}}
+                     for i in range(60)]
+        
+        def playlists_page(limit=50, offset=0):
+            return {'items': playlists[offset:offset + limit], 'total': len(playlists)}
+        
+        def playlist_items(playlist_id, limit=100, offset=0, fields=None):
+            return {'items': [{'track': {'id': f't{n}', 'name': f'Track {n}',
+                                         'artists': [{'id': 'a1', 'name': 'Artist One'}]}}
+                              for n in range(offset, min(offset + limit, 150))],
+                    'total': 150}
+        
+        mock_sp.current_user_top_tracks.return_value = {'items': []}
+        mock_sp.current_user_top_artists.return_value = {'items': []}
+        mock_sp.current_user_recently_played.return_value = {'items': []}
+        mock_sp.current_user_playlists.side_effect = playlists_page
+        mock_sp.playlist_items.side_effect = playlist_items
+        mock_sp.artists.return_value = {'artists': [{'id': 'a1', 'name': 'Artist One', 'genres': ['shoegaze']}]}
+        
+        response = self.client.get('/insights')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Showing 6 of 60 playlists', response.data)
+        self.assertIn(b'9000 tracks across 60 playlists', response.data)
+        self.assertIn(b'150 of them unique', response.data)
+        self.assertEqual(mock_sp.current_user_playlists.call_count, 2)
+        self.assertEqual(mock_sp.playlist_items.call_count, 120)
+        self.assertIn(b'Shoegaze (9000)', response.data)
+        mock_sp.artists.assert_called_once_with(['a1'])
+    
+    @patch('app.get_spotify_client')
+    def test_insights_served_from_snapshot(self, mock_get_client):
+        """Test that insights are only recomputed when a playlist or the history changes"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        playlist = {'id': 'p1', 'name': 'Playlist', 'snapshot_id': 's1', 'tracks': {'total': 1}}
+        recent = [{'played_at': '2024-01-01T10:00:00.000Z',
+                   'track': {'id': 't1', 'name': 'Track', 'artists': [{'id': 'a1', 'name': 'Artist'}]}}]
+        mock_sp.current_user_top_tracks.return_value = {'items': []}
+        mock_sp.current_user_top_artists.return_value = {'items': []}
+        mock_sp.current_user_recently_played.side_effect = lambda **kwargs: {'items': list(recent)}
+        mock_sp.current_user_playlists.side_effect = lambda **kwargs: {'items': [dict(playlist)], 'total': 1}
+        mock_sp.playlist_items.return_value = {'items': [{'track': recent[0]['track']}], 'total': 1}
+        mock_sp.artists.return_value = {'artists': [{'id': 'a1', 'name': 'Artist', 'genres': []}]}
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 'snapshot_user'
+        
+        self.client.get('/insights')
+        self.client.get('/insights')
+        self.assertEqual(mock_sp.playlist_items.call_count, 1)
+        
+        playlist['snapshot_id'] = 's2'
+        self.client.get('/insights')
+        self.assertEqual(mock_sp.playlist_items.call_count, 2)
+        
+        recent.insert(0, {'played_at': '2024-01-01T11:00:00.000Z', 'track': recent[0]['track']})
+        self.client.get('/insights')
+        self.assertEqual(mock_sp.playlist_items.call_count, 3)
+    
+    @patch('app.get_spotify_client')
+    def test_slow_mood_analysis_runs_as_job(self, mock_get_client):
+        """Test that a slow page returns a polling shell and its job result is served later"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        release = threading.Event()
+        
+        def top_tracks(**kwargs):
+            release.wait(5)
+            return {'items': [{'id': 'track1', 'name': 'Test Track', 'artists': [{'name': 'Test Artist'}],
+                               'album': {'name': 'Test Album', 'images': [{'url': 'test.jpg'}]}}]}
+        mock_sp.current_user_top_tracks.side_effect = top_tracks
+        mock_sp.audio_features.return_value = [{'id': 'track1', 'danceability': 0.8, 'energy': 0.9,
+                                                 'valence': 0.6, 'tempo': 120, 'acousticness': 0.3,
+                                                 'instrumentalness': 0.1}]
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 'job_user'
+        
+        with patch.dict(app.config, {'JOB_INLINE_WAIT': 0}):
+            response = self.client.get('/mood-analysis')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'Preparing your Mood Analysis', response.data)
+            
+            # A second request joins the running job instead of starting another
+            submitted = self.client.post('/api/jobs', json={'kind': 'mood_analysis'})
+            self.assertEqual(submitted.status_code, 202)
+            job = submitted.get_json()
+            self.assertIn(job['id'].encode(), response.data)
+            self.assertEqual(self.client.get(job['result_url']).status_code, 202)
+            
+            release.set()
+            job_runner.get(job['id']).wait(5)
+        self.assertEqual(mock_sp.current_user_top_tracks.call_count, 1)
+        self.assertEqual(self.client.get(job['status_url']).get_json()['status'], 'done')
+        result = self.client.get(job['result_url']).get_json()
+        self.assertEqual(result['features_summary']['energy'], 0.9)
+        
+        response = self.client.get(f'/mood-analysis?job={job["id"]}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_sp.current_user_top_tracks.call_count, 1)
+    
+    @patch('app.get_spotify_client')
+    def test_unknown_job_id_renders_page(self, mock_get_client):
+        """Test that a job id this process does not know renders the page instead of polling again"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        mock_sp.current_user_top_tracks.return_value = {'items': []}
+        mock_sp.current_user_top_artists.return_value = {'items': []}
+        mock_sp.current_user_recently_played.return_value = {'items': []}
+        mock_sp.current_user_playlists.return_value = {'items': []}
+        
+        with patch.dict(app.config, {'JOB_INLINE_WAIT': 0}):
+            response = self.client.get('/insights?job=from-another-worker')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'Preparing your Insights', response.data)
+    
+    def test_job_api_errors(self):
+        """Test unknown job kinds and ids"""
+        with patch('app.get_spotify_client', return_value=MagicMock()):
+            response = self.client.post('/api/jobs', json={'kind': 'everything'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/jobs/missing').status_code, 404)
+        self.assertEqual(self.client.get('/api/jobs/missing/result').status_code, 404)
+    
     @patch('app.get_spotify_client')
     def test_export_data(self, mock_get_client):
         """Test data export functionality"""
@@ -225,7 +392,210 @@ class SonifyTestCase(unittest.TestCase):
         }
         
         response = self.client.get('/export-data')
-        self.assertEqual(response.status_code, 302)  # Redirect after export
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn('attachment; filename="sonify_top_tracks_', response.headers['Content-Disposition'])
+        self.assertEqual(response.get_data(as_text=True),
+                         'name,artist,album,popularity,duration\nTest Track,Test Artist,Test Album,80,3:00\n')
+        
+        response = self.client.get('/export-data?kind=artists&compress=gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/gzip')
+        self.assertTrue(response.headers['Content-Disposition'].endswith('.csv.gz"'))
+        self.assertEqual(gzip.decompress(response.data).decode(),
+                         'name,popularity,genres,followers\nTest Artist,85,"pop, rock",1000\n')
+    
+    @patch('app.get_spotify_client')
+    def test_export_data_error(self, mock_get_client):
+        """Test that a failing first page redirects with a message"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        mock_sp.current_user_top_tracks.side_effect = Exception('API down')
+        
+        response = self.client.get('/export-data')
+        self.assertEqual(response.status_code, 302)
+        
+        response = self.client.get('/export-data?kind=albums')
+        self.assertEqual(response.status_code, 302)
+        
+        response = self.client.get('/export-data?format=xlsx')
+        self.assertEqual(response.status_code, 302)
+    
+    @patch('app.get_spotify_client')
+    def test_export_history_formats(self, mock_get_client):
+        """Test that the listening history exports as NDJSON and typed Parquet"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        mock_sp.current_user_recently_played.return_value = {
+            'items': [
+                {
+                    'track': {'id': 'a' * 22, 'name': 'Test Track', 'duration_ms': 180000,
+                              'artists': [{'name': 'Test Artist'}], 'album': {'name': 'Test Album'}},
+                    'played_at': '2024-01-01T12:00:00.000Z'
+                }
+            ]
+        }
+        
+        response = self.client.get('/export-data?kind=plays&format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertIn('filename="sonify_plays_', response.headers['Content-Disposition'])
+        self.assertEqual(json.loads(response.get_data(as_text=True)),
+                         {'played_at': '2024-01-01T12:00:00.000Z', 'track_id': 'a' * 22,
+                          'track_name': 'Test Track', 'artist_name': 'Test Artist',
+                          'album_name': 'Test Album', 'duration_ms': 180000})
+        
+        if not pyarrow_available():
+            response = self.client.get('/export-data?kind=plays&format=parquet')
+            self.assertEqual(response.status_code, 302)
+            return
+        import pyarrow.parquet as pq
+        mock_sp.audio_features.return_value = [{'id': 'a' * 22, 'energy': 0.5, 'key': 3}]
+        response = self.client.get('/export-data?kind=audio_features&format=parquet')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Disposition'].endswith('.parquet"'))
+        table = pq.read_table(io.BytesIO(response.data))
+        self.assertEqual(table.column('track_id').to_pylist(), ['a' * 22])
+        self.assertEqual(table.column('key').to_pylist(), [3])
+        self.assertEqual(table.column('tempo').to_pylist(), [None])
+    
+    def test_concurrent_token_refresh_is_single_flight(self):
+        """Test that requests holding the same expired token trigger a single refresh"""
+        refreshes = []
+        
+        def refresh_access_token(refresh_token):
+            refreshes.append(refresh_token)
+            time.sleep(0.2)
+            return {'access_token': 'fresh_token', 'refresh_token': refresh_token,
+                    'expires_at': int(time.time()) + 3600}
+        oauth = MagicMock()
+        oauth.is_token_expired.side_effect = lambda token_info: token_info['expires_at'] - time.time() < 60
+        oauth.refresh_access_token.side_effect = refresh_access_token
+        spotify = MagicMock()
+        spotify.current_user.return_value = {'id': 'refresh_user', 'display_name': 'R', 'followers': None}
+        
+        def request_with_expired_token(_):
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['token_info'] = {'access_token': 'expired_token', 'refresh_token': 'single_refresh',
+                                      'expires_at': int(time.time()) - 10}
+                sess['user_id'] = 'refresh_user'
+            response = client.get('/api/user-data')
+            with client.session_transaction() as sess:
+                return response.status_code, sess['token_info']['access_token']
+        
+        with patch('app.create_spotify_oauth', return_value=oauth), \
+                patch('app.build_spotify_client', return_value=spotify) as build:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(request_with_expired_token, range(8)))
+            # A request arriving after the refresh reuses its result
+            results.append(request_with_expired_token(8))
+        
+        self.assertEqual(refreshes, ['single_refresh'])
+        self.assertEqual(results, [(200, 'fresh_token')] * 9)
+        self.assertTrue(all(call.args[0]['access_token'] == 'fresh_token' for call in build.call_args_list))
+    
+    def test_token_near_expiry_refreshed_in_background(self):
+        """Test that a token about to expire is used as is while a refresh runs in the background"""
+        refreshed = threading.Event()
+        oauth = MagicMock()
+        oauth.is_token_expired.return_value = False
+        
+        def refresh_access_token(refresh_token):
+            refreshed.set()
+            return {'access_token': 'proactive_fresh', 'refresh_token': refresh_token,
+                    'expires_at': int(time.time()) + 3600}
+        oauth.refresh_access_token.side_effect = refresh_access_token
+        token_info = {'access_token': 'proactive_old', 'refresh_token': 'proactive',
+                      'expires_at': int(time.time()) + 120}
+        
+        with patch('app.create_spotify_oauth', return_value=oauth):
+            self.assertIs(current_token_info(token_info), token_info)
+            self.assertTrue(refreshed.wait(5))
+            deadline = time.time() + 5
+            while current_token_info(token_info) is token_info and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(current_token_info(token_info)['access_token'], 'proactive_fresh')
+        self.assertEqual(oauth.refresh_access_token.call_count, 1)
+    
+    @patch('app.get_spotify_client')
+    def test_api_top_tracks_conditional_get(self, mock_get_client):
+        """Test that repeated API calls with the ETag get an empty 304"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        mock_sp.current_user_top_tracks.return_value = {'items': [
+            {'name': f'Track {n}', 'artists': [{'name': 'Artist'}], 'album': {'name': 'Album', 'images': []},
+             'popularity': n} for n in range(50)
+        ]}
+        
+        response = self.client.get('/api/top-tracks', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))), 50)
+        
+        response = self.client.get('/api/top-tracks', headers={'Accept-Encoding': 'gzip',
+                                                               'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+    
+    @patch('app.get_spotify_client')
+    def test_server_timing_and_metrics(self, mock_get_client):
+        """Test that responses report their phases and /metrics exposes them to admins"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        mock_sp.current_user_top_tracks.return_value = {'items': []}
+        
+        response = self.client.get('/api/top-tracks')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('serialize;dur=', response.headers['Server-Timing'])
+        self.assertIn('total;dur=', response.headers['Server-Timing'])
+        
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with patch.dict(app.config, ADMIN_TOKEN=None):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer test-admin-token'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('sonify_http_requests_total{endpoint="/api/top-tracks",method="GET",status="200"}', text)
+        self.assertIn('sonify_request_phase_duration_seconds_count{endpoint="/api/top-tracks",phase="serialize"}',
+                      text)
+        self.assertIn('sonify_component_hits{component="spotify_cache"}', text)
+    
+    def test_rate_limit_split_between_workers(self):
+        """Test that gunicorn workers share the app-wide Spotify rate limit"""
+        with patch.dict(app.config, SERVER='werkzeug', SPOTIFY_RATE_LIMIT=20, SPOTIFY_RATE_BURST=40,
+                        WEB_WORKERS=4):
+            self.assertEqual(rate_limit_share(), (20, 40))
+            app.config['SERVER'] = 'gunicorn'
+            self.assertEqual(rate_limit_share(), (5, 10))
+            app.config['WEB_WORKERS'] = 64
+            self.assertEqual(rate_limit_share(), (20 / 64, 1))
+    
+    def test_admin_profiling(self):
+        """Test that admins can profile a request, then list and download the profile"""
+        admin = {'Authorization': 'Bearer test-admin-token'}
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('app.profile_store', ProfileStore(directory)):
+            response = self.client.get('/')
+            self.assertNotIn('X-Sonify-Profile-Id', response.headers)
+            response = self.client.get('/', headers={'X-Sonify-Profile': 'wrong'})
+            self.assertNotIn('X-Sonify-Profile-Id', response.headers)
+        
+            response = self.client.get('/', headers={'X-Sonify-Profile': 'test-admin-token'})
+            profile_id = response.headers['X-Sonify-Profile-Id']
+        
+            self.assertEqual(self.client.get('/admin/profiles').status_code, 403)
+            profiles = json.loads(self.client.get('/admin/profiles', headers=admin).data)
+            self.assertEqual([profile['id'] for profile in profiles], [profile_id])
+            self.assertEqual(profiles[0]['route'], 'root')
+        
+            response = self.client.get(profiles[0]['url'], headers=admin)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(len(response.data), 0)
+            response = self.client.get(profiles[0]['url'] + '?format=text', headers=admin)
+            self.assertIn('render_template', response.get_data(as_text=True))
+            self.assertEqual(self.client.get('/admin/profiles/123-missing', headers=admin).status_code, 404)
     
     def test_api_user_data(self):
         """Test API endpoint for user data"""
@@ -245,26 +615,26 @@ class SonifyTestCase(unittest.TestCase):
         """Test that invalid routes return 404"""
         response = self.client.get('/invalid-route')
         self.assertEqual(response.status_code, 404)
-
+    
     def test_dark_theme_support(self):
         """Test that dark theme CSS variables are present"""
         response = self.client.get('/')
         self.assertIn(b'data-theme="light"', response.data)
         self.assertIn(b'--bg-primary', response.data)
         self.assertIn(b'--text-primary', response.data)
-
+    
     def test_floating_action_button(self):
         """Test that floating action button is present when authenticated"""
         response = self.client.get('/dashboard')
         self.assertIn(b'fab', response.data)
         self.assertIn(b'Quick Actions', response.data)
-
+    
     def test_mood_analysis_features(self):
         """Test mood analysis features are present"""
         response = self.client.get('/mood_analysis')
         self.assertIn(b'mood-radar-chart', response.data)
         self.assertIn(b'Music Personality', response.data)
-
+    
     def test_insights_features(self):
         """Test insights features are present"""
         response = self.client.get('/insights')
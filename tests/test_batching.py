@@ -0,0 +1,91 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batching import MicroBatcher
+
+
+class CountingFetch:
+    """Batch fetch recording every call, with a simulated round trip"""
+
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, client, ids):
+        with self.lock:
+            self.calls.append((client, list(ids)))
+        time.sleep(self.latency)
+        return [{'id': item, 'client': client} for item in ids]
+
+
+class MicroBatcherTestCase(unittest.TestCase):
+    """Test cases for cross-request id batching"""
+
+    def test_single_caller(self):
+        """Test that a lone caller gets its results in batches of batch_size"""
+        fetch = CountingFetch(latency=0)
+        batcher = MicroBatcher(fetch, batch_size=3, max_delay=0.001)
+        results = batcher.get_many('sp', ['a', 'b', None, 'a', 'c', 'd'])
+
+        self.assertEqual(list(results), ['a', 'b', 'c', 'd'])
+        self.assertEqual(results['d'], {'id': 'd', 'client': 'sp'})
+        self.assertEqual([ids for _, ids in fetch.calls], [['a', 'b', 'c'], ['d']])
+        self.assertEqual(batcher.get_many('sp', []), {})
+
+    def test_concurrent_callers_share_calls(self):
+        """Test that overlapping lookups from many callers are merged and deduplicated"""
+        fetch = CountingFetch()
+        batcher = MicroBatcher(fetch, batch_size=100, max_delay=0.05)
+        start = threading.Barrier(20)
+
+        def lookup(n):
+            ids = [f'track{(n * 5 + i) % 60}' for i in range(30)]
+            start.wait()
+            return ids, batcher.get_many(f'user{n}', ids)
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            outcomes = list(executor.map(lookup, range(20)))
+
+        for ids, results in outcomes:
+            self.assertEqual(sorted(results), sorted(ids))
+            self.assertTrue(all(results[item]['id'] == item for item in ids))
+        sent = [item for _, ids in fetch.calls for item in ids]
+        self.assertEqual(len(sent), len(set(sent)))
+        self.assertLessEqual(len(fetch.calls), 2)
+        stats = batcher.stats()
+        self.assertEqual(stats['requested'], 600)
+        self.assertEqual(stats['sent'], 60)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_full_batch_is_sent_without_waiting(self):
+        """Test that a full batch does not wait for max_delay"""
+        batcher = MicroBatcher(CountingFetch(latency=0), batch_size=2, max_delay=5)
+        started = time.perf_counter()
+        batcher.get_many('sp', ['a', 'b'])
+        self.assertLess(time.perf_counter() - started, 1)
+
+    def test_error_reaches_every_waiting_caller(self):
+        """Test that a failed batch call raises for each caller and is not cached"""
+        def fail(client, ids):
+            time.sleep(0.02)
+            raise RuntimeError('rate limited')
+        batcher = MicroBatcher(fail, batch_size=10, max_delay=0.02)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(batcher.get_many, 'sp', ['a', 'b']) for _ in range(3)]
+            for future in futures:
+                with self.assertRaises(RuntimeError):
+                    future.result()
+
+        batcher.fetch = CountingFetch(latency=0)
+        self.assertEqual(batcher.get_many('sp', ['a'])['a']['id'], 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cache import TTLCache, CachedSpotify, invalidate_user
+from singleflight import SingleFlight
+
+
+class FakeClock:
+    """Manually advanced clock for TTL tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    """Test cases for the TTL/LRU cache"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(max_entries=2, default_ttl=10, clock=self.clock)
+
+    def test_entries_expire_after_ttl(self):
+        """Test that entries are dropped once their TTL has elapsed"""
+        self.cache.set('a', 1, ttl=5)
+        self.clock.now = 4.9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.clock.now = 5.0
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted when full"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_stats(self):
+        """Test hit/miss accounting"""
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('missing')
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['size'], 1)
+
+
+class CachedSpotifyTestCase(unittest.TestCase):
+    """Test cases for the caching spotipy proxy"""
+
+    def setUp(self):
+        self.cache = TTLCache(max_entries=100)
+        self.ttls = {'current_user_top_tracks': 60}
+        self.client = MagicMock()
+        self.client.current_user_top_tracks.return_value = {'items': []}
+
+    def test_cached_endpoint_hits_upstream_once(self):
+        """Test that repeated identical calls are served from the cache"""
+        sp = CachedSpotify(self.client, 'user1', self.cache, self.ttls)
+        sp.current_user_top_tracks(limit=10, time_range='short_term')
+        sp.current_user_top_tracks(limit=10, time_range='short_term')
+        self.assertEqual(self.client.current_user_top_tracks.call_count, 1)
+
+        sp.current_user_top_tracks(limit=50, time_range='short_term')
+        self.assertEqual(self.client.current_user_top_tracks.call_count, 2)
+
+    def test_entries_are_per_user(self):
+        """Test that users never share cached responses"""
+        CachedSpotify(self.client, 'user1', self.cache, self.ttls).current_user_top_tracks(limit=10)
+        CachedSpotify(self.client, 'user2', self.cache, self.ttls).current_user_top_tracks(limit=10)
+        self.assertEqual(self.client.current_user_top_tracks.call_count, 2)
+
+        self.assertEqual(invalidate_user(self.cache, 'user1'), 1)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_uncached_methods_pass_through(self):
+        """Test that methods without a TTL always reach the client"""
+        sp = CachedSpotify(self.client, 'user1', self.cache, self.ttls)
+        sp.current_user_playlists(limit=20)
+        sp.current_user_playlists(limit=20)
+        self.assertEqual(self.client.current_user_playlists.call_count, 2)
+
+    def test_concurrent_misses_share_one_call(self):
+        """Test that identical concurrent calls of a user make one upstream call"""
+        start = threading.Barrier(8)
+
+        def slow_top_tracks(**kwargs):
+            time.sleep(0.05)
+            return {'items': [kwargs['limit']]}
+        self.client.current_user_top_tracks.side_effect = slow_top_tracks
+        flights = SingleFlight()
+
+        def page_load(user_id):
+            sp = CachedSpotify(self.client, user_id, self.cache, self.ttls, flights=flights)
+            start.wait()
+            return sp.current_user_top_tracks(limit=20)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(page_load, ['user1'] * 6 + ['user2'] * 2))
+
+        self.assertEqual(results, [{'items': [20]}] * 8)
+        self.assertEqual(self.client.current_user_top_tracks.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import json
+import os
+import sys
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.utils
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import charts
+from utils import DAYS
+
+
+def reference_json(fig):
+    return json.loads(json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+class ChartsTestCase(unittest.TestCase):
+    """Test that the fast builders match graph_objects output"""
+
+    def test_bar_chart_matches_graph_objects(self):
+        """Test bar chart JSON equals the graph_objects figure"""
+        fig = go.Figure(data=[go.Bar(x=['a', 'b'], y=[3, 7], marker_color='rgb(30, 215, 96)')])
+        fig.update_layout(title='Top', xaxis_title='Track', yaxis_title='Popularity',
+                          template='plotly_dark', showlegend=False)
+
+        fast = charts.bar_chart(['a', 'b'], [3, 7], 'rgb(30, 215, 96)', 'Top', 'Track',
+                                'Popularity', showlegend=False)
+        self.assertEqual(json.loads(fast), reference_json(fig))
+
+    def test_heatmap_chart_matches_graph_objects(self):
+        """Test heatmap JSON, including the expanded colorscale and NumPy data"""
+        z = np.arange(7 * 24).reshape(7, 24)
+        fig = go.Figure(data=go.Heatmap(z=z.tolist(), x=list(range(24)), y=DAYS,
+                                        colorscale='Viridis', hoverongaps=False))
+        fig.update_layout(title='Heatmap', xaxis_title='Hour of Day', yaxis_title='Day of Week',
+                          template='plotly_dark')
+
+        fast = charts.heatmap_chart(z, list(range(24)), DAYS, 'Heatmap', 'Hour of Day',
+                                    'Day of Week', hoverongaps=False)
+        self.assertEqual(json.loads(fast), reference_json(fig))
+
+    def test_polar_chart_matches_graph_objects(self):
+        """Test radar chart JSON equals the graph_objects figure"""
+        fig = go.Figure()
+        fig.add_trace(go.Scatterpolar(r=[0.5, 0.2], theta=['energy', 'valence'], fill='toself',
+                                      name='Profile', line_color='rgb(30, 215, 96)'))
+        fig.update_layout(polar=dict(radialaxis=dict(visible=True, range=[0, 1])),
+                          showlegend=False, title='Mood', template='plotly_dark')
+
+        fast = charts.polar_chart([0.5, 0.2], ['energy', 'valence'], 'Profile',
+                                  'rgb(30, 215, 96)', 'Mood')
+        self.assertEqual(json.loads(fast), reference_json(fig))
+
+    def test_line_chart_matches_graph_objects(self):
+        """Test line chart JSON equals the graph_objects figure"""
+        fig = go.Figure(data=[go.Scatter(x=['2024-01-01', '2024-01-02'], y=[4, 2],
+                                         mode='lines+markers',
+                                         line=dict(color='rgb(30, 215, 96)', width=3),
+                                         marker=dict(size=8, color='rgb(30, 215, 96)'))])
+        fig.update_layout(title='Timeline', xaxis_title='Date', yaxis_title='Number of Tracks',
+                          template='plotly_dark')
+
+        fast = charts.line_chart(['2024-01-01', '2024-01-02'], np.array([4, 2]),
+                                 'rgb(30, 215, 96)', 'Timeline', 'Date', 'Number of Tracks')
+        self.assertEqual(json.loads(fast), reference_json(fig))
+
+    def test_compact_chart_data(self):
+        """Test that compact chart data holds only plain labels and values"""
+        self.assertEqual(charts.series(['a', 'b'], np.array([3, 1])), {'labels': ['a', 'b'], 'values': [3, 1]})
+        heatmap = np.zeros((7, 24))
+        heatmap[2, 5] = 4
+        data = charts.matrix(heatmap)
+        self.assertEqual(data['z'][2][5], 4)
+        self.assertIsInstance(data['z'][0][0], int)
+        self.assertEqual(len(json.dumps(data)), len(json.dumps({'z': [[0] * 24] * 7})))
+        self.assertEqual(charts.matrix([[0.5, 1]]), {'z': [[0.5, 1]]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import gzip
+import json
+import os
+import sys
+from unittest.mock import patch
+
+from flask import Flask
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import conditional
+from conditional import brotli_available, json_response, versioned_json_response
+
+
+def create_app():
+    app = Flask(__name__)
+    app.config['API_COMPRESS_MIN_SIZE'] = 1024
+    app.builds = 0
+
+    @app.route('/small')
+    def small():
+        return json_response({'id': 'user1'})
+
+    @app.route('/large')
+    def large():
+        return json_response([{'name': f'Track {n}', 'popularity': n % 100} for n in range(200)])
+
+    @app.route('/versioned')
+    def versioned():
+        def build():
+            app.builds += 1
+            return {'track_ids': ['a', 'b'], 'energy': 0.5}
+        return versioned_json_response(['a', 'b'], build)
+    return app
+
+
+class ConditionalResponseTestCase(unittest.TestCase):
+    """Test cases for ETags, conditional GET and compression of JSON responses"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+    def test_etag_and_not_modified(self):
+        """Test that a matching If-None-Match gets an empty 304"""
+        response = self.client.get('/small')
+        self.assertEqual(response.json, {'id': 'user1'})
+        etag = response.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+        response = self.client.get('/small', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        response = self.client.get('/small', headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_small_bodies_are_not_compressed(self):
+        """Test that bodies under the threshold are sent as they are"""
+        response = self.client.get('/small', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_gzip(self):
+        """Test that large bodies are gzipped and tagged per encoding"""
+        with patch.dict(conditional.ENCODERS, {'gzip': conditional._gzip}, clear=True):
+            plain = self.client.get('/large')
+            response = self.client.get('/large', headers={'Accept-Encoding': 'gzip, deflate'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertLess(len(response.data), len(plain.data) / 3)
+            self.assertEqual(json.loads(gzip.decompress(response.data)), plain.json)
+            self.assertNotEqual(response.headers['ETag'], plain.headers['ETag'])
+
+            response = self.client.get('/large', headers={'Accept-Encoding': 'gzip',
+                                                          'If-None-Match': response.headers['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    @unittest.skipUnless(brotli_available(), 'brotli is not installed')
+    def test_brotli_preferred(self):
+        """Test that brotli is chosen over gzip when both are accepted"""
+        import brotli
+        response = self.client.get('/large', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.data))[0]['name'], 'Track 0')
+
+    def test_versioned_response_skips_build(self):
+        """Test that a 304 for versioned content never builds the payload"""
+        response = self.client.get('/versioned')
+        self.assertEqual(response.json['energy'], 0.5)
+        response = self.client.get('/versioned', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.app.builds, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from exporters import (
+    EXPORT_KINDS, csv_stream, gzip_stream, ndjson_stream, parquet_stream, arrow_stream,
+    export_stream, pyarrow_available
+)
+
+COLUMNS = [('name', 'string'), ('popularity', 'int32')]
+PLAY_COLUMNS = EXPORT_KINDS['plays'][0]
+
+
+def rows(n):
+    return ({'name': f'Track, "{i}"', 'popularity': i % 100} for i in range(n))
+
+
+def play_rows(n):
+    return ({'played_at': f'2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.000Z', 'track_id': f'id{i}',
+             'track_name': f'Track {i}', 'artist_name': 'A', 'album_name': None,
+             'duration_ms': 1000 * i} for i in range(n))
+
+
+class ExportersTestCase(unittest.TestCase):
+    """Test cases for streaming exports"""
+
+    def test_csv_stream_round_trips(self):
+        """Test that streamed CSV parses back to the rows, quoting included"""
+        data = b''.join(csv_stream(rows(1000), COLUMNS, chunk_size=1024))
+        parsed = list(csv.DictReader(io.StringIO(data.decode('utf-8'))))
+
+        self.assertEqual(len(parsed), 1000)
+        self.assertEqual(parsed[7], {'name': 'Track, "7"', 'popularity': '7'})
+
+    def test_csv_stream_is_chunked(self):
+        """Test that output is yielded in bounded chunks as rows are consumed"""
+        chunks = list(csv_stream(rows(10000), COLUMNS, chunk_size=4096))
+
+        self.assertGreater(len(chunks), 10)
+        self.assertTrue(all(len(chunk) < 4096 + 100 for chunk in chunks))
+
+    def test_csv_stream_is_lazy(self):
+        """Test that rows are pulled only as chunks are requested"""
+        consumed = []
+
+        def tracked():
+            for row in rows(10000):
+                consumed.append(row)
+                yield row
+        next(csv_stream(tracked(), COLUMNS, chunk_size=1024))
+
+        self.assertLess(len(consumed), 100)
+
+    def test_gzip_stream(self):
+        """Test that the compressed stream is a valid gzip file"""
+        data = b''.join(csv_stream(rows(5000), COLUMNS))
+        compressed = b''.join(gzip_stream(csv_stream(rows(5000), COLUMNS)))
+
+        self.assertEqual(gzip.decompress(compressed), data)
+        self.assertLess(len(compressed), len(data) / 4)
+
+    def test_export_kinds(self):
+        """Test that each export row builder produces exactly its columns"""
+        track = {'name': 'T', 'artists': [{'name': 'A'}], 'album': {'name': 'B'},
+                 'popularity': 5, 'duration_ms': 61000}
+        artist = {'name': 'A', 'popularity': 7, 'genres': ['x', 'y', 'z', 'w'],
+                  'followers': {'total': 3}}
+        play = {'played_at': '2024-01-01T00:00:00.000Z', 'track': dict(track, id='t')}
+        features = {'id': 't', 'danceability': 0.5, 'energy': 0.4, 'type': 'audio_features'}
+        for kind, item in (('tracks', track), ('artists', artist), ('plays', play),
+                           ('audio_features', features)):
+            columns, to_row = EXPORT_KINDS[kind]
+            self.assertEqual(list(to_row(item)), [name for name, _ in columns])
+        self.assertEqual(EXPORT_KINDS['tracks'][1](track)['duration'], '1:01')
+        self.assertEqual(EXPORT_KINDS['artists'][1](artist)['genres'], 'x, y, z')
+        self.assertEqual(EXPORT_KINDS['audio_features'][1](features)['track_id'], 't')
+
+    def test_ndjson_stream(self):
+        """Test that each NDJSON line is one row with the columns in order"""
+        chunks = list(ndjson_stream(rows(5000), COLUMNS, chunk_size=4096))
+        lines = b''.join(chunks).decode('utf-8').splitlines()
+
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(len(lines), 5000)
+        self.assertEqual(json.loads(lines[7]), {'name': 'Track, "7"', 'popularity': 7})
+
+    def test_export_stream_gzips_text_formats_only(self):
+        """Test that compress applies to CSV and NDJSON but not to columnar formats"""
+        compressed = b''.join(export_stream('ndjson', rows(100), COLUMNS, 'gzip'))
+        self.assertEqual(gzip.decompress(compressed), b''.join(ndjson_stream(rows(100), COLUMNS)))
+        if pyarrow_available():
+            parquet = b''.join(export_stream('parquet', rows(100), COLUMNS, 'gzip'))
+            self.assertEqual(parquet[:4], b'PAR1')
+
+
+@unittest.skipUnless(pyarrow_available(), 'pyarrow is not installed')
+class ColumnarExportersTestCase(unittest.TestCase):
+    """Test cases for the Parquet and Arrow IPC exports"""
+
+    def test_parquet_round_trips_typed_columns(self):
+        """Test that Parquet keeps the column types, nulls included"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        data = b''.join(parquet_stream(play_rows(250), PLAY_COLUMNS, batch_size=100))
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        table = parquet.read()
+
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual(table.num_rows, 250)
+        self.assertEqual(table.schema.field('played_at').type, pa.timestamp('ms', tz='UTC'))
+        self.assertEqual(table.schema.field('duration_ms').type, pa.int64())
+        self.assertEqual(table.column('duration_ms')[3].as_py(), 3000)
+        self.assertEqual(table.column('album_name').null_count, 250)
+        self.assertEqual(table.column('played_at')[61].as_py().isoformat(), '2024-01-01T00:01:01+00:00')
+
+    def test_parquet_streams_row_groups(self):
+        """Test that each row group is yielded once written, pulling one batch of rows"""
+        consumed = []
+
+        def tracked():
+            for row in play_rows(1000):
+                consumed.append(row)
+                yield row
+        chunks = parquet_stream(tracked(), PLAY_COLUMNS, batch_size=100)
+        first = next(chunks)
+
+        self.assertEqual(first[:4], b'PAR1')
+        self.assertLessEqual(len(consumed), 101)
+        self.assertEqual(b''.join(chunks)[-4:], b'PAR1')
+
+    def test_arrow_stream_round_trips(self):
+        """Test that the Arrow IPC stream reads back as record batches"""
+        import pyarrow as pa
+        data = b''.join(arrow_stream(rows(250), COLUMNS, batch_size=100))
+        reader = pa.ipc.open_stream(data)
+        batches = list(reader)
+
+        self.assertEqual([batch.num_rows for batch in batches], [100, 100, 50])
+        self.assertEqual(reader.schema.field('popularity').type, pa.int32())
+        self.assertEqual(batches[0].column(0)[7].as_py(), 'Track, "7"')
+
+
+if __name__ == '__main__':
+    unittest.main()
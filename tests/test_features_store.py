@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import MagicMock
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from features_store import AudioFeaturesStore
+
+
+def fake_audio_features(track_ids):
+    """Mimic spotipy: one entry per id, None for unknown tracks"""
+    return [None if track_id.startswith('unknown') else {'id': track_id, 'energy': 0.5}
+            for track_id in track_ids]
+
+
+class AudioFeaturesStoreTestCase(unittest.TestCase):
+    """Test cases for the persistent audio-features store"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'features.sqlite3')
+        self.store = AudioFeaturesStore(self.path)
+        self.sp = MagicMock()
+        self.sp.audio_features.side_effect = fake_audio_features
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_only_missing_ids_are_fetched(self):
+        """Test that stored tracks are never requested again"""
+        self.store.fetch(self.sp, ['a', 'b'])
+        features = self.store.fetch(self.sp, ['b', 'c', 'a'])
+
+        self.assertEqual([f['id'] for f in features], ['b', 'c', 'a'])
+        self.assertEqual(self.sp.audio_features.call_args_list[-1].args[0], ['c'])
+
+        self.sp.audio_features.reset_mock()
+        self.store.fetch(self.sp, ['a', 'b', 'c'])
+        self.sp.audio_features.assert_not_called()
+
+    def test_batches_of_one_hundred(self):
+        """Test that misses are fetched in batches the API accepts"""
+        track_ids = [f'track{i}' for i in range(250)]
+        features = self.store.fetch(self.sp, track_ids)
+
+        self.assertEqual(len(features), 250)
+        batch_sizes = [len(call.args[0]) for call in self.sp.audio_features.call_args_list]
+        self.assertEqual(batch_sizes, [100, 100, 50])
+
+    def test_unknown_tracks_are_remembered(self):
+        """Test that tracks without features are stored as None"""
+        self.assertEqual(self.store.fetch(self.sp, ['unknown1']), [None])
+        self.sp.audio_features.reset_mock()
+        self.assertEqual(self.store.fetch(self.sp, ['unknown1']), [None])
+        self.sp.audio_features.assert_not_called()
+
+    def test_store_is_persistent(self):
+        """Test that a second store on the same file sees stored features"""
+        self.store.fetch(self.sp, ['a'])
+        other = AudioFeaturesStore(self.path)
+        self.assertEqual(other.get_many(['a', 'b']), {'a': {'id': 'a', 'energy': 0.5}})
+        self.assertEqual(len(other), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
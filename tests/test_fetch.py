@@ -0,0 +1,176 @@
+import unittest
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fetch import FetchPlan, iter_pages
+
+
+def slow(value, delay=0.1):
+    time.sleep(delay)
+    return value
+
+
+class FetchPlanTestCase(unittest.TestCase):
+    """Test cases for concurrent fetch plans"""
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_calls_run_concurrently(self):
+        """Test that plan latency is close to the slowest call"""
+        plan = FetchPlan(self.executor)
+        for name in ('a', 'b', 'c', 'd'):
+            plan.add(name, slow, name)
+
+        started = time.perf_counter()
+        results = plan.run()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(results, {'a': 'a', 'b': 'b', 'c': 'c', 'd': 'd'})
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual(set(plan.timings), {'a', 'b', 'c', 'd'})
+        self.assertTrue(all(t >= 0.1 for t in plan.timings.values()))
+
+    def test_errors_propagate(self):
+        """Test that a failing call raises from run()"""
+        def fail():
+            raise ValueError('boom')
+
+        plan = FetchPlan(self.executor)
+        plan.add('ok', slow, 1, delay=0)
+        plan.add('bad', fail)
+        with self.assertRaises(ValueError):
+            plan.run()
+        self.assertIn('bad', plan.timings)
+
+
+class PagedEndpoint:
+    """Paged endpoint over range(total) recording the offsets requested"""
+
+    def __init__(self, total, delay=0.0):
+        self.total = total
+        self.delay = delay
+        self.offsets = []
+
+    def __call__(self, limit=20, offset=0, **kwargs):
+        self.offsets.append(offset)
+        time.sleep(self.delay)
+        items = list(range(offset, min(offset + limit, self.total)))
+        return {'items': items, 'total': self.total, 'limit': limit, 'offset': offset,
+                'next': 'next' if offset + limit < self.total else None}
+
+
+class PagedFetchTestCase(unittest.TestCase):
+    """Test cases for paged calls in fetch plans"""
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=8)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_fetches_every_page(self):
+        """Test that all pages are fetched once and merged in order"""
+        endpoint = PagedEndpoint(total=230)
+        plan = FetchPlan(self.executor)
+        plan.add_paged('items', endpoint, limit=50)
+        result = plan.run()['items']
+
+        self.assertEqual(result['items'], list(range(230)))
+        self.assertEqual(result['total'], 230)
+        self.assertIsNone(result['next'])
+        self.assertEqual(sorted(endpoint.offsets), [0, 50, 100, 150, 200])
+        self.assertEqual(plan.requests, 5)
+
+    def test_remaining_pages_run_concurrently(self):
+        """Test that pages after the first take one more round trip, not one each"""
+        endpoint = PagedEndpoint(total=400, delay=0.05)
+        plan = FetchPlan(self.executor)
+        plan.add_paged('items', endpoint, limit=50)
+
+        started = time.perf_counter()
+        plan.run()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(endpoint.offsets), 8)
+        self.assertLess(elapsed, 0.25)
+
+    def test_known_total_skips_first_round(self):
+        """Test that a known total fetches all pages at once and none when empty"""
+        endpoint = PagedEndpoint(total=250)
+        empty = PagedEndpoint(total=0)
+        plan = FetchPlan(self.executor)
+        plan.add_paged('tracks', endpoint, limit=100, total=250)
+        plan.add_paged('empty', empty, limit=100, total=0)
+        results = plan.run()
+
+        self.assertEqual(results['tracks']['items'], list(range(250)))
+        self.assertEqual(results['empty']['items'], [])
+        self.assertEqual(empty.offsets, [])
+        self.assertEqual(plan.requests, 3)
+
+    def test_max_items(self):
+        """Test that paging stops at max_items"""
+        endpoint = PagedEndpoint(total=1000)
+        plan = FetchPlan(self.executor)
+        plan.add_paged('items', endpoint, limit=50, max_items=120)
+        result = plan.run()['items']
+
+        self.assertEqual(result['items'], list(range(120)))
+        self.assertEqual(sorted(endpoint.offsets), [0, 50, 100])
+
+    def test_first_page_without_total(self):
+        """Test that a response without a total is returned as a single page"""
+        plan = FetchPlan(self.executor)
+        plan.add_paged('items', lambda limit, offset: {'items': ['a', 'b']}, limit=50)
+        plan.add('other', slow, 'x', delay=0)
+        results = plan.run()
+
+        self.assertEqual(results['items']['items'], ['a', 'b'])
+        self.assertEqual(results['other'], 'x')
+
+
+class IterPagesTestCase(unittest.TestCase):
+    """Test cases for streaming page iteration"""
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=8)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_yields_pages_in_order(self):
+        """Test that pages come out in offset order and stop at the total"""
+        endpoint = PagedEndpoint(total=230, delay=0.01)
+        pages = list(iter_pages(self.executor, endpoint, limit=50, window=3))
+
+        self.assertEqual([item for page in pages for item in page['items']], list(range(230)))
+        self.assertEqual(sorted(endpoint.offsets), [0, 50, 100, 150, 200])
+
+    def test_prefetch_is_bounded(self):
+        """Test that only the window of pages is requested ahead of the consumer"""
+        endpoint = PagedEndpoint(total=1000)
+        pages = iter_pages(self.executor, endpoint, limit=10, window=3)
+        next(pages)
+        next(pages)
+        time.sleep(0.05)
+
+        self.assertLessEqual(len(endpoint.offsets), 5)
+        pages.close()
+
+    def test_first_page_without_total(self):
+        """Test that a response without a total yields a single page"""
+        pages = list(iter_pages(self.executor, lambda limit, offset: {'items': [1]}, limit=50))
+        self.assertEqual(pages, [{'items': [1]}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from history import ListeningHistoryStore, HistoryIngestor, played_at_ms
+
+
+def play(track_id, played_at):
+    return {
+        'track': {'id': track_id, 'name': f'Track {track_id}', 'duration_ms': 1000,
+                  'artists': [{'id': 'a1', 'name': 'Artist'}], 'album': {'name': 'Album'},
+                  'available_markets': ['US'] * 100},
+        'played_at': played_at
+    }
+
+
+class ListeningHistoryStoreTestCase(unittest.TestCase):
+    """Test cases for the append-only listening history"""
+
+    def setUp(self):
+        self.store = ListeningHistoryStore(':memory:')
+
+    def test_append_deduplicates(self):
+        """Test that a play is stored once however often it is seen"""
+        items = [play('t1', '2024-01-01T10:00:00.000Z'), play('t2', '2024-01-01T11:00:00.000Z')]
+        self.assertEqual(self.store.append('u1', items), 2)
+        self.assertEqual(self.store.append('u1', items + [play('t3', '2024-01-01T12:00:00.000Z')]), 1)
+        self.assertEqual(self.store.count('u1'), 3)
+        self.assertEqual(self.store.count('u2'), 0)
+
+    def test_items_newest_first_and_compact(self):
+        """Test history ordering and that unused track fields are dropped"""
+        self.store.append('u1', [play('t1', '2024-01-01T10:00:00Z'), play('t2', '2024-01-02T10:00:00Z')])
+        items = self.store.items('u1')
+        self.assertEqual([i['track']['id'] for i in items], ['t2', 't1'])
+        self.assertNotIn('available_markets', items[0]['track'])
+        self.assertEqual(self.store.cursor('u1'), played_at_ms('2024-01-02T10:00:00Z'))
+
+    def test_iter_items_in_batches(self):
+        """Test that iterating the history in batches matches items, ties included"""
+        self.store.append('u1', [play(f't{i}', f'2024-01-01T10:00:{i % 7:02d}Z') for i in range(50)])
+        self.store.append('u2', [play('t1', '2024-01-01T10:00:00Z')])
+        batched = list(self.store.iter_items('u1', batch_size=4))
+        self.assertEqual(len(batched), 50)
+        self.assertEqual([i['played_at'] for i in batched], [i['played_at'] for i in self.store.items('u1')])
+        self.assertEqual(len({(i['played_at'], i['track']['id']) for i in batched}), 50)
+        self.assertEqual(self.store.track_ids('u2'), ['t1'])
+
+    def test_ingest_uses_after_cursor(self):
+        """Test that ingestion only asks Spotify for plays after the cursor"""
+        self.store.append('u1', [play('t1', '2024-01-01T10:00:00Z')])
+        sp = MagicMock()
+        sp.current_user_recently_played.return_value = {
+            'items': [play('t2', '2024-01-01T11:00:00Z')],
+            'cursors': {'after': str(played_at_ms('2024-01-01T11:00:00Z'))}
+        }
+
+        self.assertEqual(self.store.ingest(sp, 'u1'), 1)
+        sp.current_user_recently_played.assert_called_once_with(
+            limit=50, after=played_at_ms('2024-01-01T10:00:00Z'))
+
+
+class HistoryIngestorTestCase(unittest.TestCase):
+    """Test cases for background history polling"""
+
+    def test_poll_refreshes_expired_tokens(self):
+        """Test that expired tokens are refreshed before polling"""
+        store = ListeningHistoryStore(':memory:')
+        sp = MagicMock()
+        sp.current_user_recently_played.return_value = {'items': [play('t1', '2024-01-01T10:00:00Z')]}
+        refresh = MagicMock(return_value={'access_token': 'new'})
+        factory = MagicMock(return_value=sp)
+        ingestor = HistoryIngestor(store, factory, refresh, is_expired=lambda t: t['access_token'] == 'old')
+        ingestor._tokens['u1'] = {'access_token': 'old'}
+
+        self.assertEqual(ingestor.poll_once(), {'u1': 1})
+        factory.assert_called_once_with({'access_token': 'new'})
+        self.assertEqual(ingestor._tokens['u1'], {'access_token': 'new'})
+
+    def ingestor(self, sp, **kwargs):
+        self.now = 0.0
+        ingestor = HistoryIngestor(ListeningHistoryStore(':memory:'), MagicMock(return_value=sp), MagicMock(),
+                                   is_expired=lambda t: False, clock=lambda: self.now, **kwargs)
+        ingestor.ensure_started = MagicMock()
+        return ingestor
+
+    def test_users_with_expired_sessions_are_dropped(self):
+        """Test that users who stopped loading pages are no longer polled"""
+        sp = MagicMock()
+        sp.current_user_recently_played.return_value = {'items': []}
+        ingestor = self.ingestor(sp, ttl=3600)
+        ingestor.register('u1', {'access_token': 'a'})
+        self.now = 3000
+        ingestor.register('u2', {'access_token': 'b'})
+
+        self.now = 4000
+        self.assertEqual(ingestor.poll_once(), {'u2': 0})
+        self.assertEqual(len(ingestor), 1)
+
+    def test_failing_users_are_dropped(self):
+        """Test that a user is dropped after max_failures failed polls in a row"""
+        sp = MagicMock()
+        sp.current_user_recently_played.side_effect = Exception('401 revoked')
+        ingestor = self.ingestor(sp, max_failures=2)
+        ingestor.register('u1', {'access_token': 'a'})
+
+        ingestor.poll_once()
+        self.assertEqual(len(ingestor), 1)
+        ingestor.poll_once()
+        self.assertEqual(len(ingestor), 0)
+
+    def test_registrations_are_capped(self):
+        """Test that the least recently seen users are dropped beyond max_users"""
+        ingestor = self.ingestor(MagicMock(), max_users=2)
+        for user_id in ('u1', 'u2', 'u3'):
+            ingestor.register(user_id, {'access_token': user_id})
+        ingestor.register('u2', {'access_token': 'u2'})
+        ingestor.register('u4', {'access_token': 'u4'})
+
+        self.assertEqual(list(ingestor._tokens), ['u2', 'u4'])
+
+
+class HistoryRoutesTestCase(unittest.TestCase):
+    """Test cases for analytics over the accumulated history"""
+
+    def setUp(self):
+        from app import app, history_store
+        self.history_store = history_store
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['token_info'] = {'access_token': 'test_token', 'refresh_token': 'test_refresh',
+                                  'expires_at': 9999999999}
+            sess['user_id'] = 'history_user'
+
+    @patch('app.get_spotify_client')
+    def test_dashboard_accumulates_plays(self, mock_get_client):
+        """Test that plays from successive page loads are all analyzed"""
+        mock_sp = MagicMock()
+        mock_get_client.return_value = mock_sp
+        mock_sp.current_user.return_value = {'id': 'history_user', 'display_name': 'History User',
+                                             'images': [], 'followers': {'total': 0}}
+        mock_sp.current_user_top_tracks.return_value = {'items': []}
+        mock_sp.current_user_top_artists.return_value = {'items': []}
+
+        for played_at in ('2024-01-01T10:00:00Z', '2024-01-02T10:00:00Z'):
+            mock_sp.current_user_recently_played.return_value = {'items': [play('t1', played_at)]}
+            response = self.client.get('/dashboard')
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.history_store.count('history_user'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
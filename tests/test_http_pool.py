@@ -0,0 +1,40 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import spotipy
+
+from http_pool import create_session, NullCacheHandler
+
+
+class SharedSessionTestCase(unittest.TestCase):
+    """Test cases for the shared Spotify connection pool"""
+
+    def test_pool_survives_client_garbage_collection(self):
+        """Test that short-lived spotipy clients don't close the shared pool"""
+        session = create_session(pool_maxsize=16)
+        adapter = session.get_adapter('https://api.spotify.com/v1/')
+        adapter.poolmanager.connection_from_url('https://api.spotify.com/v1/')
+
+        sp = spotipy.Spotify(auth='token', requests_session=session)
+        del sp
+        session.close()
+
+        self.assertEqual(len(adapter.poolmanager.pools), 1)
+        self.assertEqual(adapter._pool_maxsize, 16)
+
+        session.shutdown()
+        self.assertEqual(len(adapter.poolmanager.pools), 0)
+
+    def test_null_cache_handler_never_returns_tokens(self):
+        """Test that the shared OAuth manager cannot leak cached tokens"""
+        handler = NullCacheHandler()
+        handler.save_token_to_cache({'access_token': 'secret'})
+        self.assertIsNone(handler.get_cached_token())
+
+
+if __name__ == '__main__':
+    unittest.main()
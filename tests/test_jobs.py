@@ -0,0 +1,131 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from jobs import JobRunner, DONE, FAILED, RUNNING
+
+
+class JobRunnerTestCase(unittest.TestCase):
+    """Test cases for the background job runner"""
+
+    def setUp(self):
+        self.runner = JobRunner(max_workers=2, result_ttl=60)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+
+    def blocked(self, value):
+        self.release.wait(5)
+        return value
+
+    def test_result(self):
+        """Test that a finished job holds its result"""
+        job = self.runner.submit('u1', 'insights', lambda x: x * 2, 21)
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.result, 42)
+        self.assertIs(self.runner.get(job.id), job)
+        self.assertIsNone(self.runner.get('unknown'))
+
+    def test_failure(self):
+        """Test that an exception marks the job failed with its message"""
+        def fail():
+            raise ValueError('boom')
+
+        job = self.runner.submit('u1', 'insights', fail)
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, 'boom')
+
+    def test_duplicates_coalesce(self):
+        """Test that a user's jobs of one kind share a single run while it is in flight"""
+        first = self.runner.submit('u1', 'insights', self.blocked, 1)
+        second = self.runner.submit('u1', 'insights', self.blocked, 2)
+        other_kind = self.runner.submit('u1', 'mood_analysis', self.blocked, 3)
+        other_user = self.runner.submit('u2', 'insights', self.blocked, 4)
+        anonymous = [self.runner.submit(None, 'insights', self.blocked, 5) for _ in range(2)]
+
+        self.assertIs(second, first)
+        self.assertEqual(len({first.id, other_kind.id, other_user.id, anonymous[0].id, anonymous[1].id}), 5)
+        self.assertFalse(first.done)
+
+        self.release.set()
+        self.assertTrue(first.wait(5))
+        self.assertEqual(first.result, 1)
+
+        # Once finished, a new submission runs again
+        again = self.runner.submit('u1', 'insights', lambda: 6)
+        self.assertIsNot(again, first)
+        self.assertTrue(again.wait(5))
+        self.assertEqual(again.result, 6)
+
+    def test_status(self):
+        """Test that the status describes the job without its result"""
+        job = self.runner.submit('u1', 'insights', self.blocked, {'big': 'result'})
+        deadline = time.time() + 5
+        while job.status != RUNNING and time.time() < deadline:
+            time.sleep(0.01)
+        status = job.to_dict()
+        self.assertEqual(status['status'], RUNNING)
+        self.assertEqual(status['kind'], 'insights')
+        self.assertNotIn('result', status)
+
+    def test_finished_jobs_expire(self):
+        """Test that finished jobs are dropped from the table after result_ttl"""
+        runner = JobRunner(max_workers=1, result_ttl=0)
+        job = runner.submit('u1', 'insights', lambda: 1)
+        job.wait(5)
+        time.sleep(0.01)
+        runner.submit('u1', 'insights', lambda: 2).wait(5)
+        self.assertIsNone(runner.get(job.id))
+
+
+class SharedJobsTestCase(unittest.TestCase):
+    """Test cases for jobs shared between worker processes"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'jobs.sqlite3')
+        self.runner = JobRunner(max_workers=2, result_ttl=60, path=path)
+        self.other = JobRunner(max_workers=2, result_ttl=60, path=path, poll_interval=0.01)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.directory.cleanup()
+
+    def test_status_and_result_read_by_another_runner(self):
+        """Test that another worker's runner reports a job and waits for its result"""
+        job = self.runner.submit('u1', 'insights', lambda: self.release.wait(5) and {'hours': (1, 2)})
+        stored = self.other.get(job.id)
+        self.assertEqual((stored.user_id, stored.kind), ('u1', 'insights'))
+        self.assertIn(stored.status, ('queued', RUNNING))
+        self.assertFalse(stored.wait(0.05))
+
+        self.release.set()
+        self.assertTrue(stored.wait(5))
+        self.assertEqual(stored.status, DONE)
+        self.assertEqual(stored.result, {'hours': [1, 2]})
+        self.assertEqual(self.other.get(job.id).to_dict(), job.to_dict())
+        self.assertIsNone(self.other.get('unknown'))
+
+    def test_failure_read_by_another_runner(self):
+        """Test that another worker's runner sees a failed job and its error"""
+        def fail():
+            raise ValueError('boom')
+        job = self.runner.submit('u1', 'insights', fail)
+        self.assertTrue(job.wait(5))
+        stored = self.other.get(job.id)
+        self.assertTrue(stored.done)
+        self.assertEqual((stored.status, stored.error), (FAILED, 'boom'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+import os
+import sys
+import time
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import spotipy
+
+import metrics
+from benchmarks.mock_spotify import MockSpotifyServer
+from fetch import FetchPlan, shared_executor
+from http_pool import create_session
+from metrics import Registry, RequestTimings, spotify_endpoint, timed
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RegistryTestCase(unittest.TestCase):
+    """Test cases for the Prometheus text rendering"""
+
+    def test_counter_and_histogram_render(self):
+        """Test that counters and cumulative histogram buckets are rendered"""
+        registry = Registry()
+        requests = registry.counter('test_requests_total', 'Requests', ('endpoint',))
+        latency = registry.histogram('test_latency_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1.0))
+        requests.inc('/a')
+        requests.inc('/a')
+        latency.observe(0.05, '/a')
+        latency.observe(0.5, '/a')
+
+        text = registry.render()
+        self.assertIn('# TYPE test_requests_total counter', text)
+        self.assertIn('test_requests_total{endpoint="/a"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{endpoint="/a",le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{endpoint="/a",le="1"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{endpoint="/a",le="+Inf"} 2', text)
+        self.assertIn('test_latency_seconds_sum{endpoint="/a"} 0.55', text)
+        self.assertIn('test_latency_seconds_count{endpoint="/a"} 2', text)
+
+    def test_stats_gauges(self):
+        """Test that numeric component stats become one gauge per statistic"""
+        registry = Registry()
+        registry.stats_gauges('test_cache', 'cache', 'Cache statistics',
+                              lambda: {'spotify': {'hits': 3, 'hit_rate': 0.75, 'name': 'x'}})
+
+        text = registry.render()
+        self.assertIn('# TYPE test_cache_hits gauge', text)
+        self.assertIn('test_cache_hits{cache="spotify"} 3', text)
+        self.assertIn('test_cache_hit_rate{cache="spotify"} 0.75', text)
+        self.assertNotIn('test_cache_name', text)
+
+    def test_label_values_are_escaped(self):
+        """Test that quotes in label values cannot break the format"""
+        registry = Registry()
+        registry.counter('test_total', 'Test', ('path',)).inc('/a"b')
+        self.assertIn('test_total{path="/a\\"b"} 1', registry.render())
+
+
+class RequestTimingsTestCase(unittest.TestCase):
+    """Test cases for per-request phase timings"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.timings = RequestTimings(clock=self.clock)
+
+    def test_nested_phases_are_exclusive(self):
+        """Test that an inner phase pauses the outer one"""
+        self.timings.enter('charts')
+        self.clock.now = 1.0
+        self.timings.enter('analytics')
+        self.clock.now = 3.0
+        self.timings.exit()
+        self.clock.now = 3.5
+        self.timings.exit()
+
+        self.assertEqual(self.timings.totals(), {'charts': 1.5, 'analytics': 2.0})
+
+    def test_concurrent_spotify_calls_are_not_double_counted(self):
+        """Test that Spotify time is the union of overlapping calls"""
+        self.timings.add_spotify_call(0.0, 1.0)
+        self.timings.add_spotify_call(0.5, 1.5)
+        self.timings.add_spotify_call(2.0, 2.5)
+
+        self.assertEqual(self.timings.totals(), {'spotify': 2.0})
+        self.assertEqual(self.timings.server_timing(total=3.0),
+                         'spotify;dur=2000.0;desc="3 calls", total;dur=3000.0')
+
+    def test_timed_outside_request_is_noop(self):
+        """Test that timed code runs normally when no request is being timed"""
+        @timed('analytics')
+        def compute(x):
+            return x * 2
+
+        self.assertIsNone(metrics.current_timings())
+        self.assertEqual(compute(21), 42)
+        self.assertEqual(compute.__name__, 'compute')
+
+    def test_worker_threads_report_to_request(self):
+        """Test that calls run on the fetch pool are attributed to the request"""
+        @timed('analytics')
+        def compute():
+            time.sleep(0.01)
+            return 1
+
+        timings, token = metrics.start_request()
+        try:
+            plan = FetchPlan(shared_executor())
+            plan.add('a', compute).add('b', compute)
+            self.assertEqual(plan.run(), {'a': 1, 'b': 1})
+        finally:
+            metrics.end_request(token)
+
+        self.assertGreaterEqual(timings.totals()['analytics'], 0.02)
+        self.assertIsNone(metrics.current_timings())
+
+
+class SpotifyCallMetricsTestCase(unittest.TestCase):
+    """Test cases for timing Spotify calls on the shared session"""
+
+    def test_spotify_endpoint_hides_ids(self):
+        """Test that ids are replaced so endpoints make bounded label values"""
+        self.assertEqual(spotify_endpoint('/v1/playlists/37i9dQZF1DXcBWIGoYBM5M/tracks'),
+                         '/v1/playlists/{id}/tracks')
+        self.assertEqual(spotify_endpoint('/v1/users/some.user/playlists'), '/v1/users/{id}/playlists')
+        self.assertEqual(spotify_endpoint('/v1/me/top/tracks'), '/v1/me/top/tracks')
+
+    def test_session_records_calls(self):
+        """Test that calls on the shared session reach the histogram and the request"""
+        with MockSpotifyServer(latency=0.02) as server:
+            session = create_session()
+            sp = spotipy.Spotify(auth='token', requests_session=session)
+            sp.prefix = server.url
+            before = metrics.spotify_duration.count('/v1/me/', '200')
+
+            timings, token = metrics.start_request()
+            try:
+                sp.current_user()
+            finally:
+                metrics.end_request(token)
+            session.shutdown()
+
+        self.assertEqual(metrics.spotify_duration.count('/v1/me/', '200'), before + 1)
+        self.assertEqual(timings.spotify_calls, 1)
+        self.assertGreaterEqual(timings.totals()['spotify'], 0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
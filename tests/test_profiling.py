@@ -0,0 +1,64 @@
+import unittest
+import os
+import pstats
+import sys
+import tempfile
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from profiling import ProfileStore, profiled, summary
+
+
+def hot_function():
+    return sum(i * i for i in range(10000))
+
+
+class ProfileStoreTestCase(unittest.TestCase):
+    """Test cases for stored request profiles"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ProfileStore(os.path.join(self.directory.name, 'profiles'), max_profiles=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def profile(self):
+        with profiled() as profiler:
+            hot_function()
+        return profiler
+
+    def test_save_and_read_back(self):
+        """Test that a saved profile is listed and readable with pstats"""
+        profile_id = self.store.save('/visualizations', self.profile())
+
+        profiles = self.store.list()
+        self.assertEqual([profile['id'] for profile in profiles], [profile_id])
+        self.assertEqual(profiles[0]['route'], 'visualizations')
+        path = self.store.path(profile_id)
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn('hot_function', functions)
+        self.assertIn('hot_function', summary(path))
+
+    def test_oldest_profiles_are_pruned(self):
+        """Test that only max_profiles profiles are kept"""
+        ids = [self.store.save(f'/route/{n}', self.profile()) for n in range(4)]
+        kept = [profile['id'] for profile in self.store.list()]
+        self.assertEqual(len(kept), 2)
+        self.assertNotIn(ids[0], kept)
+
+    def test_invalid_ids_are_rejected(self):
+        """Test that profile ids cannot name other files"""
+        self.store.save('/', self.profile())
+        self.assertIsNone(self.store.path('../../etc/passwd'))
+        self.assertIsNone(self.store.path('123-missing'))
+
+    def test_empty_store(self):
+        """Test that nothing is created until a profile is saved"""
+        self.assertEqual(self.store.list(), [])
+        self.assertFalse(os.path.exists(self.store.directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import spotipy
+
+from benchmarks.mock_spotify import MockSpotifyServer
+from http_pool import create_session
+from ratelimit import RateLimiter, parse_retry_after
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    """Test cases for the token bucket and adaptive concurrency limit"""
+
+    def test_parse_retry_after(self):
+        """Test Retry-After in seconds, as an HTTP date and malformed"""
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after('0.5'), 0.5)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertEqual(parse_retry_after('soon', default=2.0), 2.0)
+        self.assertEqual(parse_retry_after(None), 1.0)
+
+    def test_token_bucket_paces_requests(self):
+        """Test that requests past the burst are spaced at the refill rate"""
+        limiter = RateLimiter(rate=100, burst=2)
+        started = time.perf_counter()
+        for _ in range(12):
+            limiter.acquire()
+            limiter.release()
+        self.assertGreaterEqual(time.perf_counter() - started, 0.09)
+        self.assertEqual(limiter.stats()['requests'], 12)
+
+    def test_aimd(self):
+        """Test that 429s halve the limit once per pause and successes grow it back"""
+        limiter = RateLimiter(rate=1000, burst=100, max_concurrency=16)
+        for _ in range(2):
+            limiter.acquire()
+        limiter.release(retry_after=0.05)
+        limiter.release(retry_after=0.05)
+        self.assertEqual(limiter.limit, 8)
+
+        limiter.acquire()
+        limiter.release(retry_after=0.05)
+        self.assertEqual(limiter.limit, 4)
+
+        for _ in range(8):
+            limiter.acquire()
+            limiter.release()
+        self.assertEqual(limiter.limit, 5)
+        self.assertEqual(limiter.stats()['throttled'], 3)
+
+    def test_retry_after_pauses_every_request(self):
+        """Test that a Retry-After holds back requests from all threads"""
+        limiter = RateLimiter(rate=1000, burst=100)
+        limiter.acquire()
+        limiter.release(retry_after=0.2)
+        started = time.perf_counter()
+        limiter.acquire()
+        self.assertGreaterEqual(time.perf_counter() - started, 0.19)
+
+    def test_retry_after_is_capped(self):
+        """Test that a very long Retry-After pauses requests for max_wait at most"""
+        limiter = RateLimiter(rate=1000, burst=100, max_wait=0.1)
+        limiter.acquire()
+        limiter.release(retry_after=3600)
+        started = time.perf_counter()
+        limiter.acquire()
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+    def test_concurrency_limit(self):
+        """Test that no more requests than the limit run at once"""
+        limiter = RateLimiter(rate=1000, burst=100, max_concurrency=3)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def request(_):
+            limiter.acquire()
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+            limiter.release()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(request, range(24)))
+        self.assertLessEqual(max(peak), 3)
+
+
+class RateLimitedSessionTestCase(unittest.TestCase):
+    """Test cases against a mock Spotify server enforcing a quota"""
+
+    def setUp(self):
+        self.server = MockSpotifyServer(quota=5, window=0.25).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def fetch_all(self, session, n=25):
+        def fetch(_):
+            sp = spotipy.Spotify(auth='token', requests_session=session)
+            sp.prefix = self.server.url
+            try:
+                return sp.current_user()['id']
+            except spotipy.SpotifyException as e:
+                return e.http_status
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            return list(executor.map(fetch, range(n)))
+
+    def test_throttled_requests_are_retried(self):
+        """Test that every call succeeds despite 429s, which lower the concurrency limit"""
+        # The burst overshoots the server's quota of 20 requests/s, the steady rate matches it
+        limiter = RateLimiter(rate=20, burst=20, max_concurrency=8)
+        results = self.fetch_all(create_session(retries=5, rate_limiter=limiter))
+
+        self.assertEqual(results, ['bench_user'] * 25)
+        self.assertGreater(self.server.throttled, 0)
+        self.assertGreater(limiter.stats()['throttled'], 0)
+        self.assertLess(limiter.limit, 8)
+
+    def test_without_rate_limiter_calls_fail(self):
+        """Test the baseline: without the scheduler, throttled calls surface as errors"""
+        results = self.fetch_all(create_session(retries=0))
+        self.assertIn(429, results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import importlib.util
+import os
+import sys
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import ProductionConfig
+from run import gunicorn_options
+
+
+def config_dict(config_class, **overrides):
+    return dict({key: getattr(config_class, key) for key in dir(config_class) if key.isupper()}, **overrides)
+
+
+class ProductionServerTestCase(unittest.TestCase):
+    """Test cases for the production server settings"""
+
+    def test_production_uses_gunicorn(self):
+        """Test that FLASK_ENV=production selects the prefork server unless overridden"""
+        if 'SERVER' not in os.environ:
+            self.assertEqual(ProductionConfig.SERVER, 'gunicorn')
+
+    def test_production_hides_server_timing(self):
+        """Test that production does not send phase timings to every client unless configured to"""
+        if 'SERVER_TIMING_ENABLED' not in os.environ:
+            self.assertFalse(ProductionConfig.SERVER_TIMING_ENABLED)
+
+    def test_gunicorn_options(self):
+        """Test that the configuration maps onto preloaded, threaded workers"""
+        options = gunicorn_options(config_dict(ProductionConfig, HOST='127.0.0.1', PORT=8000, WEB_WORKERS=3,
+                                               WEB_THREADS=4, WEB_TIMEOUT=20, WEB_MAX_REQUESTS=1000))
+        self.assertEqual(options['bind'], '127.0.0.1:8000')
+        self.assertEqual((options['workers'], options['threads']), (3, 4))
+        self.assertEqual(options['worker_class'], 'gthread')
+        self.assertTrue(options['preload_app'])
+        self.assertEqual(options['timeout'], 20)
+        self.assertEqual((options['max_requests'], options['max_requests_jitter']), (1000, 100))
+
+    @unittest.skipUnless(importlib.util.find_spec('gunicorn'), 'gunicorn is not installed')
+    def test_options_are_valid_gunicorn_settings(self):
+        """Test that gunicorn accepts every option"""
+        from gunicorn.config import Config
+        config = Config()
+        for key, value in gunicorn_options(config_dict(ProductionConfig)).items():
+            if value is not None:
+                config.set(key, value)
+        self.assertTrue(config.preload_app)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+from flask import Flask, session
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from session_store import (
+    FileSessionBackend, MemorySessionBackend, SQLiteSessionBackend, ServerSideSessionInterface,
+    create_session_interface
+)
+
+
+class FakeClock:
+    """Manually advanced clock for expiry tests"""
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_app(backend, clock):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config['PERMANENT_SESSION_LIFETIME'] = 3600
+    app.session_interface = ServerSideSessionInterface(backend, sweep_interval=60, clock=clock)
+
+    @app.route('/login')
+    def login():
+        session.regenerate()
+        session['token_info'] = {'access_token': 'x' * 300, 'expires_at': 1}
+        return 'ok'
+
+    @app.route('/token')
+    def token():
+        return session.get('token_info', {}).get('access_token', '')
+
+    @app.route('/flash')
+    def flash_message():
+        session.setdefault('_flashes', []).append(('error', 'boom'))
+        return 'ok'
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        return 'ok'
+    return app
+
+
+class SessionBackendTestCase(unittest.TestCase):
+    """Test cases shared by every session backend"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.backends = [
+            MemorySessionBackend(),
+            SQLiteSessionBackend(os.path.join(self.directory.name, 'sessions.sqlite3')),
+            FileSessionBackend(os.path.join(self.directory.name, 'sessions'))
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip_and_expiry(self):
+        """Test that sessions load until they expire and that sweeping removes them"""
+        for backend in self.backends:
+            with self.subTest(backend=type(backend).__name__):
+                backend.save('a' * 43, '{"x": 1}', 200.0)
+                backend.save('b' * 43, '{"x": 2}', 100.0)
+                self.assertEqual(backend.load('a' * 43, 50.0), ('{"x": 1}', 200.0))
+                self.assertIsNone(backend.load('b' * 43, 150.0))
+                self.assertIsNone(backend.load('c' * 43, 50.0))
+
+                self.assertEqual(backend.sweep(150.0), 1)
+                self.assertEqual(len(backend), 1)
+                backend.delete('a' * 43)
+                backend.delete('a' * 43)
+                self.assertEqual(len(backend), 0)
+
+
+class ServerSideSessionTestCase(unittest.TestCase):
+    """Test cases for the server-side session interface"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'sessions.sqlite3')
+        self.clock = FakeClock()
+        self.backend = SQLiteSessionBackend(self.path)
+        self.app = create_app(self.backend, self.clock)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def sid(self, client=None):
+        cookie = (client or self.client).get_cookie('session')
+        return cookie.value if cookie else None
+
+    def test_cookie_holds_only_an_opaque_id(self):
+        """Test that the token stays server-side and the cookie is small"""
+        self.client.get('/login')
+        sid = self.sid()
+        self.assertEqual(len(sid), 43)
+        self.assertNotIn('x' * 10, sid)
+        self.assertEqual(self.client.get('/token').get_data(as_text=True), 'x' * 300)
+        self.assertEqual(len(self.backend), 1)
+
+    def test_shared_across_processes(self):
+        """Test that a second worker with its own backend instance sees the session"""
+        self.client.get('/login')
+        other_worker = create_app(SQLiteSessionBackend(self.path), self.clock).test_client()
+        other_worker.set_cookie('session', self.sid())
+        self.assertEqual(other_worker.get('/token').get_data(as_text=True), 'x' * 300)
+
+    def test_tagged_values_survive(self):
+        """Test that tuples such as flashed messages round-trip like in cookie sessions"""
+        self.client.get('/login')
+        self.client.get('/flash')
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess['_flashes'], [('error', 'boom')])
+
+    def test_login_regenerates_id(self):
+        """Test that logging in moves the session to a new id and drops the old one"""
+        self.client.get('/login')
+        first = self.sid()
+        self.client.get('/login')
+        self.assertNotEqual(self.sid(), first)
+        self.assertIsNone(self.backend.load(first, self.clock()))
+        self.assertEqual(len(self.backend), 1)
+
+    def test_unknown_ids_are_not_reused(self):
+        """Test that a client-chosen id is replaced by a fresh one"""
+        planted = 'p' * 43
+        self.client.set_cookie('session', planted)
+        self.client.get('/flash')
+        self.assertNotEqual(self.sid(), planted)
+        self.assertIsNone(self.backend.load(planted, self.clock()))
+
+    def test_expiry(self):
+        """Test that sessions expire after the lifetime and are swept"""
+        self.client.get('/login')
+        self.clock.now += 3601
+        self.assertEqual(self.client.get('/token').get_data(as_text=True), '')
+        self.assertEqual(len(self.backend), 0)
+
+    def test_unchanged_sessions_are_not_rewritten(self):
+        """Test that reads only write the session back once half its lifetime has passed"""
+        self.client.get('/login')
+        with patch.object(self.backend, 'save', wraps=self.backend.save) as save:
+            self.clock.now += 60
+            self.client.get('/token')
+            self.assertEqual(save.call_count, 0)
+            self.clock.now += 1800
+            self.client.get('/token')
+            self.assertEqual(save.call_count, 1)
+        self.clock.now += 3000
+        self.assertEqual(self.client.get('/token').get_data(as_text=True), 'x' * 300)
+
+    def test_clear_deletes_session(self):
+        """Test that clearing the session deletes it and its cookie"""
+        self.client.get('/login')
+        self.client.get('/logout')
+        self.assertIsNone(self.sid())
+        self.assertEqual(len(self.backend), 0)
+
+    def test_create_session_interface(self):
+        """Test the SESSION_TYPE choices"""
+        config = {'SESSION_TYPE': 'memory', 'SESSION_SWEEP_INTERVAL': 60}
+        self.assertIsInstance(create_session_interface(config).backend, MemorySessionBackend)
+        self.assertIsNone(create_session_interface(dict(config, SESSION_TYPE='cookie')))
+        with self.assertRaises(ValueError):
+            create_session_interface(dict(config, SESSION_TYPE='redis'))
+
+
+if __name__ == '__main__':
+    unittest.main()
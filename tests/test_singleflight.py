@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from singleflight import SingleFlight
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    """Test cases for duplicate call suppression"""
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def slow(self, value, delay=0.1):
+        with self.lock:
+            self.calls += 1
+        time.sleep(delay)
+        return value
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test that callers arriving during a call wait for it instead of calling again"""
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: self.flight.do('k', self.slow, i), range(8)))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertFalse(self.flight.in_flight('k'))
+
+    def test_keys_are_independent(self):
+        """Test that different keys run their own calls"""
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: self.flight.do(i % 2, self.slow, i % 2), range(4)))
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(sorted(results), [0, 0, 1, 1])
+
+    def test_errors_reach_every_caller(self):
+        """Test that an exception is raised to the caller that made the call and to waiters"""
+        def fail():
+            time.sleep(0.1)
+            raise ValueError('boom')
+
+        def call(_):
+            try:
+                self.flight.do('k', fail)
+            except ValueError as e:
+                return str(e)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(list(executor.map(call, range(4))), ['boom'] * 4)
+
+    def test_finished_calls_are_not_reused(self):
+        """Test that a call made after the previous one finished runs again"""
+        self.assertEqual(self.flight.do('k', self.slow, 1, delay=0), 1)
+        self.assertEqual(self.flight.do('k', self.slow, 2, delay=0), 2)
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
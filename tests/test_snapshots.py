@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from snapshots import SnapshotStore, fingerprint
+
+
+class SnapshotStoreTestCase(unittest.TestCase):
+    """Test cases for the per-user snapshot store"""
+
+    def setUp(self):
+        self.store = SnapshotStore(max_entries=10)
+        self.builds = []
+
+    def build(self, value):
+        def build():
+            self.builds.append(value)
+            return value
+        return build
+
+    def test_fingerprint(self):
+        """Test that fingerprints are stable and tell inputs apart"""
+        self.assertEqual(fingerprint(['a', 'b'], (3, 1700)), fingerprint(['a', 'b'], [3, 1700]))
+        self.assertEqual(fingerprint({'x': 1, 'y': 2}), fingerprint({'y': 2, 'x': 1}))
+        self.assertNotEqual(fingerprint(['a', 'b']), fingerprint(['b', 'a']))
+        self.assertNotEqual(fingerprint((3, 1700)), fingerprint((4, 1800)))
+
+    def test_rebuilt_only_when_inputs_change(self):
+        """Test that a section is reused while its fingerprint matches"""
+        self.assertEqual(self.store.get_or_build('user1', 'insights', 'v1', self.build('first')), 'first')
+        self.assertEqual(self.store.get_or_build('user1', 'insights', 'v1', self.build('again')), 'first')
+        self.assertEqual(self.store.get_or_build('user1', 'insights', 'v2', self.build('second')), 'second')
+        self.assertEqual(self.builds, ['first', 'second'])
+        self.assertEqual(self.store.stats(), {'hits': 1, 'builds': 2, 'size': 1})
+
+    def test_sections_and_users_are_separate(self):
+        """Test that sections are kept per user and section"""
+        self.store.get_or_build('user1', 'insights', 'v1', self.build(1))
+        self.store.get_or_build('user1', 'dashboard', 'v1', self.build(2))
+        self.store.get_or_build('user2', 'insights', 'v1', self.build(3))
+        self.assertEqual(self.builds, [1, 2, 3])
+
+        self.assertEqual(self.store.invalidate('user1'), 2)
+        self.store.get_or_build('user1', 'insights', 'v1', self.build(4))
+        self.assertEqual(self.builds, [1, 2, 3, 4])
+
+    def test_concurrent_builds_are_coalesced(self):
+        """Test that a section is built once when requested concurrently"""
+        start = threading.Barrier(5)
+
+        def slow_build():
+            time.sleep(0.05)
+            self.builds.append('built')
+            return 'built'
+
+        def page(_):
+            start.wait()
+            return self.store.get_or_build('user1', 'insights', 'v1', slow_build)
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            self.assertEqual(list(executor.map(page, range(5))), ['built'] * 5)
+        self.assertEqual(self.builds, ['built'])
+
+    def test_failed_build_is_not_stored(self):
+        """Test that an exception during a build leaves no snapshot behind"""
+        def fail():
+            raise RuntimeError('Spotify unavailable')
+        with self.assertRaises(RuntimeError):
+            self.store.get_or_build('user1', 'insights', 'v1', fail)
+        self.assertEqual(self.store.get_or_build('user1', 'insights', 'v1', self.build('ok')), 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+HEAVY_MODULES = ('numpy', 'pandas', 'plotly', 'spotipy', 'requests')
+
+
+def loaded_after(code):
+    """Run code in a fresh interpreter and return which heavy modules it loaded"""
+    probe = f'{code}\nimport sys\nprint(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    env = dict(os.environ, FLASK_ENV='testing')
+    result = subprocess.run([sys.executable, '-c', probe], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+class StartupTestCase(unittest.TestCase):
+    """Test that heavy dependencies are deferred until needed"""
+
+    def test_import_app_is_light(self):
+        """Test that importing the app loads none of the heavy dependencies"""
+        self.assertEqual(loaded_after('import app'), [])
+
+    def test_index_is_light(self):
+        """Test that serving the home page loads none of the heavy dependencies"""
+        code = 'import app\napp.app.test_client().get("/")'
+        self.assertEqual(loaded_after(code), [])
+
+    def test_prewarm_loads_dependencies(self):
+        """Test that prewarm imports everything the analytics routes use, and not Plotly"""
+        code = 'import app\napp.prewarm()'
+        self.assertEqual(loaded_after(code), [m for m in HEAVY_MODULES if m != 'plotly'])
+
+
+if __name__ == '__main__':
+    unittest.main()
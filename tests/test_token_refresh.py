@@ -0,0 +1,96 @@
+import unittest
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from token_refresh import TokenRefreshStore
+
+
+class TokenRefreshStoreTestCase(unittest.TestCase):
+    """Test cases for token refreshes shared between worker processes"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'token_refresh.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def store(self, **kwargs):
+        kwargs.setdefault('poll_interval', 0.01)
+        return TokenRefreshStore(self.path, **kwargs)
+
+    def test_workers_share_one_refresh(self):
+        """Test that a worker waits for the refresh another worker is making and reuses it"""
+        first, second = self.store(), self.store()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def refresh():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'access_token': 'fresh'}
+        results = []
+        thread = threading.Thread(target=lambda: results.append(first.refresh('old', refresh, ttl=60)))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        waiter = threading.Thread(target=lambda: results.append(second.refresh('old', refresh, ttl=60)))
+        waiter.start()
+        release.set()
+        thread.join(5)
+        waiter.join(5)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [{'access_token': 'fresh'}] * 2)
+        self.assertEqual(self.store().get('old'), {'access_token': 'fresh'})
+
+    def test_abandoned_lease_is_taken_over(self):
+        """Test that a lease held by a worker that died expires"""
+        now = [1000.0]
+        store = self.store(lease=30, clock=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + 1))
+        self.assertTrue(store._acquire('old', 'dead-worker'))
+
+        self.assertEqual(store.refresh('old', lambda: {'access_token': 'fresh'}, ttl=60), {'access_token': 'fresh'})
+        self.assertGreaterEqual(now[0], 1030)
+
+    def test_failed_refresh_releases_lease(self):
+        """Test that the next caller retries a refresh that failed"""
+        store = self.store()
+
+        def fail():
+            raise RuntimeError('spotify down')
+        with self.assertRaises(RuntimeError):
+            store.refresh('old', fail, ttl=60)
+        self.assertEqual(store.refresh('old', lambda: {'access_token': 'fresh'}, ttl=60), {'access_token': 'fresh'})
+
+    def test_refresh_token_is_not_stored(self):
+        """Test that only the short-lived fields of a refreshed token are shared"""
+        token_info = {'access_token': 'fresh', 'refresh_token': 'secret', 'expires_at': 2000,
+                      'expires_in': 3600, 'scope': 'user-top-read', 'token_type': 'Bearer'}
+        self.assertEqual(self.store().refresh('old', lambda: token_info, ttl=60), token_info)
+
+        with sqlite3.connect(self.path) as conn:
+            stored = json.loads(conn.execute('SELECT token_info FROM refreshed_tokens').fetchone()[0])
+        self.assertNotIn('refresh_token', stored)
+        self.assertNotIn('secret', json.dumps(stored))
+        self.assertEqual(self.store().get('old'),
+                         {key: value for key, value in token_info.items() if key != 'refresh_token'})
+
+    def test_refreshed_tokens_expire(self):
+        """Test that a published token is only kept for ttl"""
+        now = [1000.0]
+        store = self.store(clock=lambda: now[0])
+        store.refresh('old', lambda: {'access_token': 'fresh'}, ttl=60)
+        now[0] += 61
+        self.assertIsNone(store.get('old'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import os
+import sys
+from datetime import date
+
+import numpy as np
+
+# Add the parent directory to the path so we can import the app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import (
+    process_listening_data, create_heatmap_data, analyze_listening_patterns, ListeningTimes
+)
+
+
+def play(name, artists, played_at, duration_ms=None):
+    track = {'name': name, 'artists': [{'name': artist} for artist in artists]}
+    if duration_ms is not None:
+        track['duration_ms'] = duration_ms
+    return {'track': track, 'played_at': played_at}
+
+
+PLAYS = [
+    play('Song A', ['Artist 1', 'Artist 2'], '2024-01-01T12:00:00.000Z', 180000),
+    play('Song B', ['Artist 1'], '2024-01-07T23:59:59Z', 200000),
+    play('Song A', ['Artist 1', 'Artist 2'], '2024-01-08T00:30:00.500Z'),
+]
+
+
+class ListeningDataTestCase(unittest.TestCase):
+    """Test cases for the columnar listening-data processing"""
+
+    def test_process_listening_data(self):
+        """Test aggregate outputs of process_listening_data"""
+        data = process_listening_data(PLAYS)
+
+        self.assertEqual(data['total_tracks'], 3)
+        self.assertEqual(data['total_duration'], 380000)
+        self.assertEqual(data['track_counts'], {'Song A': 2, 'Song B': 1})
+        self.assertEqual(data['artist_counts'], {'Artist 1': 3, 'Artist 2': 2})
+        self.assertEqual(data['genre_counts'], {})
+        self.assertEqual(process_listening_data([]), {})
+
+    def test_listening_times_behave_like_dicts(self):
+        """Test that columnar listening times match the per-play dictionaries"""
+        listening_times = process_listening_data(PLAYS)['listening_times']
+
+        self.assertIsInstance(listening_times, ListeningTimes)
+        self.assertEqual(len(listening_times), 3)
+        self.assertEqual(listening_times[0], {
+            'hour': 12, 'day': 'Monday', 'date': date(2024, 1, 1),
+            'track_name': 'Song A', 'artist_name': 'Artist 1'
+        })
+        self.assertEqual([t['day'] for t in listening_times], ['Monday', 'Sunday', 'Monday'])
+        self.assertEqual([t['hour'] for t in listening_times[1:]], [23, 0])
+
+    def test_heatmap_columnar_and_dicts_agree(self):
+        """Test the heatmap from columns and from plain dictionaries"""
+        listening_times = process_listening_data(PLAYS)['listening_times']
+        from_columns = create_heatmap_data(listening_times)
+        from_dicts = create_heatmap_data(list(listening_times))
+
+        expected = np.zeros((7, 24))
+        expected[0][12] = expected[6][23] = expected[0][0] = 1
+        np.testing.assert_array_equal(from_columns, expected)
+        np.testing.assert_array_equal(from_dicts, expected)
+        self.assertEqual(create_heatmap_data([]).shape, (7, 24))
+
+
+class ListeningPatternsTestCase(unittest.TestCase):
+    """Test cases for the vectorized listening-pattern analysis"""
+
+    def test_patterns(self):
+        """Test pattern fields, with ties going to the first value seen"""
+        listening_times = [
+            {'hour': 5, 'day': 'Friday', 'date': date(2024, 1, 5)},
+            {'hour': 3, 'day': 'Monday', 'date': date(2024, 1, 1)},
+            {'hour': 3, 'day': 'Friday', 'date': date(2024, 1, 5)},
+            {'hour': 5, 'day': 'Monday', 'date': date(2024, 1, 8)},
+        ]
+        self.assertEqual(analyze_listening_patterns(listening_times), {
+            'most_active_hour': 5,
+            'most_active_day': 'Friday',
+            'total_sessions': 4,
+            'avg_sessions_per_day': 0.5,
+            'time_range_days': 8,
+            'unique_days': 3,
+            'hour_distribution': {5: 2, 3: 2},
+            'day_distribution': {'Friday': 2, 'Monday': 2}
+        })
+        self.assertEqual(analyze_listening_patterns([]), {})
+
+    def test_columnar_and_dict_inputs_agree(self):
+        """Test that ListeningTimes and plain dicts give the same patterns"""
+        listening_times = process_listening_data(PLAYS)['listening_times']
+        self.assertEqual(analyze_listening_patterns(listening_times),
+                         analyze_listening_patterns(list(listening_times)))
+
+
+if __name__ == '__main__':
+    unittest.main()
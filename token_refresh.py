@@ -0,0 +1,143 @@
+"""
+Token refreshes coordinated between worker processes
+
+``SingleFlight`` only deduplicates refreshes within one process, so under
+gunicorn every worker holding the same expired token would still refresh
+it. ``TokenRefreshStore`` keeps a lease per access token and the refreshed
+token in a SQLite database shared by every worker: the worker that takes
+the lease refreshes and publishes the result, the others wait for it. A
+lease left behind by a worker that died expires after ``lease`` seconds.
+
+Only the short-lived fields of a refreshed token are published, never its
+refresh token: the waiting workers already hold that and merge the
+published fields into their own token_info.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Fields of a refreshed token shared with the other workers
+PUBLISHED_FIELDS = ('access_token', 'expires_at', 'expires_in', 'scope', 'token_type')
+
+
+def _key(access_token: str) -> str:
+    # Access tokens are credentials, so only their digest is stored
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+
+class TokenRefreshStore:
+    """
+    Refresh leases and refreshed tokens shared by every worker process
+
+    Args:
+        path: SQLite database file, or ':memory:' for a private store
+        lease: Seconds a refresh may take before another worker takes over
+        poll_interval: Seconds between checks while another worker refreshes
+        clock: Time source, replaceable in tests
+        sleep: Sleep function, replaceable in tests
+    """
+
+    def __init__(self, path: str, lease: float = 30.0, poll_interval: float = 0.05,
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.path = path
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so open one per process
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS refresh_leases ('
+                'token_key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS refreshed_tokens ('
+                'token_key TEXT PRIMARY KEY, token_info TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS refreshed_tokens_by_expiry ON refreshed_tokens (expires_at)')
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, access_token: str) -> Optional[Dict[str, Any]]:
+        """Return the PUBLISHED_FIELDS of the token that replaced access_token, if a worker refreshed it recently"""
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT token_info FROM refreshed_tokens WHERE token_key = ? AND expires_at > ?',
+                (_key(access_token), self.clock())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def refresh(self, access_token: str, refresh: Callable[[], Dict[str, Any]], ttl: float) -> Dict[str, Any]:
+        """
+        Refresh a token once across all workers
+
+        Args:
+            access_token: Token being replaced
+            refresh: Makes the refresh call; only run by the worker holding the lease
+            ttl: Seconds the refreshed token is kept for workers still holding access_token
+
+        Returns:
+            The refreshed token when this caller refreshed it, otherwise its
+            PUBLISHED_FIELDS; an exception raised by refresh is raised to
+            this caller only, and the next caller tries again
+        """
+        owner = f'{os.getpid()}-{threading.get_ident()}'
+        while True:
+            refreshed = self.get(access_token)
+            if refreshed is not None:
+                return refreshed
+            if self._acquire(access_token, owner):
+                try:
+                    refreshed = refresh()
+                    self._publish(access_token, refreshed, ttl)
+                    return refreshed
+                finally:
+                    self._release(access_token, owner)
+            self.sleep(self.poll_interval)
+
+    def _acquire(self, access_token: str, owner: str) -> bool:
+        now = self.clock()
+        with self._lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM refresh_leases WHERE token_key = ? AND expires_at <= ?',
+                         (_key(access_token), now))
+            acquired = conn.execute(
+                'INSERT OR IGNORE INTO refresh_leases (token_key, owner, expires_at) VALUES (?, ?, ?)',
+                (_key(access_token), owner, now + self.lease)
+            ).rowcount == 1
+            conn.commit()
+        return acquired
+
+    def _release(self, access_token: str, owner: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM refresh_leases WHERE token_key = ? AND owner = ?',
+                         (_key(access_token), owner))
+            conn.commit()
+
+    def _publish(self, access_token: str, token_info: Dict[str, Any], ttl: float) -> None:
+        published = {field: token_info[field] for field in PUBLISHED_FIELDS if field in token_info}
+        now = self.clock()
+        with self._lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM refreshed_tokens WHERE expires_at <= ?', (now,))
+            conn.execute('INSERT OR REPLACE INTO refreshed_tokens (token_key, token_info, expires_at) '
+                         'VALUES (?, ?, ?)', (_key(access_token), json.dumps(published), now + ttl))
+            conn.commit()
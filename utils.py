@@ -1,12 +1,95 @@
-import json
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-import plotly.graph_objects as go
-import plotly.utils
+from collections.abc import Sequence
+from datetime import date, datetime, timedelta
+from operator import itemgetter
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
 import os
+from charts import bar_chart, heatmap_chart, polar_chart, line_chart, series
+from metrics import timed
 
+# NumPy and pandas are imported by the functions that need them, so importing
+# this module (and the app) stays cheap until analytics actually run
+if TYPE_CHECKING:
+    import numpy as np
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Audio features shown on the mood radar chart
+MOOD_FEATURES = ['danceability', 'energy', 'valence', 'acousticness', 'instrumentalness']
+
+# 1970-01-01 was a Thursday (weekday 3 with Monday as 0)
+_EPOCH_WEEKDAY = 3
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class ListeningTimes(Sequence):
+    """
+    Columnar listening-time data
+
+    Holds one NumPy array per field instead of one dict per play, while still
+    behaving like the list of ``{'hour', 'day', 'date', 'track_name',
+    'artist_name'}`` dictionaries it replaces: indexing or iterating
+    materializes those dictionaries on demand.
+
+    Args:
+        hours: UTC hour of each play (0-23)
+        weekdays: Day of week of each play, Monday being 0
+        epoch_days: Days since 1970-01-01 of each play
+        track_names: Name of each played track
+        artist_names: Name of the first artist of each played track
+    """
+
+    def __init__(self, hours: 'np.ndarray', weekdays: 'np.ndarray', epoch_days: 'np.ndarray',
+                 track_names: List[str], artist_names: List[str]):
+        self.hours = hours
+        self.weekdays = weekdays
+        self.epoch_days = epoch_days
+        self.track_names = track_names
+        self.artist_names = artist_names
+
+    def __len__(self) -> int:
+        return len(self.hours)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {
+            'hour': int(self.hours[index]),
+            'day': DAYS[self.weekdays[index]],
+            'date': date.fromordinal(_EPOCH_ORDINAL + int(self.epoch_days[index])),
+            'track_name': self.track_names[index],
+            'artist_name': self.artist_names[index]
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f'ListeningTimes({len(self)} plays)'
+
+
+def _parse_played_at(played_at: List[str]) -> 'np.ndarray':
+    """Parse Spotify UTC timestamps into Unix seconds in one vectorized call"""
+    import numpy as np
+    # Spotify timestamps are always UTC with a 'Z' suffix, which NumPy
+    # parses as naive UTC once the suffix is dropped
+    stripped = [value[:-1] if value.endswith('Z') else value for value in played_at]
+    return np.array(stripped, dtype='datetime64[ms]').astype(np.int64) // 1000
+
+
+def _value_counts(values: List[Any]) -> Dict[Any, int]:
+    """Count occurrences with a hash table, keeping first-appearance order"""
+    import numpy as np
+    import pandas as pd
+    if not values:
+        return {}
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    counts = np.bincount(codes, minlength=len(uniques))
+    return dict(zip(uniques.tolist(), counts.tolist()))
+
+
+@timed('analytics')
 def process_listening_data(recent_tracks: List[Dict]) -> Dict[str, Any]:
     """
     Process recently played tracks data for analysis
@@ -15,72 +98,62 @@ def process_listening_data(recent_tracks: List[Dict]) -> Dict[str, Any]:
         recent_tracks: List of recently played track objects from Spotify API
         
     Returns:
-        Dictionary containing processed listening data
+        Dictionary containing processed listening data; ``listening_times``
+        is a columnar ListeningTimes sequence
     """
+    import numpy as np
     if not recent_tracks:
         return {}
     
-    listening_times = []
-    total_duration = 0
-    track_counts = {}
-    artist_counts = {}
-    genre_counts = {}
-    
-    for item in recent_tracks:
-        track = item['track']
-        played_at = datetime.fromisoformat(item['played_at'].replace('Z', '+00:00'))
-        
-        # Track listening time data
-        listening_times.append({
-            'hour': played_at.hour,
-            'day': played_at.strftime('%A'),
-            'date': played_at.date(),
-            'track_name': track['name'],
-            'artist_name': track['artists'][0]['name']
-        })
-        
-        # Track counts
-        track_name = track['name']
-        track_counts[track_name] = track_counts.get(track_name, 0) + 1
-        
-        # Artist counts
-        for artist in track['artists']:
-            artist_name = artist['name']
-            artist_counts[artist_name] = artist_counts.get(artist_name, 0) + 1
-        
-        if 'duration_ms' in track:
-            total_duration += track['duration_ms']
+    tracks = list(map(itemgetter('track'), recent_tracks))
+    seconds = _parse_played_at(list(map(itemgetter('played_at'), recent_tracks)))
+    epoch_days = seconds // 86400
+    
+    track_names = list(map(itemgetter('name'), tracks))
+    track_artists = list(map(itemgetter('artists'), tracks))
+    artist_names = [artists[0]['name'] for artists in track_artists]
+    all_artist_names = [artist['name'] for artists in track_artists for artist in artists]
+    
+    listening_times = ListeningTimes(
+        hours=((seconds // 3600) % 24).astype(np.int8),
+        weekdays=((epoch_days + _EPOCH_WEEKDAY) % 7).astype(np.int8),
+        epoch_days=epoch_days.astype(np.int32),
+        track_names=track_names,
+        artist_names=artist_names
+    )
     
     return {
         'listening_times': listening_times,
-        'total_duration': total_duration,
+        'total_duration': sum([track.get('duration_ms') or 0 for track in tracks]),
         'total_tracks': len(recent_tracks),
-        'track_counts': track_counts,
-        'artist_counts': artist_counts,
-        'genre_counts': genre_counts
+        'track_counts': _value_counts(track_names),
+        'artist_counts': _value_counts(all_artist_names),
+        'genre_counts': {}
     }
 
-def create_heatmap_data(listening_times: List[Dict]) -> np.ndarray:
+@timed('analytics')
+def create_heatmap_data(listening_times: List[Dict]) -> 'np.ndarray':
     """
     Create heatmap data from listening times
     
     Args:
-        listening_times: List of listening time dictionaries
+        listening_times: ListeningTimes or list of listening time dictionaries
         
     Returns:
-        2D numpy array for heatmap visualization
+        2D numpy array (days x hours) for heatmap visualization
     """
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    hours = list(range(24))
-    
-    heatmap_data = np.zeros((len(days), len(hours)))
-    
-    for time_data in listening_times:
-        day_idx = days.index(time_data['day'])
-        hour_idx = time_data['hour']
-        heatmap_data[day_idx][hour_idx] += 1
+    import numpy as np
+    if isinstance(listening_times, ListeningTimes):
+        weekdays = listening_times.weekdays.astype(np.intp)
+        hours = listening_times.hours.astype(np.intp)
+    else:
+        day_index = {day: i for i, day in enumerate(DAYS)}
+        count = len(listening_times)
+        weekdays = np.fromiter((day_index[t['day']] for t in listening_times), dtype=np.intp, count=count)
+        hours = np.fromiter((t['hour'] for t in listening_times), dtype=np.intp, count=count)
     
-    return heatmap_data
+    counts = np.bincount(weekdays * 24 + hours, minlength=len(DAYS) * 24)
+    return counts.reshape(len(DAYS), 24).astype(float)
 
 def create_top_items_chart(items: List[Dict], item_type: str = 'tracks', limit: int = 10) -> str:
     """
@@ -113,21 +186,9 @@ def create_top_items_chart(items: List[Dict], item_type: str = 'tracks', limit:
         title = 'Your Top Artists'
         xaxis_title = 'Artist'
     
-    fig = go.Figure(data=[
-        go.Bar(x=names, y=values, marker_color=color)
-    ])
-    
-    fig.update_layout(
-        title=title,
-        xaxis_title=xaxis_title,
-        yaxis_title='Popularity',
-        template='plotly_dark',
-        showlegend=False
-    )
-    
-    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+    return bar_chart(names, values, color, title, xaxis_title, 'Popularity', showlegend=False)
 
-def create_heatmap_chart(heatmap_data: np.ndarray) -> str:
+def create_heatmap_chart(heatmap_data: 'np.ndarray') -> str:
     """
     Create a heatmap chart from listening data
     
@@ -137,77 +198,85 @@ def create_heatmap_chart(heatmap_data: np.ndarray) -> str:
     Returns:
         JSON string of Plotly heatmap
     """
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    hours = list(range(24))
-    
-    fig = go.Figure(data=go.Heatmap(
-        z=heatmap_data,
-        x=hours,
-        y=days,
-        colorscale='Viridis',
-        hoverongaps=False
-    ))
-    
-    fig.update_layout(
-        title='Listening Time Heatmap',
-        xaxis_title='Hour of Day',
-        yaxis_title='Day of Week',
-        template='plotly_dark'
+    return heatmap_chart(heatmap_data, list(range(24)), DAYS, 'Listening Time Heatmap',
+                         'Hour of Day', 'Day of Week', hoverongaps=False)
+
+def as_listening_times(listening_times: List[Dict]) -> ListeningTimes:
+    """
+    Return listening times in columnar form
+
+    Args:
+        listening_times: ListeningTimes or list of listening time dictionaries
+
+    Returns:
+        ListeningTimes, reusing the input when it already is one
+    """
+    import numpy as np
+    if isinstance(listening_times, ListeningTimes):
+        return listening_times
+    day_index = {day: i for i, day in enumerate(DAYS)}
+    count = len(listening_times)
+    return ListeningTimes(
+        hours=np.fromiter((t['hour'] for t in listening_times), dtype=np.int8, count=count),
+        weekdays=np.fromiter((day_index[t['day']] for t in listening_times), dtype=np.int8, count=count),
+        epoch_days=np.fromiter((t['date'].toordinal() - _EPOCH_ORDINAL for t in listening_times),
+                               dtype=np.int32, count=count),
+        track_names=[t.get('track_name') for t in listening_times],
+        artist_names=[t.get('artist_name') for t in listening_times]
     )
-    
-    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
 
+def _counts_by_first_seen(values: 'np.ndarray', size: int):
+    """
+    Count small non-negative integers, ordered by first appearance
+
+    Returns the (value, count) pairs in the order the values first occur and
+    the most frequent value, ties going to the one seen first, which is what
+    ``max`` over an insertion-ordered dict of counts returns.
+    """
+    import numpy as np
+    counts = np.bincount(values, minlength=size)
+    seen, first_index = np.unique(values, return_index=True)
+    seen = seen[np.argsort(first_index, kind='stable')]
+    pairs = [(int(value), int(counts[value])) for value in seen]
+    most_common = max(pairs, key=lambda x: x[1])[0]
+    return pairs, most_common
+
+@timed('analytics')
 def analyze_listening_patterns(listening_times: List[Dict]) -> Dict[str, Any]:
     """
     Analyze listening patterns from time data
     
     Args:
-        listening_times: List of listening time dictionaries
+        listening_times: ListeningTimes or list of listening time dictionaries
         
     Returns:
         Dictionary containing pattern analysis
     """
+    import numpy as np
     if not listening_times:
         return {}
     
-    df = pd.DataFrame(listening_times)
+    columns = as_listening_times(listening_times)
     
-    # Count listening by hour
-    hour_counts = {}
-    for time_data in listening_times:
-        hour = time_data['hour']
-        hour_counts[hour] = hour_counts.get(hour, 0) + 1
-    
-    # Count listening by day
-    day_counts = {}
-    for time_data in listening_times:
-        day = time_data['day']
-        day_counts[day] = day_counts.get(day, 0) + 1
-    
-    # Find most active hour and day
-    most_active_hour = max(hour_counts.items(), key=lambda x: x[1])[0] if hour_counts else 0
-    most_active_day = max(day_counts.items(), key=lambda x: x[1])[0] if day_counts else 'Unknown'
+    # Count listening by hour and by day
+    hour_pairs, most_active_hour = _counts_by_first_seen(columns.hours.astype(np.intp), 24)
+    day_pairs, most_active_weekday = _counts_by_first_seen(columns.weekdays.astype(np.intp), len(DAYS))
     
     # Calculate time range
-    dates = [time_data['date'] for time_data in listening_times]
-    if dates:
-        min_date = min(dates)
-        max_date = max(dates)
-        time_range_days = (max_date - min_date).days + 1
-        unique_days = len(set(dates))
-    else:
-        time_range_days = 0
-        unique_days = 0
+    epoch_days = columns.epoch_days
+    time_range_days = int(epoch_days.max() - epoch_days.min()) + 1
+    unique_days = len(np.unique(epoch_days))
+    total_sessions = len(columns)
     
     return {
         'most_active_hour': most_active_hour,
-        'most_active_day': most_active_day,
-        'total_sessions': len(listening_times),
-        'avg_sessions_per_day': round(len(listening_times) / max(time_range_days, 1), 1),
+        'most_active_day': DAYS[most_active_weekday],
+        'total_sessions': total_sessions,
+        'avg_sessions_per_day': round(total_sessions / max(time_range_days, 1), 1),
         'time_range_days': time_range_days,
         'unique_days': unique_days,
-        'hour_distribution': hour_counts,
-        'day_distribution': day_counts
+        'hour_distribution': dict(hour_pairs),
+        'day_distribution': {DAYS[day]: count for day, count in day_pairs}
     }
 
 def format_duration(duration_ms: int) -> str:
@@ -224,6 +293,7 @@ def format_duration(duration_ms: int) -> str:
     seconds = (duration_ms % 60000) // 1000
     return f"{minutes}:{seconds:02d}"
 
+@timed('analytics')
 def get_audio_features_summary(tracks: List[Dict]) -> Dict[str, float]:
     """
     Calculate average audio features from a list of tracks
@@ -238,12 +308,23 @@ def get_audio_features_summary(tracks: List[Dict]) -> Dict[str, float]:
         return {}
     
     features = ['danceability', 'energy', 'valence', 'tempo', 'acousticness', 'instrumentalness']
-    summary = {}
+    totals = dict.fromkeys(features, 0.0)
+    counts = dict.fromkeys(features, 0)
+    
+    # Single pass; tracks without audio features come back from Spotify as None
+    for track in tracks:
+        if not track:
+            continue
+        for feature in features:
+            value = track.get(feature)
+            if value is not None:
+                totals[feature] += value
+                counts[feature] += 1
     
+    summary = {}
     for feature in features:
-        values = [track.get(feature, 0) for track in tracks if track.get(feature) is not None]
-        if values:
-            summary[feature] = round(sum(values) / len(values), 3)
+        if counts[feature]:
+            summary[feature] = round(totals[feature] / counts[feature], 3)
     
     return summary
 
@@ -261,59 +342,29 @@ def create_mood_analysis_chart(audio_features: Dict[str, float]) -> str:
         return ""
     
     # Select relevant features for mood analysis
-    mood_features = ['danceability', 'energy', 'valence', 'acousticness', 'instrumentalness']
-    available_features = {k: v for k, v in audio_features.items() if k in mood_features}
+    available_features = {k: v for k, v in audio_features.items() if k in MOOD_FEATURES}
     
     if not available_features:
         return ""
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Scatterpolar(
-        r=list(available_features.values()),
-        theta=list(available_features.keys()),
-        fill='toself',
-        name='Your Music Profile',
-        line_color='rgb(30, 215, 96)'
-    ))
-    
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[0, 1]
-            )),
-        showlegend=False,
-        title='Your Music Mood Profile',
-        template='plotly_dark'
-    )
-    
-    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+    return polar_chart(list(available_features.values()), list(available_features.keys()),
+                       'Your Music Profile', 'rgb(30, 215, 96)', 'Your Music Mood Profile')
 
-def export_data_to_csv(data: Dict[str, Any], filename: str) -> str:
+@timed('charts')
+def create_mood_chart_data(audio_features: Dict[str, float]) -> Optional[Dict[str, list]]:
     """
-    Export data to CSV format
+    Create compact radar chart data for mood analysis, rendered by charts.js
     
     Args:
-        data: Dictionary containing data to export
-        filename: Name of the file to create
+        audio_features: Dictionary of audio features
         
     Returns:
-        Path to the created CSV file
+        Labels and values of the mood features present, or None if there are none
     """
-    try:
-        if 'tracks' in data:
-            df = pd.DataFrame(data['tracks'])
-            df.to_csv(f'static/exports/{filename}_tracks.csv', index=False)
-        
-        if 'artists' in data:
-            df = pd.DataFrame(data['artists'])
-            df.to_csv(f'static/exports/{filename}_artists.csv', index=False)
-        
-        return f'static/exports/{filename}'
-    except Exception as e:
-        print(f"Error exporting data: {e}")
-        return ""
+    available_features = {k: v for k, v in (audio_features or {}).items() if k in MOOD_FEATURES}
+    if not available_features:
+        return None
+    return series(available_features.keys(), available_features.values())
 
 def validate_spotify_credentials(client_id: str, client_secret: str) -> bool:
     """
@@ -351,21 +402,13 @@ def create_genre_analysis_chart(artists_data):
     
     genres, counts = zip(*top_genres)
     
-    fig = go.Figure(data=[
-        go.Bar(x=list(genres), y=list(counts), marker_color='rgb(255, 107, 107)')
-    ])
-    
-    fig.update_layout(
-        title='Top Genres',
-        xaxis_title='Genre',
-        yaxis_title='Number of Artists',
-        template='plotly_dark'
-    )
-    
-    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+    return bar_chart(list(genres), list(counts), 'rgb(255, 107, 107)', 'Top Genres',
+                     'Genre', 'Number of Artists')
 
+@timed('analytics')
 def analyze_music_taste_complexity(audio_features):
     """Analyze the complexity of music taste based on audio features"""
+    import numpy as np
     if not audio_features:
         return {}
     
@@ -395,35 +438,19 @@ def analyze_music_taste_complexity(audio_features):
     }
 
 def create_listening_timeline_chart(listening_times):
-    """Create a timeline chart of listening activity"""
+    """Create a timeline chart of listening activity from ListeningTimes or dicts"""
+    import numpy as np
     if not listening_times:
         return None
     
-    # Group by date
-    date_counts = {}
-    for time_data in listening_times:
-        date = time_data['date']
-        date_counts[date] = date_counts.get(date, 0) + 1
-    
-    # Sort by date
-    sorted_dates = sorted(date_counts.items())
-    dates, counts = zip(*sorted_dates)
-    
-    fig = go.Figure(data=[
-        go.Scatter(x=list(dates), y=list(counts), mode='lines+markers', 
-                  line=dict(color='rgb(30, 215, 96)', width=3),
-                  marker=dict(size=8, color='rgb(30, 215, 96)'))
-    ])
-    
-    fig.update_layout(
-        title='Listening Activity Timeline',
-        xaxis_title='Date',
-        yaxis_title='Number of Tracks',
-        template='plotly_dark'
-    )
+    # Group by date, sorted
+    epoch_days, counts = np.unique(as_listening_times(listening_times).epoch_days, return_counts=True)
+    dates = [date.fromordinal(_EPOCH_ORDINAL + int(day)).isoformat() for day in epoch_days]
     
-    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+    return line_chart(dates, counts, 'rgb(30, 215, 96)', 'Listening Activity Timeline',
+                      'Date', 'Number of Tracks')
 
+@timed('analytics')
 def generate_music_personality_insights(audio_features, listening_patterns):
     """Generate personality insights based on music data"""
     insights = []
@@ -478,15 +505,5 @@ def create_playlist_analysis_chart(playlists_data):
     playlist_sizes = [playlist.get('tracks', {}).get('total', 0) for playlist in playlists_data]
     playlist_names = [playlist.get('name', f'Playlist {i+1}') for i, playlist in enumerate(playlists_data)]
     
-    fig = go.Figure(data=[
-        go.Bar(x=playlist_names, y=playlist_sizes, marker_color='rgb(138, 43, 226)')
-    ])
-    
-    fig.update_layout(
-        title='Playlist Sizes',
-        xaxis_title='Playlist',
-        yaxis_title='Number of Tracks',
-        template='plotly_dark'
-    )
-    
-    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder) 
\ No newline at end of file
+    return bar_chart(playlist_names, playlist_sizes, 'rgb(138, 43, 226)', 'Playlist Sizes',
+                     'Playlist', 'Number of Tracks') 
\ No newline at end of file